@@ -0,0 +1,260 @@
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from datetime import date, datetime, timedelta
+
+DEFAULT_SIZES = [1000, 100000]
+DEFAULT_REPEAT = 20
+# A case regresses when its median exceeds the baseline median by more than this fraction
+DEFAULT_THRESHOLD = 0.25
+BENCH_USER = "bench"
+
+# (name, method, path, query params); add_transaction also sends a body, see _add_transaction_body
+CASES = [
+    ("food_graph", "get", "/food_graph", {"username": BENCH_USER}),
+    ("entertainment_graph", "get", "/entertainment_graph", {"username": BENCH_USER}),
+    ("travel_graph", "get", "/travel_graph", {"username": BENCH_USER}),
+    ("food_predicted", "post", "/food_predicted", {"username": BENCH_USER}),
+    ("entertainment_predicted", "post", "/entertainment_predicted", {"username": BENCH_USER}),
+    ("travel_predicted", "post", "/travel_predicted", {"username": BENCH_USER}),
+    ("adaptive_spending", "post", "/adaptive_spending", {"username": BENCH_USER}),
+    ("top_spenders", "post", "/top_spenders", {"username": BENCH_USER}),
+    ("day_paid", "post", "/day_paid", {"username": BENCH_USER}),
+    ("alert", "post", "/alert", {"username": BENCH_USER}),
+    ("add_transaction", "post", "/add_transaction", None),
+]
+
+CATEGORY_MIX = [
+    ["Food and Drink", "Restaurants"], ["Food and Drink"], ["Entertainment"], ["Travel"],
+    ["Shops"], ["Transfer", "Payroll"],
+]
+MERCHANTS = ["Starbucks", "Uber", "AMC", "Delta", "Whole Foods", "Shell", "Amazon"]
+
+
+def seed_database(path: str, transactions: int, days: int = 730, seed: int = 0, end_date: date = None):
+    """Create a fresh database at `path` holding `transactions` rows for BENCH_USER, the last on
+    `end_date` (default synthetic.DEFAULT_END_DATE).
+
+    A tenth of the rows fall in the month of `end_date` so the month-to-date endpoints have data
+    when the app runs with APP_TODAY=end_date, and payroll deposits (negative amounts) land in the
+    previous month for /day_paid.
+    """
+    from app.database import Base, make_engine
+    from app.models.user import User
+    from app.models.account import Account
+    from app.models.transaction import Transaction
+    from app.categories import backfill_categories
+    from app.rollups import rebuild_rollups
+    from app.synthetic import DEFAULT_END_DATE
+    from sqlalchemy.orm import sessionmaker
+
+    rng = random.Random(seed)
+    engine = make_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(engine)
+    Session = sessionmaker(bind=engine, autoflush=False)
+    today = end_date or DEFAULT_END_DATE
+    month_start = today.replace(day=1)
+
+    with Session() as db:
+        bench_user = User(username=BENCH_USER, password="bench", amount=1200, time_months=12, saving_goal=100,
+                          checkings=5000, savings=1000)
+        db.add(bench_user)
+        db.flush()
+        db.add(Account(account_id="bench-checking", user_id=bench_user.id, name="Checking"))
+        db.commit()
+
+        for start in range(0, transactions, 10000):
+            rows = []
+            for _ in range(min(10000, transactions - start)):
+                if rng.random() < 0.1:
+                    day = month_start + timedelta(days=rng.randrange((today - month_start).days + 1))
+                else:
+                    day = today - timedelta(days=rng.randrange(days))
+                categories = rng.choice(CATEGORY_MIX)
+                amount = -round(rng.uniform(500, 3000), 2) if categories[0] == "Transfer" else round(rng.uniform(1, 200), 2)
+                rows.append({
+                    "transaction_id": str(uuid.uuid4()), "user_id": bench_user.id, "account_id": "bench-checking",
+                    "name": "bench", "merchant_name": rng.choice(MERCHANTS), "amount": amount, "date": day,
+                    "category": json.dumps(categories), "payment_channel": "online", "currency": "USD",
+                })
+            db.bulk_insert_mappings(Transaction, rows)
+            db.commit()
+
+        backfill_categories(db)
+        rebuild_rollups(db)
+    engine.dispose()
+
+
+def _add_transaction_body():
+    from app.recompute import today
+
+    return {
+        "username": BENCH_USER, "name": "bench", "merchant_name": "Starbucks", "amount": 4.5,
+        "date": str(today()), "category": ["Food and Drink"], "payment_channel": "online", "currency": "USD",
+    }
+
+
+def _summary(samples):
+    samples = sorted(samples)
+    return {
+        "runs": len(samples),
+        "min_ms": samples[0] * 1000,
+        "median_ms": statistics.median(samples) * 1000,
+        "p95_ms": samples[min(len(samples) - 1, int(0.95 * len(samples)))] * 1000,
+        "mean_ms": statistics.fmean(samples) * 1000,
+    }
+
+
+def run_cases(repeat: int, only=None):
+    """Time every case against the database DATABASE_URL points at. Imports app.main, so run it in a fresh process."""
+    # Every call must reach the endpoint, not the response cache
+    os.environ["RESPONSE_CACHE_MAX_ENTRIES"] = "0"
+    from fastapi.testclient import TestClient
+    from app import main
+
+    results = {}
+    # A failing case (e.g. no fraud encoder on this machine) is reported as skipped rather than aborting the run
+    with TestClient(main.app, raise_server_exceptions=False) as client:
+        for name, method, path, params in CASES:
+            if only and name not in only:
+                continue
+            kwargs = {"params": params}
+            if name == "add_transaction":
+                kwargs["json"] = _add_transaction_body()
+
+            # The first call pays for lazy loading (e.g. the fraud model) and is not counted
+            response = getattr(client, method)(path, **kwargs)
+            main.recompute_queue.drain(timeout=60)
+            if response.status_code != 200:
+                results[name] = {"skipped": f"{response.status_code}: {response.text[:200]}"}
+                continue
+
+            samples = []
+            recompute_samples = []
+            for _ in range(repeat):
+                started = time.perf_counter()
+                getattr(client, method)(path, **kwargs)
+                samples.append(time.perf_counter() - started)
+                if name == "add_transaction":
+                    # Categories and rollups are written in the request; the forecast recompute runs
+                    # after the queue's debounce, so it is timed by its own duration
+                    main.recompute_queue.drain(timeout=60)
+                    recompute_samples.append(main.recompute_queue.last_duration)
+            results[name] = _summary(samples)
+            if recompute_samples:
+                results[f"{name}_recompute"] = _summary(recompute_samples)
+    return results
+
+
+def run_size(transactions: int, repeat: int, only=None, keep: str = None, end_date: date = None):
+    """Seed a scratch database of the given size and time the cases in a child process that treats
+    `end_date` as today."""
+    from app.synthetic import DEFAULT_END_DATE
+
+    end_date = end_date or DEFAULT_END_DATE
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(keep or tmp, f"bench-{transactions}-{end_date}.db")
+        if not (keep and os.path.exists(path)):
+            started = time.perf_counter()
+            seed_database(path, transactions, end_date=end_date)
+            print(f"Seeded {transactions} transactions in {time.perf_counter() - started:.1f}s", file=sys.stderr)
+
+        env = dict(os.environ, DATABASE_URL=f"sqlite:///{path}", APP_TODAY=str(end_date),
+                   PYTHONPATH=os.pathsep.join(filter(None, [os.getcwd(), os.getenv("PYTHONPATH")])))
+        command = [sys.executable, "-m", "app.bench", "--worker", "--repeat", str(repeat)]
+        if only:
+            command += ["--only", ",".join(only)]
+        result = subprocess.run(command, capture_output=True, text=True, env=env)
+        if result.returncode != 0:
+            raise RuntimeError(result.stderr.strip()[-2000:] or "benchmark worker failed")
+        return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def compare(current, baseline, threshold: float = DEFAULT_THRESHOLD):
+    """Cases whose median grew past the threshold, as [(size, case, baseline_ms, current_ms)]."""
+    regressions = []
+    for size, cases in current["results"].items():
+        for case, result in cases.items():
+            before = baseline.get("results", {}).get(size, {}).get(case)
+            if not before or "median_ms" not in before or "median_ms" not in result:
+                continue
+            if result["median_ms"] > before["median_ms"] * (1 + threshold):
+                regressions.append((size, case, before["median_ms"], result["median_ms"]))
+    return regressions
+
+
+def print_table(current, baseline=None):
+    for size, cases in current["results"].items():
+        print(f"\n{size} transactions")
+        for case, result in cases.items():
+            if "skipped" in result:
+                print(f"  {case:28} skipped ({result['skipped']})")
+                continue
+            line = f"  {case:28} median {result['median_ms']:8.2f} ms  p95 {result['p95_ms']:8.2f} ms"
+            before = (baseline or {}).get("results", {}).get(size, {}).get(case, {})
+            if "median_ms" in before:
+                line += f"  ({result['median_ms'] / before['median_ms'] - 1:+.0%} vs baseline)"
+            print(line)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Time the hot endpoints on seeded databases and compare with a baseline.")
+    parser.add_argument("--sizes", default=",".join(map(str, DEFAULT_SIZES)), help="comma-separated transaction counts, e.g. 1000,100000,1000000")
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT)
+    parser.add_argument("--only", default=None, help="comma-separated case names")
+    parser.add_argument("--output", default="bench_results.json")
+    parser.add_argument("--baseline", default=None, help="baseline JSON; exits 1 if any case regressed")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD)
+    parser.add_argument("--keep", default=None, help="directory to keep (and reuse) the seeded databases in")
+    parser.add_argument("--end-date", type=date.fromisoformat, default=None,
+                        help="last day of seeded history, YYYY-MM-DD, which the timed app treats as today (default synthetic.DEFAULT_END_DATE)")
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    only = args.only.split(",") if args.only else None
+
+    if args.worker:
+        print(json.dumps(run_cases(args.repeat, only)))
+        sys.exit(0)
+
+    from app.synthetic import DEFAULT_END_DATE
+
+    end_date = args.end_date or DEFAULT_END_DATE
+
+    current = {
+        "meta": {
+            "created": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "platform": platform.platform(),
+            "repeat": args.repeat,
+            "end_date": str(end_date),
+        },
+        "results": {},
+    }
+    for size in [int(size) for size in args.sizes.split(",")]:
+        current["results"][str(size)] = run_size(size, args.repeat, only, args.keep, end_date)
+
+    with open(args.output, "w") as file:
+        json.dump(current, file, indent=2)
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+    print_table(current, baseline)
+    print(f"\nWrote {args.output}")
+
+    if baseline is not None:
+        regressions = compare(current, baseline, args.threshold)
+        for size, case, before, after in regressions:
+            print(f"REGRESSION {case} at {size} transactions: {before:.2f} ms -> {after:.2f} ms")
+        print(f"{len(regressions)} regressions over {args.threshold:.0%}")
+        sys.exit(1 if regressions else 0)
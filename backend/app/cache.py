@@ -0,0 +1,138 @@
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.responses import Response
+
+CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "2048"))
+# Bounds staleness from anything that does not bump a version (the date rolling over, other processes)
+CACHE_TTL_SECONDS = float(os.getenv("RESPONSE_CACHE_TTL_SECONDS", "30"))
+
+
+class ResponseCache:
+    """LRU + TTL cache of response bodies keyed by (user, path, params), valid for one data version per user.
+
+    Writers call bump(user) after committing; entries stored under an older version are never served.
+    """
+
+    def __init__(self, max_entries: int = CACHE_MAX_ENTRIES, ttl: float = CACHE_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()  # key -> (version, stored_at, etag, body, headers)
+        self._versions = {}
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def version(self, user) -> int:
+        with self._lock:
+            return self._versions.get(user, 0)
+
+    def bump(self, user):
+        """Invalidate every cached response for `user`."""
+        with self._lock:
+            self._versions[user] = self._versions.get(user, 0) + 1
+            self.invalidations += 1
+
+    def get(self, key, version):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            if entry[0] != version or time.monotonic() - entry[1] > self.ttl:
+                del self._entries[key]
+                if entry[0] == version:
+                    self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key, version, etag, body, headers):
+        with self._lock:
+            # A write that landed while this response was computed makes it stale on arrival
+            if self._versions.get(key[0], 0) != version:
+                return
+            self._entries[key] = (version, time.monotonic(), etag, body, headers)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def record_not_modified(self):
+        with self._lock:
+            self.not_modified += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else None,
+                "not_modified": self.not_modified,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+            }
+
+
+def etag_for(body: bytes):
+    return '"' + hashlib.sha1(body).hexdigest()[:20] + '"'
+
+
+class ResponseCacheMiddleware(BaseHTTPMiddleware):
+    """Serves GETs on `paths` from `cache`, with ETags; a matching If-None-Match gets a 304.
+
+    The user is the `username` query parameter, or `default_user` for endpoints called without one.
+    Cache hits and 304s never reach the endpoint, so they open no database session.
+    """
+
+    def __init__(self, app, cache: ResponseCache, paths, default_user: str):
+        super().__init__(app)
+        self.cache = cache
+        self.paths = set(paths)
+        self.default_user = default_user
+
+    async def dispatch(self, request, call_next):
+        if request.method != "GET" or request.url.path not in self.paths:
+            return await call_next(request)
+
+        user = request.query_params.get("username", self.default_user)
+        key = (user, request.url.path, tuple(sorted(request.query_params.multi_items())))
+        version = self.cache.version(user)
+        client_etag = request.headers.get("if-none-match")
+
+        entry = self.cache.get(key, version)
+        if entry is not None:
+            _, _, etag, body, headers = entry
+            if client_etag == etag:
+                return self._not_modified(etag)
+            return Response(content=body, status_code=200, headers=dict(headers, etag=etag))
+
+        response = await call_next(request)
+        if response.status_code != 200:
+            return response
+        body = b"".join([chunk async for chunk in response.body_iterator])
+        etag = etag_for(body)
+        headers = {name: value for name, value in response.headers.items() if name != "content-length"}
+        self.cache.put(key, version, etag, body, headers)
+        if client_etag == etag:
+            return self._not_modified(etag)
+        return Response(content=body, status_code=200, headers=dict(headers, etag=etag))
+
+    def _not_modified(self, etag):
+        self.cache.record_not_modified()
+        return Response(status_code=304, headers={"etag": etag})
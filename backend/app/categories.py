@@ -0,0 +1,84 @@
+import json
+from sqlalchemy import select, exists
+from sqlalchemy.orm import Session
+from app.database import SessionLocal, upsert
+from app.models import create_tables
+from app.models.transaction import Transaction
+from app.models.transaction_category import TransactionCategory
+
+FOOD = "Food and Drink"
+ENTERTAINMENT = "Entertainment"
+TRAVEL = "Travel"
+
+
+def parse_categories(raw):
+    """Turn a stored category value (JSON string, plain string or list) into a clean list."""
+    if raw is None:
+        return []
+    if isinstance(raw, str):
+        try:
+            categories = json.loads(raw)
+        except json.JSONDecodeError:
+            # Fallback: remove brackets and quotes, then split by comma
+            categories = raw.strip('[]').replace('"', '').split(',')
+        if isinstance(categories, str):
+            categories = [categories]
+        elif not isinstance(categories, list):
+            return []
+    elif isinstance(raw, list):
+        categories = raw
+    else:
+        return []
+
+    cleaned = []
+    for cat in categories:
+        if isinstance(cat, str) and cat.strip() and cat.strip() not in cleaned:
+            cleaned.append(cat.strip())
+    return cleaned
+
+
+def set_categories(tx: Transaction, categories):
+    """Store categories on a transaction, keeping the JSON column and the normalized rows in sync."""
+    cleaned = parse_categories(categories)
+    tx.category = json.dumps(cleaned)
+    tx.categories = [TransactionCategory(user_id=tx.user_id, category=cat, date=tx.date) for cat in cleaned]
+    return tx
+
+
+def backfill_categories(db: Session, batch_size: int = 1000):
+    """Create category rows for transactions that were stored before the association table existed.
+
+    Rows another process inserted meanwhile are skipped by the unique (transaction_id, category) index.
+    """
+    missing = ~exists().where(TransactionCategory.transaction_id == Transaction.id)
+    created = 0
+    last_id = 0
+    while True:
+        rows = db.execute(
+            select(Transaction.id, Transaction.user_id, Transaction.date, Transaction.category)
+            .where(Transaction.id > last_id, missing)
+            .order_by(Transaction.id)
+            .limit(batch_size)
+        ).all()
+        if not rows:
+            break
+        mappings = [
+            {"transaction_id": tx_id, "user_id": user_id, "category": cat, "date": tx_date}
+            for tx_id, user_id, tx_date, raw in rows
+            for cat in parse_categories(raw)
+        ]
+        if mappings:
+            statement = upsert(db, TransactionCategory).on_conflict_do_nothing(index_elements=["transaction_id", "category"])
+            created += len(db.execute(statement.returning(TransactionCategory.id), mappings).all())
+        db.commit()
+        last_id = rows[-1][0]
+    return created
+
+
+if __name__ == "__main__":
+    create_tables()
+    db = SessionLocal()
+    try:
+        print(f"Backfilled {backfill_categories(db)} category rows.")
+    finally:
+        db.close()
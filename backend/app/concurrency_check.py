@@ -0,0 +1,81 @@
+import argparse
+import os
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+
+DEFAULT_WRITERS = 16
+DEFAULT_REQUESTS = 200
+
+
+def _add_body(username: str, i: int):
+    # Every write lands on the same day and categories, so writers contend for the same rollup rows
+    return {
+        "username": username, "name": f"concurrent-{i}", "merchant_name": "Starbucks", "amount": 5 + i % 7,
+        "date": str(date.today()), "category": ["Food and Drink", "Coffee Shop"], "payment_channel": "online",
+    }
+
+
+def run_check(writers: int, requests: int, log=print):
+    """Fire `requests` concurrent /add_transaction calls, then delete half of them concurrently, and
+    check the rollups against the raw tables after each phase. Returns a list of failures.
+
+    Imports app.main, so DATABASE_URL must already point at a scratch database seeded by app.bench.
+    """
+    from fastapi.testclient import TestClient
+    from app import main
+    from app.bench import BENCH_USER
+    from app.database import SessionLocal
+    from app.rollups import check_rollups
+
+    failures = []
+
+    def check(phase, statuses):
+        errors = [status for status in statuses if status != 200]
+        log(f"{phase}: {len(statuses)} requests, {len(errors)} errors")
+        failures.extend(f"{phase}: HTTP {status}" for status in errors)
+        with SessionLocal() as db:
+            problems = check_rollups(db)
+        for problem in problems:
+            log(f"  {problem}")
+        failures.extend(f"{phase}: {problem}" for problem in problems)
+
+    with TestClient(main.app, raise_server_exceptions=False) as client, ThreadPoolExecutor(writers) as pool:
+        responses = list(pool.map(lambda i: client.post("/add_transaction", json=_add_body(BENCH_USER, i)), range(requests)))
+        check("add", [response.status_code for response in responses])
+
+        added = [response.json()["transaction_id"] for response in responses if response.status_code == 200]
+        deletes = list(pool.map(
+            lambda transaction_id: client.delete(
+                "/delete_transaction", params={"transaction_id": transaction_id, "username": BENCH_USER}
+            ),
+            added[::2],
+        ))
+        check("delete", [response.status_code for response in deletes])
+        main.recompute_queue.drain(timeout=60)
+    return failures
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Concurrent writers against a scratch database; exits 1 if any write fails or the rollups drift."
+    )
+    parser.add_argument("--writers", type=int, default=DEFAULT_WRITERS, help="concurrent client threads")
+    parser.add_argument("--requests", type=int, default=DEFAULT_REQUESTS, help="transactions to add")
+    parser.add_argument("--transactions", type=int, default=1000, help="rows to seed the scratch database with")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "concurrency.db")
+        # Set before anything imports app.database, whose engine reads it once
+        os.environ["DATABASE_URL"] = f"sqlite:///{path}"
+        os.environ["RESPONSE_CACHE_MAX_ENTRIES"] = "0"
+        os.environ.setdefault("SLOW_REQUEST_MS", "60000")  # Contended writes are slow by design here
+        from app.bench import seed_database
+
+        seed_database(path, args.transactions)
+        failures = run_check(args.writers, args.requests)
+
+    print("Rollups consistent under concurrent writes." if not failures else f"{len(failures)} failures")
+    sys.exit(1 if failures else 0)
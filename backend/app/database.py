@@ -1,15 +1,98 @@
-from sqlalchemy import create_engine
+import os
+from contextlib import contextmanager
+from sqlalchemy import create_engine, event, inspect, text
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker, declarative_base
 
-# Database URL (SQLite for now)
-DATABASE_URL = "sqlite:///./plaid_app.db"
+# Database URL: SQLite file by default, any SQLAlchemy URL (e.g. postgresql://..., via psycopg2 and asyncpg) in production
+DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./plaid_app.db")
+
+# Connection pool, per engine
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+
+# SQLite tuning applied to every new connection. WAL lets readers run alongside the
+# writer, and synchronous=NORMAL is durable across crashes of the app under WAL.
+SQLITE_PRAGMAS = {
+    "journal_mode": os.getenv("SQLITE_JOURNAL_MODE", "WAL"),
+    "synchronous": os.getenv("SQLITE_SYNCHRONOUS", "NORMAL"),
+    "mmap_size": int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024))),
+    "cache_size": int(os.getenv("SQLITE_CACHE_SIZE", "-65536")),  # negative means KiB, so 64 MiB
+    "busy_timeout": int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000")),
+    "temp_store": "MEMORY",
+}
+
+
+def is_sqlite(url: str):
+    return url.split(":", 1)[0].split("+")[0] == "sqlite"
+
+
+def engine_options(url: str):
+    """create_engine keyword arguments for `url`: a tuned QueuePool, plus thread sharing for SQLite."""
+    options = {
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_pre_ping": not is_sqlite(url),
+        "pool_recycle": DB_POOL_RECYCLE,
+    }
+    if is_sqlite(url):
+        options["connect_args"] = {"check_same_thread": False}
+        if ":memory:" in url or url.rstrip("/").endswith("sqlite:"):
+            # In-memory databases live and die with one connection, so they keep SQLAlchemy's default pool
+            options = {"connect_args": {"check_same_thread": False}}
+    return options
+
+
+def apply_sqlite_pragmas(dbapi_connection, pragmas=None):
+    pragmas = SQLITE_PRAGMAS if pragmas is None else pragmas
+    cursor = dbapi_connection.cursor()
+    for name, value in pragmas.items():
+        cursor.execute(f"PRAGMA {name}={value}")
+    cursor.close()
+
+
+def tune_sqlite(sync_engine, pragmas=None):
+    """Apply `pragmas` (default SQLITE_PRAGMAS) to every connection the engine opens."""
+    @event.listens_for(sync_engine, "connect")
+    def _on_connect(dbapi_connection, connection_record):
+        apply_sqlite_pragmas(dbapi_connection, pragmas)
+
+
+def make_engine(url: str = None, pragmas=None):
+    url = url or DATABASE_URL
+    new_engine = create_engine(url, **engine_options(url))
+    if is_sqlite(url):
+        tune_sqlite(new_engine, pragmas)
+    return new_engine
+
 
 # Create a database engine
-engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
+engine = make_engine(DATABASE_URL)
 
 # Session maker
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Async drivers for the same database, used by the async endpoints
+ASYNC_DRIVERS = {"sqlite": "sqlite+aiosqlite", "postgresql": "postgresql+asyncpg"}
+
+
+def async_url(url: str):
+    scheme, rest = url.split("://", 1)
+    return f"{ASYNC_DRIVERS.get(scheme.split('+')[0], scheme)}://{rest}"
+
+
+ASYNC_DATABASE_URL = async_url(DATABASE_URL)
+
+async_engine = create_async_engine(ASYNC_DATABASE_URL, **engine_options(ASYNC_DATABASE_URL))
+if is_sqlite(ASYNC_DATABASE_URL):
+    tune_sqlite(async_engine.sync_engine)
+
+# expire_on_commit=False so attributes stay readable after commit without an implicit (sync) refresh
+AsyncSessionLocal = async_sessionmaker(async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+
 # Base class for models
 Base = declarative_base()
 
@@ -20,3 +103,50 @@ def get_db():
         yield db
     finally:
         db.close()
+
+# Async counterpart of get_db for `async def` endpoints
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+# Schema upgrades run in one transaction holding the database's write lock (an advisory lock on
+# Postgres), so processes starting together upgrade one at a time instead of racing on DDL
+SCHEMA_LOCK_KEY = 0x706C6169
+
+@contextmanager
+def schema_lock():
+    with engine.begin() as conn:
+        if conn.dialect.name == "postgresql":
+            conn.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": SCHEMA_LOCK_KEY})
+        elif conn.dialect.name == "sqlite":
+            conn.exec_driver_sql("BEGIN IMMEDIATE")
+        yield conn
+
+# create_all() never alters existing tables, so add columns (and their indexes) that a model gained later
+def add_missing_columns(conn, model):
+    table = model.__table__
+    existing = {column["name"] for column in inspect(conn).get_columns(table.name)}
+    added = [column for column in table.columns if column.name not in existing]
+    for column in added:
+        column_type = column.type.compile(dialect=conn.dialect)
+        conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}"))
+    for index in table.indexes:
+        if any(column.name in index.columns for column in added):
+            index.create(conn, checkfirst=True)
+    return [column.name for column in added]
+
+# Likewise for indexes declared after the table was first created
+def ensure_indexes(conn, model):
+    for index in model.__table__.indexes:
+        index.create(conn, checkfirst=True)
+
+def has_index(conn, model, name: str):
+    return name in {index["name"] for index in inspect(conn).get_indexes(model.__tablename__)}
+
+# INSERT with on_conflict_do_update() for the session's database (SQLite or Postgres), for atomic upserts
+def upsert(db, model):
+    if db.get_bind().dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert(model)
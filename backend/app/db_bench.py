@@ -0,0 +1,127 @@
+import argparse
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+import uuid
+from datetime import date, timedelta
+from sqlalchemy import func, select
+from sqlalchemy.orm import sessionmaker
+from app.database import Base, SQLITE_PRAGMAS, make_engine
+from app.models.transaction import Transaction
+from app.synthetic import DEFAULT_END_DATE
+
+# The old engine: rollback journal, full fsync on every commit, default cache
+BASELINE_PRAGMAS = {"journal_mode": "DELETE", "synchronous": "FULL"}
+
+
+def _transaction(day):
+    return Transaction(
+        transaction_id=str(uuid.uuid4()),
+        account_id="bench",
+        name="bench",
+        merchant_name=random.choice(["Starbucks", "Uber", "AMC", "Delta", "Whole Foods"]),
+        amount=round(random.uniform(1, 200), 2),
+        date=day,
+        category='["Food and Drink"]',
+    )
+
+
+def seed(Session, rows: int, end_date: date = DEFAULT_END_DATE):
+    with Session() as db:
+        for start in range(0, rows, 5000):
+            db.add_all(_transaction(end_date - timedelta(days=random.randrange(90))) for _ in range(min(5000, rows - start)))
+            db.commit()
+
+
+def _percentile(values, q):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def run_profile(url: str, pragmas, readers: int, seconds: float, rows: int, end_date: date = DEFAULT_END_DATE):
+    """Readers run a 30-day spending aggregate up to `end_date` while one writer commits single-row inserts on it."""
+    engine = make_engine(url, pragmas)
+    Base.metadata.create_all(engine)
+    Session = sessionmaker(bind=engine, autoflush=False)
+    seed(Session, rows, end_date)
+
+    stop = threading.Event()
+    read_latencies = [[] for _ in range(readers)]
+    write_latencies = []
+    errors = {"read": 0, "write": 0}
+    since = end_date - timedelta(days=30)
+    query = select(Transaction.date, func.sum(Transaction.amount)).where(Transaction.date >= since).group_by(Transaction.date)
+
+    def reader(latencies):
+        with Session() as db:
+            while not stop.is_set():
+                started = time.perf_counter()
+                try:
+                    db.execute(query).all()
+                    db.rollback()  # end the read transaction so the next read sees new rows
+                except Exception:
+                    errors["read"] += 1
+                    db.rollback()
+                    continue
+                latencies.append(time.perf_counter() - started)
+
+    def writer():
+        with Session() as db:
+            while not stop.is_set():
+                started = time.perf_counter()
+                try:
+                    db.add(_transaction(end_date))
+                    db.commit()
+                except Exception:
+                    errors["write"] += 1
+                    db.rollback()
+                    continue
+                write_latencies.append(time.perf_counter() - started)
+
+    threads = [threading.Thread(target=reader, args=(latencies,)) for latencies in read_latencies]
+    threads.append(threading.Thread(target=writer))
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    engine.dispose()
+
+    reads = [latency for latencies in read_latencies for latency in latencies]
+    return {
+        "reads_per_second": round(len(reads) / seconds, 1),
+        "writes_per_second": round(len(write_latencies) / seconds, 1),
+        "read_p50_ms": round(_percentile(reads, 0.5) * 1000, 2) if reads else None,
+        "read_p99_ms": round(_percentile(reads, 0.99) * 1000, 2) if reads else None,
+        "write_p99_ms": round(_percentile(write_latencies, 0.99) * 1000, 2) if write_latencies else None,
+        "errors": errors,
+    }
+
+
+def run(url: str = None, readers: int = 4, seconds: float = 5, rows: int = 20000, end_date: date = DEFAULT_END_DATE):
+    """Compare the old and tuned SQLite settings on scratch databases, or measure `url` as configured."""
+    if url:
+        return {url.split("@")[-1]: run_profile(url, None, readers, seconds, rows, end_date)}
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, pragmas in [("baseline", BASELINE_PRAGMAS), ("tuned", SQLITE_PRAGMAS)]:
+            results[name] = run_profile(f"sqlite:///{os.path.join(tmp, name + '.db')}", pragmas, readers, seconds, rows, end_date)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Read throughput while a concurrent writer commits.")
+    parser.add_argument("--url", default=None, help="Scratch database to measure as configured (rows are seeded into it), e.g. a Postgres URL")
+    parser.add_argument("--readers", type=int, default=4)
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--rows", type=int, default=20000, help="Transactions seeded before measuring")
+    parser.add_argument("--end-date", type=date.fromisoformat, default=DEFAULT_END_DATE,
+                        help=f"last day of seeded history, YYYY-MM-DD (default {DEFAULT_END_DATE})")
+    args = parser.parse_args()
+    print(json.dumps(run(args.url, args.readers, args.seconds, args.rows, args.end_date), indent=2))
@@ -0,0 +1,360 @@
+import random
+import sys
+from collections import defaultdict
+from datetime import date
+from dateutil.relativedelta import relativedelta
+from sqlalchemy import and_, delete, insert, or_, select
+from sqlalchemy.orm import Session
+from app.database import SessionLocal, upsert
+from app.models.daily_category_spending import DailyCategorySpending
+from app.models.forecast_stats import ForecastStats
+
+# Cumulative spend is projected to this day of the month
+FORECAST_DAY = 28
+DAYS = 31
+
+
+def fit_line(n, sum_x, sum_y, sum_xx, sum_xy):
+    """Least-squares (slope, intercept) from regression sums; the same line np.polyfit(x, y, 1) fits."""
+    denominator = n * sum_xx - sum_x * sum_x
+    slope = (n * sum_xy - sum_x * sum_y) / denominator
+    return slope, (sum_y - slope * sum_x) / n
+
+
+def forecast_points(points, at: int = FORECAST_DAY):
+    """Projection at day `at` of a line through (day_of_month, cumulative) points; None below two points."""
+    n = sum_x = sum_y = sum_xx = sum_xy = 0
+    for x, y in points:
+        n += 1
+        sum_x += x
+        sum_y += y
+        sum_xx += x * x
+        sum_xy += x * y
+    if n < 2:
+        return None
+    slope, intercept = fit_line(n, sum_x, sum_y, sum_xx, sum_xy)
+    return float(slope * at + intercept)
+
+
+class MonthSeries:
+    """One (user, category, month): daily totals in 31 slots plus the running regression sums of its forecast.
+
+    The regression points are (day, cumulative spend through that day) for each day with transactions,
+    as the forecast has always used. add() keeps the sums current in a bounded number of steps,
+    so a forecast never revisits the month's transactions.
+    """
+
+    __slots__ = ("totals", "counts", "n", "sum_x", "sum_y", "sum_xx", "sum_xy")
+
+    def __init__(self):
+        self.totals = [0.0] * (DAYS + 1)  # Index by day of month; slot 0 unused
+        self.counts = [0] * (DAYS + 1)
+        self.n = 0
+        self.sum_x = 0
+        self.sum_y = 0.0
+        self.sum_xx = 0
+        self.sum_xy = 0.0
+
+    def add(self, day: int, amount: float, count: int = 1):
+        """Apply one transaction (or a rollup delta; negative count removes)."""
+        was_present = self.counts[day] > 0
+        if was_present:
+            # The day's own point and every later point move by `amount`
+            self._shift_from(day, amount)
+        self.totals[day] += amount
+        self.counts[day] += count
+        is_present = self.counts[day] > 0
+
+        if is_present and not was_present:
+            y = sum(self.totals[1:day + 1])
+            self.n += 1
+            self.sum_x += day
+            self.sum_xx += day * day
+            self.sum_y += y
+            self.sum_xy += day * y
+            self._shift_from(day + 1, amount)
+        elif was_present and not is_present:
+            y = sum(self.totals[1:day + 1])
+            self.n -= 1
+            self.sum_x -= day
+            self.sum_xx -= day * day
+            self.sum_y -= y
+            self.sum_xy -= day * y
+
+    def _shift_from(self, day: int, amount: float):
+        for later in range(day, DAYS + 1):
+            if self.counts[later] > 0:
+                self.sum_y += amount
+                self.sum_xy += later * amount
+
+    def points(self):
+        cumulative = 0.0
+        for day in range(1, DAYS + 1):
+            cumulative += self.totals[day]
+            if self.counts[day] > 0:
+                yield day, cumulative
+
+    def spent(self):
+        """Cumulative spend at the last day with transactions, or None for an empty month."""
+        return sum(self.totals) if self.n else None
+
+    def forecast(self, at: int = FORECAST_DAY):
+        if self.n < 2:
+            return None
+        slope, intercept = fit_line(self.n, self.sum_x, self.sum_y, self.sum_xx, self.sum_xy)
+        return float(slope * at + intercept)
+
+    def stats(self):
+        """The ForecastStats columns for this month."""
+        return {"n": self.n, "sum_x": self.sum_x, "sum_xx": self.sum_xx, "sum_y": self.sum_y,
+                "sum_xy": self.sum_xy, "spent": self.spent() or 0.0}
+
+
+def month_sums(totals, present):
+    """Regression sums (n, sum_x, sum_y, sum_xx, sum_xy, spent) of k months at once, as length-k arrays.
+
+    `totals` is a (k, 31) array of daily spend and `present` a (k, 31) mask of days with transactions.
+    """
+    import numpy as np
+
+    totals = np.asarray(totals, dtype=np.float64)
+    present = np.asarray(present, dtype=bool)
+    days = np.arange(1, DAYS + 1, dtype=np.float64)
+    cumulative = np.cumsum(totals, axis=1)
+
+    weight = present.astype(np.float64)
+    n = weight.sum(axis=1)
+    sum_x = weight @ days
+    sum_xx = weight @ (days * days)
+    sum_y = (weight * cumulative).sum(axis=1)
+    sum_xy = (weight * cumulative) @ days
+    return n, sum_x, sum_y, sum_xx, sum_xy, cumulative[:, -1]
+
+
+def forecast_sums(n, sum_x, sum_y, sum_xx, sum_xy, at: int = FORECAST_DAY):
+    """fit_line over arrays of regression sums, projected to day `at`; NaN where a month has fewer than two days."""
+    import numpy as np
+
+    n, sum_x, sum_y, sum_xx, sum_xy = (np.asarray(value, dtype=np.float64) for value in (n, sum_x, sum_y, sum_xx, sum_xy))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        slope = (n * sum_xy - sum_x * sum_y) / (n * sum_xx - sum_x * sum_x)
+        intercept = (sum_y - slope * sum_x) / n
+        result = slope * at + intercept
+    return np.where(n < 2, np.nan, result)
+
+
+def forecast_many(totals, present, at: int = FORECAST_DAY):
+    """Vectorized forecast for k series at once from their (k, 31) daily totals and presence mask."""
+    return forecast_sums(*month_sums(totals, present)[:5], at=at)
+
+
+STATS_KEYS = ["user_id", "category", "month"]
+STATS_COLUMNS = ["n", "sum_x", "sum_xx", "sum_y", "sum_xy", "spent"]
+
+
+def _key_filter(keys):
+    return or_(*[
+        and_(ForecastStats.user_id == user_id, ForecastStats.category == category, ForecastStats.month == month)
+        for user_id, category, month in keys
+    ])
+
+
+def apply_forecast_deltas(db: Session, deltas):
+    """Update the stored sums of every month that rollup `deltas` touch, inside the caller's transaction.
+
+    Runs before the deltas reach the daily rollups: each month is loaded from its (at most 31) daily
+    rows and the deltas are applied with MonthSeries.add.
+    """
+    changes = defaultdict(list)
+    for (user_id, category, day), (total, count) in deltas.items():
+        changes[(user_id, category, day.replace(day=1))].append((day.day, total, count))
+    if not changes:
+        return
+    keys = sorted(changes, key=str)
+
+    # Create missing rows, then lock them in key order so concurrent writers to one month take turns.
+    # On SQLite the insert alone does it: it takes the database write lock before the reads below.
+    db.execute(upsert(db, ForecastStats).on_conflict_do_nothing(index_elements=STATS_KEYS),
+               [{"user_id": user_id, "category": category, "month": month} for user_id, category, month in keys])
+    if db.get_bind().dialect.name == "postgresql":
+        db.execute(select(ForecastStats.user_id).where(_key_filter(keys)).order_by(*STATS_KEYS).with_for_update()).all()
+
+    series = {key: MonthSeries() for key in keys}
+    daily = DailyCategorySpending
+    months = {month for _, _, month in keys}
+    rows = db.execute(
+        select(daily.user_id, daily.category, daily.day, daily.total, daily.count)
+        .where(daily.user_id.in_({user_id for user_id, _, _ in keys}),
+               daily.category.in_({category for _, category, _ in keys}),
+               daily.day >= min(months), daily.day < max(months) + relativedelta(months=1))
+        .order_by(daily.day)
+    )
+    for user_id, category, day, total, count in rows:
+        month_series = series.get((user_id, category, day.replace(day=1)))
+        if month_series is not None:
+            month_series.add(day.day, total, count)
+    for key, month_changes in changes.items():
+        for day, total, count in month_changes:
+            series[key].add(day, total, count)
+
+    filled = [dict(zip(STATS_KEYS, key), **month_series.stats()) for key, month_series in series.items() if month_series.n]
+    if filled:
+        statement = upsert(db, ForecastStats)
+        statement = statement.on_conflict_do_update(
+            index_elements=STATS_KEYS, set_={column: statement.excluded[column] for column in STATS_COLUMNS}
+        )
+        db.execute(statement, filled)
+    emptied = [key for key, month_series in series.items() if not month_series.n]
+    if emptied:
+        db.execute(delete(ForecastStats).where(_key_filter(emptied)))
+
+
+def _expected_stats(db: Session):
+    """{(user_id, category, month): ForecastStats columns} recomputed from the daily rollups in one NumPy pass."""
+    import numpy as np
+
+    daily = DailyCategorySpending
+    index = {}
+    cells = []
+    for user_id, category, day, total in db.execute(
+        select(daily.user_id, daily.category, daily.day, daily.total).where(daily.count > 0)
+    ):
+        row = index.setdefault((user_id, category, day.replace(day=1)), len(index))
+        cells.append((row, day.day - 1, total))
+
+    totals = np.zeros((len(index), DAYS))
+    present = np.zeros((len(index), DAYS), dtype=bool)
+    if cells:
+        rows, days, amounts = zip(*cells)
+        np.add.at(totals, (rows, days), amounts)
+        present[rows, days] = True
+    n, sum_x, sum_y, sum_xx, sum_xy, spent = month_sums(totals, present)
+    return {
+        key: {"n": int(n[i]), "sum_x": int(sum_x[i]), "sum_xx": int(sum_xx[i]), "sum_y": float(sum_y[i]),
+              "sum_xy": float(sum_xy[i]), "spent": float(spent[i])}
+        for key, i in index.items()
+    }
+
+
+def rebuild_forecast_stats(db: Session, batch_size: int = 10000):
+    """Drop and recompute every month's sums from the daily rollups; the caller commits."""
+    db.execute(delete(ForecastStats))
+    rows = [dict(zip(STATS_KEYS, key), **stats) for key, stats in _expected_stats(db).items()]
+    for start in range(0, len(rows), batch_size):
+        db.execute(insert(ForecastStats), rows[start:start + batch_size])
+    return len(rows)
+
+
+def check_forecast_stats(db: Session, tolerance: float = 1e-6):
+    """Compare the stored sums with the daily rollups; returns a list of mismatch descriptions."""
+    expected = _expected_stats(db)
+    stored = {
+        (row.user_id, row.category, row.month): {column: getattr(row, column) for column in STATS_COLUMNS}
+        for row in db.scalars(select(ForecastStats))
+    }
+    problems = []
+    for key in sorted(set(expected) | set(stored), key=str):
+        want, have = expected.get(key), stored.get(key)
+        if want is None or have is None or any(
+            abs(want[column] - have[column]) > tolerance * max(1, abs(want[column])) for column in STATS_COLUMNS
+        ):
+            problems.append(f"forecast {key}: expected {want}, found {have}")
+    return problems
+
+
+def forecast_users(db: Session, user_ids, categories, month: date, at: int = FORECAST_DAY):
+    """{(user_id, category): (spent, forecast)} for many users from one query and one NumPy call.
+
+    `month` is the month's first day; spent is None for a month without transactions and the
+    forecast None below two days.
+    """
+    import numpy as np
+
+    keys = [(user_id, category) for user_id in user_ids for category in categories]
+    columns = [getattr(ForecastStats, column) for column in ["n", "sum_x", "sum_y", "sum_xx", "sum_xy", "spent"]]
+    stats = {
+        (user_id, category): values
+        for user_id, category, *values in db.execute(
+            select(ForecastStats.user_id, ForecastStats.category, *columns).where(
+                ForecastStats.user_id.in_(list(user_ids)),
+                ForecastStats.category.in_(list(categories)),
+                ForecastStats.month == month,
+            )
+        )
+    }
+    values = np.array([stats.get(key, [0] * 6) for key in keys], dtype=np.float64).reshape(-1, 6)
+    forecasts = forecast_sums(*values[:, :5].T, at=at)
+    return {
+        key: (float(values[i, 5]) if key in stats else None, None if np.isnan(forecasts[i]) else float(forecasts[i]))
+        for i, key in enumerate(keys)
+    }
+
+
+def check_equivalence(trials: int = 2000, seed: int = 0, tolerance: float = 1e-9):
+    """Compare every forecast path with np.polyfit on random months; returns a list of mismatches."""
+    import numpy as np
+
+    rng = random.Random(seed)
+    problems = []
+    totals = np.zeros((trials, DAYS))
+    present = np.zeros((trials, DAYS), dtype=bool)
+    sums = []
+    expected = []
+    for trial in range(trials):
+        series = MonthSeries()
+        for _ in range(rng.randint(0, 60)):
+            day = rng.randint(1, DAYS)
+            if series.counts[day] > 0 and rng.random() < 0.2:
+                series.add(day, -series.totals[day], -series.counts[day])  # Delete the whole day
+            else:
+                series.add(day, round(rng.uniform(-50, 300), 2))
+        points = list(series.points())
+        for day, _ in points:
+            totals[trial, day - 1] = series.totals[day]
+            present[trial, day - 1] = True
+        sums.append((series.n, series.sum_x, series.sum_y, series.sum_xx, series.sum_xy))
+
+        if len(points) < 2:
+            want = None
+        else:
+            slope, intercept = np.polyfit([x for x, _ in points], [y for _, y in points], 1)
+            want = float(slope * FORECAST_DAY + intercept)
+        expected.append(want)
+
+        for name, got in [("incremental", series.forecast()), ("points", forecast_points(points))]:
+            if (got is None) != (want is None) or (want is not None and abs(got - want) > tolerance * max(1, abs(want))):
+                problems.append(f"trial {trial} {name}: expected {want}, got {got}")
+
+    # The batch paths: from daily totals, and from the stored sums as forecast_users reads them
+    for name, forecasts in [("vectorized", forecast_many(totals, present)), ("stored sums", forecast_sums(*np.array(sums).T))]:
+        for trial, (want, got) in enumerate(zip(expected, forecasts)):
+            if (want is None) != bool(np.isnan(got)) or (want is not None and abs(got - want) > tolerance * max(1, abs(want))):
+                problems.append(f"trial {trial} {name}: expected {want}, got {got}")
+    return problems
+
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else "check"
+    if command == "check":
+        problems = check_equivalence()
+        for problem in problems[:20]:
+            print(problem)
+        print("Forecasts match np.polyfit." if not problems else f"{len(problems)} forecasts differ from np.polyfit.")
+        sys.exit(1 if problems else 0)
+    elif command == "users":
+        from app.models import create_tables
+        from app.models.user import User
+        from app.recompute import TRACKED_CATEGORIES, month_range
+
+        create_tables()
+        db = SessionLocal()
+        try:
+            user_ids = [user_id for (user_id,) in db.query(User.id)]
+            first_day, _ = month_range()
+            for (user_id, category), (spent, value) in forecast_users(db, user_ids, TRACKED_CATEGORIES, first_day).items():
+                print(user_id, category, spent, value)
+        finally:
+            db.close()
+    else:
+        print("usage: python -m app.forecast [check|users]")
+        sys.exit(2)
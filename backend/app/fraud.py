@@ -0,0 +1,187 @@
+import argparse
+import os
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+import numpy as np
+from sqlalchemy import select
+from app.database import SessionLocal
+from app.categories import parse_categories
+from app.ml import MODEL_PATH, ENCODER_PATH, FEATURES, load_booster, load_encoding_tables, model_version, predict_scores
+from app.models import create_tables
+from app.models.transaction import Transaction
+from app.models.score_backfill import ScoreBackfill
+
+# Plaid dates carry no time and trans_num is an opaque training id; /alert uses the same placeholders
+DEFAULT_HOUR = 3
+TRANS_NUM_PLACEHOLDER = "ce303c21bbecc75334b69a642c9716c3"
+
+
+def build_features(rows, tables):
+    """Feature matrix for (merchant, first category, amount, date) rows, in FEATURES order."""
+    n = len(rows)
+    merchants = [row[0] for row in rows]
+    categories = [row[1] for row in rows]
+    dates = [row[3] for row in rows]
+
+    matrix = np.empty((n, len(FEATURES)), dtype=np.float32)
+    matrix[:, 0] = tables["merchant"].encode_many(merchants)
+    matrix[:, 1] = tables["category"].encode_many(categories)
+    matrix[:, 2] = np.fromiter((row[2] or 0 for row in rows), dtype=np.float32, count=n)
+    matrix[:, 3] = tables["trans_num"].encode(TRANS_NUM_PLACEHOLDER)
+    matrix[:, 4] = DEFAULT_HOUR
+    matrix[:, 5] = np.fromiter((d.weekday() for d in dates), dtype=np.float32, count=n)
+    matrix[:, 6] = np.fromiter((d.day for d in dates), dtype=np.float32, count=n)
+    matrix[:, 7] = np.fromiter((d.month for d in dates), dtype=np.float32, count=n)
+    return matrix
+
+
+# Each pool process loads the booster once and reuses it for every chunk
+_worker_booster = None
+
+
+def _init_worker(model_path):
+    global _worker_booster
+    _worker_booster = load_booster(model_path)
+    _worker_booster.set_param({"nthread": 1})
+
+
+def _score_chunk(matrix):
+    return predict_scores(_worker_booster, matrix)
+
+
+def _read_chunk(db, after_id, chunk_size):
+    rows = db.execute(
+        select(Transaction.id, Transaction.merchant_name, Transaction.category, Transaction.amount, Transaction.date)
+        .where(Transaction.id > after_id, Transaction.date.isnot(None))
+        .order_by(Transaction.id)
+        .limit(chunk_size)
+    ).all()
+    ids = [row[0] for row in rows]
+    features = [
+        (merchant, (parse_categories(raw) or [None])[0], amount, tx_date)
+        for _, merchant, raw, amount, tx_date in rows
+    ]
+    return ids, features
+
+
+def run_backfill(chunk_size: int = 50000, workers: int = None, limit: int = None, restart: bool = False,
+                 model_path: str = MODEL_PATH, encoder_path: str = ENCODER_PATH, log=print):
+    """Score every transaction with the current model, resuming from the stored id watermark.
+
+    Chunks are encoded in this process and scored in a process pool; each chunk's scores and the
+    new watermark are committed together, so an interrupted run continues where it stopped.
+    """
+    create_tables()
+
+    version = model_version(model_path)
+    tables = load_encoding_tables(encoder_path)
+    workers = os.cpu_count() if workers is None else workers
+
+    db = SessionLocal()
+    pool = ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(model_path,)) if workers > 0 else None
+    booster = load_booster(model_path) if pool is None else None
+    try:
+        state = db.get(ScoreBackfill, version)
+        if state is None:
+            state = ScoreBackfill(model_version=version, last_transaction_id=0, scored=0)
+            db.add(state)
+        if restart:
+            state.last_transaction_id = 0
+            state.scored = 0
+        db.commit()
+
+        in_flight = deque()
+        cursor = state.last_transaction_id
+        remaining = limit
+        max_in_flight = max(1, workers) * 2
+
+        def write(ids, scores):
+            db.bulk_update_mappings(Transaction, [
+                {"id": tx_id, "fraud_score": float(score), "fraud_model_version": version}
+                for tx_id, score in zip(ids, scores)
+            ])
+            state.last_transaction_id = ids[-1]
+            state.scored += len(ids)
+            state.updated_at = datetime.now()
+            db.commit()
+            log(f"[{version}] scored through id {ids[-1]} ({state.scored} total)")
+
+        while remaining is None or remaining > 0:
+            ids, rows = _read_chunk(db, cursor, chunk_size if remaining is None else min(chunk_size, remaining))
+            if not ids:
+                break
+            cursor = ids[-1]
+            if remaining is not None:
+                remaining -= len(ids)
+            matrix = build_features(rows, tables)
+            if pool is None:
+                write(ids, predict_scores(booster, matrix))
+                continue
+            # Chunks are committed in submission order so the watermark never skips unscored rows
+            in_flight.append((ids, pool.submit(_score_chunk, matrix)))
+            if len(in_flight) >= max_in_flight:
+                done_ids, future = in_flight.popleft()
+                write(done_ids, future.result())
+
+        while in_flight:
+            done_ids, future = in_flight.popleft()
+            write(done_ids, future.result())
+
+        return {
+            "model_version": version,
+            "last_transaction_id": state.last_transaction_id,
+            "scored": state.scored,
+        }
+    finally:
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+        db.close()
+
+
+# Backfill started from the API runs on one background thread at a time
+_backfill_thread = None
+_backfill_error = None
+
+
+def start_backfill(**kwargs):
+    global _backfill_thread, _backfill_error
+    if _backfill_thread is not None and _backfill_thread.is_alive():
+        return False
+
+    def run():
+        global _backfill_error
+        try:
+            run_backfill(**kwargs)
+        except Exception as e:
+            _backfill_error = str(e)
+            raise
+
+    _backfill_error = None
+    _backfill_thread = threading.Thread(target=run, name="fraud-backfill", daemon=True)
+    _backfill_thread.start()
+    return True
+
+
+def backfill_status(db, model_path: str = MODEL_PATH):
+    version = model_version(model_path)
+    state = db.get(ScoreBackfill, version)
+    return {
+        "model_version": version,
+        "running": _backfill_thread is not None and _backfill_thread.is_alive(),
+        "last_transaction_id": state.last_transaction_id if state else 0,
+        "scored": state.scored if state else 0,
+        "updated_at": state.updated_at if state else None,
+        "error": _backfill_error,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Backfill fraud scores for all stored transactions.")
+    parser.add_argument("--chunk-size", type=int, default=50000)
+    parser.add_argument("--workers", type=int, default=None, help="Scoring processes (0 scores in-process)")
+    parser.add_argument("--limit", type=int, default=None, help="Stop after this many transactions")
+    parser.add_argument("--restart", action="store_true", help="Ignore the watermark and rescore everything")
+    args = parser.parse_args()
+    print(run_backfill(chunk_size=args.chunk_size, workers=args.workers, limit=args.limit, restart=args.restart))
@@ -0,0 +1,240 @@
+import argparse
+import datetime
+import threading
+from sqlalchemy import delete, insert
+from sqlalchemy.orm import Session, selectinload
+from app.database import SessionLocal, upsert
+from app.models import create_tables
+from app.models.user import User
+from app.models.transaction import Transaction
+from app.models.transaction_category import TransactionCategory
+from app.models.plaid_item import PlaidItem
+from app.models.account import Account
+from app.categories import set_categories
+from app.rollups import add_to_rollups, remove_from_rollups, ensure_rollups
+from app.plaid_client import PlaidError, plaid
+
+SYNC_PAGE_SIZE = 500
+UPSERT_CHUNK_SIZE = 500
+MAX_PAGINATION_RESTARTS = 3
+SYNC_LOCK_STRIPES = 64
+
+# One sync at a time per user in this process; concurrent syncs would insert the same accounts and rows.
+# Users share a fixed set of locks (by id), so the set does not grow with the number of users.
+_sync_locks = [threading.Lock() for _ in range(SYNC_LOCK_STRIPES)]
+
+# Columns an upsert writes; user_id is added when the sync has an owner
+SYNCED_COLUMNS = ["account_id", "name", "merchant_name", "amount", "date", "category", "payment_channel", "currency"]
+
+
+def sync_pages(access_token: str, cursor: str = None, post=plaid.post, count: int = SYNC_PAGE_SIZE):
+    """Yield /transactions/sync pages starting after `cursor` until Plaid reports has_more=False."""
+    while True:
+        payload = {"access_token": access_token, "count": count}
+        if cursor:
+            payload["cursor"] = cursor
+        page = post("/transactions/sync", payload)
+        yield page
+        cursor = page["next_cursor"]
+        if not page.get("has_more"):
+            return
+
+
+def _chunks(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def _apply_fields(tx: Transaction, data: dict, user_id: int = None):
+    if user_id is not None:
+        tx.user_id = user_id  # Before set_categories, which copies the owner onto the category rows
+    tx.account_id = data["account_id"]
+    tx.name = data.get("name")
+    tx.merchant_name = data.get("merchant_name")
+    tx.amount = data["amount"]
+    tx.date = datetime.date.fromisoformat(data["date"]) if isinstance(data["date"], str) else data["date"]
+    tx.payment_channel = data.get("payment_channel")
+    tx.currency = data.get("iso_currency_code")
+    set_categories(tx, data.get("category") or [])
+
+
+def link_item(db: Session, user: User, access_token: str, item_id: str = None, cursor: str = None):
+    """Record a linked Plaid item for `user` (matched on item_id, else access_token); the caller commits."""
+    match = PlaidItem.item_id == item_id if item_id else PlaidItem.access_token == access_token
+    item = db.query(PlaidItem).filter(match).first()
+    if item is None:
+        item = PlaidItem(item_id=item_id, cursor=cursor)
+        db.add(item)
+    item.user_id = user.id
+    item.access_token = access_token
+    user.access_token = access_token  # Kept for callers that still read the single-item field
+    db.flush()
+    return item
+
+
+def upsert_accounts(db: Session, accounts, user_id: int, item_id: int = None):
+    for data in accounts:
+        account = db.get(Account, data["account_id"])
+        if account is None:
+            account = Account(account_id=data["account_id"])
+            db.add(account)
+        account.user_id = user_id
+        account.item_id = item_id
+        account.name = data.get("name")
+        account.mask = data.get("mask")
+        account.type = data.get("type")
+        account.subtype = data.get("subtype")
+
+
+def apply_changes(db: Session, upserts, removed_ids, user_id: int = None):
+    """Upsert Plaid transactions and delete removed ones, keyed on transaction_id, with rollups kept in step.
+
+    Upserted rows are owned by `user_id`, and removals only touch that user's rows.
+    Works in chunks and leaves committing to the caller. Re-applying the same page is harmless.
+    Each chunk is one read of the old versions (for the rollups), one INSERT ... ON CONFLICT DO UPDATE
+    and a bulk rewrite of its category rows.
+    """
+    counts = {"added": 0, "modified": 0, "removed": 0}
+    by_id = {data["transaction_id"]: data for data in upserts}
+    removed_ids = [tx_id for tx_id in dict.fromkeys(removed_ids) if tx_id not in by_id]
+    columns = SYNCED_COLUMNS + (["user_id"] if user_id is not None else [])
+
+    for chunk in _chunks(list(by_id) + removed_ids, UPSERT_CHUNK_SIZE):
+        existing = {
+            tx.transaction_id: tx
+            for tx in db.query(Transaction).options(selectinload(Transaction.categories))
+            .filter(Transaction.transaction_id.in_(chunk))
+        }
+        if user_id is not None:
+            # Another user's row is never removed on this user's behalf
+            existing = {tx_id: tx for tx_id, tx in existing.items() if tx_id in by_id or tx.user_id == user_id}
+        # Take the old versions out of the rollups before they change or disappear
+        remove_from_rollups(db, list(existing.values()))
+
+        gone = [existing[tx_id].id for tx_id in chunk if tx_id not in by_id and tx_id in existing]
+        # Existing rows keep their id, so their old category rows are replaced below
+        replaced = [existing[tx_id].id for tx_id in chunk if tx_id in by_id and tx_id in existing]
+        if gone or replaced:
+            db.execute(delete(TransactionCategory).where(TransactionCategory.transaction_id.in_(gone + replaced))
+                       .execution_options(synchronize_session=False))
+        if gone:
+            db.execute(delete(Transaction).where(Transaction.id.in_(gone)).execution_options(synchronize_session=False))
+            counts["removed"] += len(gone)
+
+        # Detached Transactions carry the new versions: the upsert's rows, then the rollup additions
+        current = []
+        for tx_id in chunk:
+            if tx_id in by_id:
+                tx = Transaction(transaction_id=tx_id)
+                _apply_fields(tx, by_id[tx_id], user_id)
+                current.append(tx)
+        if not current:
+            continue
+        counts["modified"] += len(replaced)
+        counts["added"] += len(current) - len(replaced)
+
+        statement = upsert(db, Transaction)
+        statement = statement.on_conflict_do_update(
+            index_elements=["transaction_id"], set_={column: statement.excluded[column] for column in columns}
+        ).returning(Transaction.transaction_id, Transaction.id, Transaction.user_id)
+        stored = {
+            tx_id: (row_id, owner)
+            for tx_id, row_id, owner in db.execute(
+                statement, [{"transaction_id": tx.transaction_id, **{column: getattr(tx, column) for column in columns}}
+                            for tx in current]
+            )
+        }
+        mappings = []
+        for tx in current:
+            tx.id, tx.user_id = stored[tx.transaction_id]  # A sync without an owner keeps the stored one
+            mappings += [{"transaction_id": tx.id, "user_id": tx.user_id, "category": row.category, "date": tx.date}
+                         for row in tx.categories]
+        if mappings:
+            db.execute(insert(TransactionCategory), mappings)
+
+        add_to_rollups(db, current)
+    return counts
+
+
+def sync_transactions(db: Session, access_token: str, cursor: str = None, post=plaid.post,
+                      user_id: int = None, item: PlaidItem = None):
+    """Pull everything after `cursor` and apply it page by page; returns (next_cursor, counts).
+
+    With `user_id`, the synced accounts and transactions are owned by that user (under `item`).
+
+    Each page is committed as it is applied. If Plaid reports that the item changed mid-pagination,
+    pagination restarts from the original cursor, which is safe because the upserts are idempotent.
+    """
+    for attempt in range(MAX_PAGINATION_RESTARTS + 1):
+        totals = {"added": 0, "modified": 0, "removed": 0, "pages": 0}
+        try:
+            next_cursor = cursor
+            for page in sync_pages(access_token, cursor, post=post):
+                if user_id is not None:
+                    upsert_accounts(db, page.get("accounts", []), user_id, item.id if item else None)
+                counts = apply_changes(
+                    db,
+                    page.get("added", []) + page.get("modified", []),
+                    [removed["transaction_id"] for removed in page.get("removed", [])],
+                    user_id,
+                )
+                db.commit()
+                for key, value in counts.items():
+                    totals[key] += value
+                totals["pages"] += 1
+                next_cursor = page["next_cursor"]
+            return next_cursor, totals
+        except PlaidError as e:
+            db.rollback()
+            if e.error_code != "TRANSACTIONS_SYNC_MUTATION_DURING_PAGINATION" or attempt == MAX_PAGINATION_RESTARTS:
+                raise
+
+
+def sync_user(db: Session, user: User, post=plaid.post):
+    """Incremental sync of every item a user linked; each cursor is stored only once its pagination completes."""
+    with _sync_locks[user.id % SYNC_LOCK_STRIPES]:
+        return _sync_user(db, user, post)
+
+
+def _sync_user(db: Session, user: User, post):
+    items = db.query(PlaidItem).filter(PlaidItem.user_id == user.id).order_by(PlaidItem.id).all()
+    if not items and user.access_token:
+        # Linked before items were tracked: adopt the token; the first sync re-applies its history harmlessly
+        items = [link_item(db, user, user.access_token)]
+        db.commit()
+    if not items:
+        raise ValueError(f"User {user.username} has no linked bank account")
+
+    totals = {"added": 0, "modified": 0, "removed": 0, "pages": 0}
+    for item in items:
+        next_cursor, counts = sync_transactions(db, item.access_token, item.cursor, post=post, user_id=user.id, item=item)
+        item.cursor = next_cursor
+        db.commit()
+        for key, value in counts.items():
+            totals[key] += value
+    return totals
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Incrementally sync Plaid transactions into the database.")
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument("--username", help="Sync a linked user and store their cursor")
+    group.add_argument("--access-token", help="Sync an access token directly, starting from --cursor")
+    parser.add_argument("--cursor", default=None)
+    args = parser.parse_args()
+
+    create_tables()
+    db = SessionLocal()
+    try:
+        ensure_rollups(db)  # Incremental updates below assume the totals start complete
+        if args.username:
+            user = db.query(User).filter(User.username == args.username).first()
+            if not user:
+                raise SystemExit(f"User {args.username} not found")
+            print(sync_user(db, user))
+        else:
+            next_cursor, totals = sync_transactions(db, args.access_token, args.cursor)
+            print(totals)
+            print(f"next_cursor: {next_cursor}")
+    finally:
+        db.close()
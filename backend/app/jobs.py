@@ -0,0 +1,134 @@
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class CoalescingQueue:
+    """Runs `handler(key)` on a background thread after a key is marked dirty.
+
+    Marking a key that is already waiting does not queue a second run, so a burst
+    of writes for one user collapses into a single recompute. Marks that arrive
+    while a key is being processed queue exactly one follow-up run.
+    """
+
+    def __init__(self, handler, name: str = "jobs", debounce: float = 0.05):
+        self.handler = handler
+        self.name = name
+        self.debounce = debounce
+        self._pending = {}  # key -> monotonic time it was first marked; insertion order is FIFO
+        self._running = set()
+        self._cond = threading.Condition()
+        self._thread = None
+        self._stopping = False
+
+        self.marked = 0
+        self.coalesced = 0
+        self.processed = 0
+        self.failed = 0
+        self.last_lag = None
+        self.last_duration = None
+        self.last_error = None
+
+    def mark_dirty(self, key):
+        with self._cond:
+            self.marked += 1
+            if key in self._pending:
+                self.coalesced += 1
+            else:
+                self._pending[key] = time.monotonic()
+            self._ensure_worker()
+            self._cond.notify_all()
+
+    def is_stale(self, key) -> bool:
+        """True while derived values for `key` are waiting for or undergoing a recompute."""
+        with self._cond:
+            return key in self._pending or key in self._running
+
+    def depth(self) -> int:
+        with self._cond:
+            return len(self._pending)
+
+    def stats(self):
+        with self._cond:
+            now = time.monotonic()
+            oldest = min(self._pending.values(), default=None)
+            return {
+                "queue_depth": len(self._pending),
+                "in_progress": len(self._running),
+                "oldest_pending_seconds": now - oldest if oldest is not None else 0.0,
+                "last_lag_seconds": self.last_lag,
+                "last_duration_seconds": self.last_duration,
+                "marked": self.marked,
+                "coalesced": self.coalesced,
+                "processed": self.processed,
+                "failed": self.failed,
+                "last_error": self.last_error,
+            }
+
+    def drain(self, timeout: float = None) -> bool:
+        """Block until nothing is pending or running. Returns False on timeout."""
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        with self._cond:
+            while self._pending or self._running:
+                remaining = deadline - time.monotonic() if deadline is not None else None
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    def stop(self, timeout: float = None):
+        """Finish the pending work and stop the worker thread."""
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+            thread = self._thread
+        if thread is not None:
+            thread.join(timeout)
+
+    def _ensure_worker(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stopping = False
+            self._thread = threading.Thread(target=self._run, name=f"{self.name}-worker", daemon=True)
+            self._thread.start()
+
+    def _next_key(self):
+        """Wait for the oldest pending key to settle for `debounce` seconds, then claim it."""
+        with self._cond:
+            while True:
+                if not self._pending:
+                    if self._stopping:
+                        return None, None
+                    self._cond.wait()
+                    continue
+                key, marked_at = next(iter(self._pending.items()))
+                wait = marked_at + self.debounce - time.monotonic()
+                if wait > 0 and not self._stopping:
+                    self._cond.wait(wait)
+                    continue
+                del self._pending[key]
+                self._running.add(key)
+                return key, marked_at
+
+    def _run(self):
+        while True:
+            key, marked_at = self._next_key()
+            if key is None:
+                return
+            started = time.monotonic()
+            error = None
+            try:
+                self.handler(key)
+            except Exception as e:
+                logger.exception("%s: job for %r failed", self.name, key)
+                error = f"{key!r}: {e}"
+            with self._cond:
+                self._running.discard(key)
+                self.processed += 1
+                self.last_lag = started - marked_at
+                self.last_duration = time.monotonic() - started
+                if error is not None:
+                    self.failed += 1
+                    self.last_error = error
+                self._cond.notify_all()
@@ -0,0 +1,250 @@
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from datetime import date
+from app.plaid_emulator import create_emulator, free_port, serve_in_thread
+
+DEFAULT_MIX = "dashboard=60,add_burst=20,alert=10,link=10"
+DEFAULT_CONCURRENCY = "1,4,16"
+ADD_BURST_SIZE = 5
+
+
+class Recorder:
+    """Latencies and failures per route for one concurrency level."""
+
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.statuses = defaultdict(lambda: defaultdict(int))
+
+    async def call(self, client, method: str, path: str, route: str = None, **kwargs):
+        route = route or f"{method.upper()} {path}"
+        started = time.perf_counter()
+        try:
+            response = await client.request(method, path, **kwargs)
+            status = response.status_code
+        except Exception as e:
+            response, status = None, type(e).__name__
+        self.latencies[route].append(time.perf_counter() - started)
+        self.statuses[route][str(status)] += 1
+        if response is None or response.status_code >= 400:
+            self.errors[route] += 1
+        return response
+
+    def report(self, elapsed: float):
+        routes = {}
+        for route, samples in sorted(self.latencies.items()):
+            samples = sorted(samples)
+            routes[route] = {
+                "requests": len(samples),
+                "errors": self.errors[route],
+                "statuses": dict(self.statuses[route]),
+                "throughput_rps": len(samples) / elapsed,
+                "p50_ms": _percentile(samples, 0.50) * 1000,
+                "p95_ms": _percentile(samples, 0.95) * 1000,
+                "p99_ms": _percentile(samples, 0.99) * 1000,
+            }
+        return routes
+
+
+def _percentile(values, q):
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def parse_mix(mix: str):
+    weights = {}
+    for part in mix.split(","):
+        name, weight = part.split("=")
+        if name not in SCENARIOS:
+            raise ValueError(f"Unknown scenario {name}; choose from {', '.join(SCENARIOS)}")
+        weights[name] = float(weight)
+    return weights
+
+
+# Scenarios: one user action each, as the frontend or a linking user would issue it
+
+async def dashboard(client, plaid, recorder, username, rng):
+    await recorder.call(client, "get", "/dashboard", params={"username": username})
+    await recorder.call(client, "get", "/transactions", params={"username": username})
+
+
+async def add_burst(client, plaid, recorder, username, rng):
+    for _ in range(ADD_BURST_SIZE):
+        await recorder.call(client, "post", "/add_transaction", json={
+            "username": username, "name": "load", "merchant_name": rng.choice(["Starbucks", "Uber", "AMC"]),
+            "amount": round(rng.uniform(1, 100), 2), "date": str(date.today()),
+            "category": rng.choice([["Food and Drink"], ["Entertainment"], ["Travel"]]), "payment_channel": "online",
+        })
+
+
+async def alert(client, plaid, recorder, username, rng):
+    await recorder.call(client, "post", "/alert", params={"username": username})
+
+
+async def link(client, plaid, recorder, username, rng):
+    """Plaid Link end to end: link token, the public token Link would return, exchange, then sync."""
+    await recorder.call(client, "post", "/create_link_token")
+    response = await plaid.post("/sandbox/public_token/create", json={"institution_id": "ins_109508", "initial_products": ["transactions"]})
+    if response.status_code != 200:
+        return
+    public_token = response.json()["public_token"]
+    await recorder.call(client, "post", "/exchange_public_token", json={"username": username, "public_token": public_token})
+    await recorder.call(client, "post", "/sync_transactions", params={"username": username})
+
+
+SCENARIOS = {"dashboard": dashboard, "add_burst": add_burst, "alert": alert, "link": link}
+
+
+async def run_level(client, plaid, usernames, concurrency: int, seconds: float, mix, seed: int):
+    """`concurrency` virtual users loop over the weighted scenarios for `seconds`."""
+    recorder = Recorder()
+    names, weights = list(mix), list(mix.values())
+    deadline = time.monotonic() + seconds
+
+    async def virtual_user(index):
+        rng = random.Random(f"{seed}:{concurrency}:{index}")
+        username = usernames[index % len(usernames)]
+        while time.monotonic() < deadline:
+            scenario = rng.choices(names, weights)[0]
+            await SCENARIOS[scenario](client, plaid, recorder, username, rng)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(virtual_user(i) for i in range(concurrency)))
+    return recorder.report(time.perf_counter() - started)
+
+
+async def prepare_users(client, plaid, count: int):
+    """Create the load users and link each one once, so every scenario has data to read."""
+    usernames = [f"load-{i}" for i in range(count)]
+    setup = Recorder()
+    for username in usernames:
+        await setup.call(client, "post", "/login", json={"username": username, "password": "load"})
+        await link(client, plaid, setup, username, random.Random(username))
+    failed = {route: count for route, count in setup.errors.items() if count}
+    if failed:
+        raise RuntimeError(f"Setup failed: {failed}")
+    return usernames
+
+
+async def run(client, plaid, args):
+    mix = parse_mix(args.mix)
+    usernames = await prepare_users(client, plaid, args.users)
+    results = {}
+    for concurrency in [int(level) for level in args.concurrency.split(",")]:
+        results[str(concurrency)] = await run_level(client, plaid, usernames, concurrency, args.seconds, mix, args.seed)
+        print_level(concurrency, results[str(concurrency)])
+    return results
+
+
+def print_level(concurrency, routes):
+    print(f"\nconcurrency {concurrency}")
+    print(f"  {'route':32} {'reqs':>6} {'errs':>5} {'rps':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for route, stats in routes.items():
+        print(f"  {route:32} {stats['requests']:6} {stats['errors']:5} {stats['throughput_rps']:8.1f} "
+              f"{stats['p50_ms']:8.1f} {stats['p95_ms']:8.1f} {stats['p99_ms']:8.1f}")
+
+
+async def run_in_process(plaid_url: str, args):
+    """Drive app.main through ASGI in this process; DATABASE_URL and PLAID_BASE_URL must already be set."""
+    import httpx
+    from app import main
+
+    async with main.lifespan(main.app):
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://app", timeout=60) as client, \
+                httpx.AsyncClient(base_url=plaid_url, timeout=60) as plaid:
+            results = await run(client, plaid, args)
+        main.recompute_queue.drain(timeout=60)
+    return results
+
+
+async def run_over_http(app_url: str, plaid_url: str, args):
+    import httpx
+
+    limits = httpx.Limits(max_connections=max(int(level) for level in args.concurrency.split(",")) * 2)
+    async with httpx.AsyncClient(base_url=app_url, timeout=60, limits=limits) as client, \
+            httpx.AsyncClient(base_url=plaid_url, timeout=60) as plaid:
+        return await run(client, plaid, args)
+
+
+def start_uvicorn(env, port: int):
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+        env=env,
+    )
+    import httpx
+
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"uvicorn exited with {process.returncode}")
+        try:
+            httpx.get(f"http://127.0.0.1:{port}/startup_report", timeout=1)
+            return process
+        except httpx.TransportError:
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError("uvicorn did not start")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Concurrent load test of the app against a local Plaid emulator, on a scratch database."
+    )
+    parser.add_argument("--target", choices=["inprocess", "uvicorn"], default="inprocess",
+                        help="drive the app through ASGI in this process, or over HTTP on a local uvicorn")
+    parser.add_argument("--url", default=None, help="load an already running app instead (it must use the emulator you point it at)")
+    parser.add_argument("--plaid-url", default=None, help="with --url: the Plaid emulator that app is configured with")
+    parser.add_argument("--concurrency", default=DEFAULT_CONCURRENCY, help="comma-separated virtual user counts, run in turn")
+    parser.add_argument("--seconds", type=float, default=10, help="duration of each concurrency level")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help=f"scenario weights, from {', '.join(SCENARIOS)}")
+    parser.add_argument("--users", type=int, default=8, help="distinct users the virtual users act as")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--plaid-latency-ms", type=float, default=50)
+    parser.add_argument("--plaid-jitter-ms", type=float, default=50)
+    parser.add_argument("--plaid-error-rate", type=float, default=0.0)
+    parser.add_argument("--plaid-rate-limit-rate", type=float, default=0.0)
+    parser.add_argument("--plaid-transactions", type=int, default=200, help="history length per linked item")
+    parser.add_argument("--output", default=None, help="write the results as JSON")
+    args = parser.parse_args()
+
+    if args.url:
+        if not args.plaid_url:
+            parser.error("--url needs --plaid-url")
+        results = asyncio.run(run_over_http(args.url, args.plaid_url, args))
+    else:
+        emulator = create_emulator(args.plaid_latency_ms, args.plaid_jitter_ms, args.plaid_error_rate,
+                                   args.plaid_rate_limit_rate, args.plaid_transactions, args.seed)
+        server, plaid_url = serve_in_thread(emulator)
+        with tempfile.TemporaryDirectory() as tmp:
+            env = {
+                "DATABASE_URL": f"sqlite:///{os.path.join(tmp, 'load.db')}",
+                "PLAID_BASE_URL": plaid_url,
+                "PLAID_CLIENT_ID": os.getenv("PLAID_CLIENT_ID") or "emulator",
+                "PLAID_SECRET": os.getenv("PLAID_SECRET") or "emulator",
+            }
+            if args.target == "inprocess":
+                os.environ.update(env)
+                results = asyncio.run(run_in_process(plaid_url, args))
+            else:
+                port = free_port()
+                process = start_uvicorn(dict(os.environ, **env), port)
+                try:
+                    results = asyncio.run(run_over_http(f"http://127.0.0.1:{port}", plaid_url, args))
+                finally:
+                    process.terminate()
+                    process.wait(timeout=30)
+        server.should_exit = True
+        print(f"\nPlaid emulator: {json.dumps(emulator.state.calls)} failures {json.dumps(emulator.state.failures)}")
+
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump({"args": vars(args), "results": results}, file, indent=2)
+        print(f"Wrote {args.output}")
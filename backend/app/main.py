@@ -1,30 +1,83 @@
+import logging
 import os
 import time
-from datetime import datetime, timedelta
+from datetime import date, timedelta
 from dateutil.relativedelta import relativedelta
 import requests
-import json
-from fastapi import FastAPI, APIRouter, HTTPException, Depends
+import httpx
+from typing import Optional
+from fastapi import FastAPI, APIRouter, HTTPException, Depends, Query, Header
+from fastapi.responses import StreamingResponse, PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
+from starlette.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
-from sqlalchemy import extract
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select
 from dotenv import load_dotenv
-from collections import Counter
 from sqlalchemy import func
 from pydantic import BaseModel
-import traceback
 
 # Import database and models
-from app.database import engine, get_db
+from app.database import engine, async_engine, get_db, get_async_db, AsyncSessionLocal
 from app.models.user import User  
 from app.models.transaction import Transaction
 from app.schemas.user import LoginRequest, ExchangePublicTokenRequest
-
+from app.categories import FOOD, ENTERTAINMENT, TRAVEL, parse_categories, set_categories
+from app.models.daily_category_spending import DailyCategorySpending
+from app.rollups import ALL_CATEGORIES, add_to_rollups, remove_from_rollups, top_categories
+from app.recompute import TRACKED_CATEGORIES, today, month_range, month_category_spending, derive_spending, recompute_spending, recompute_user_by_id
+from app.jobs import CoalescingQueue
+from app.ingest import sync_user
+from app.ownership import default_account
+from app.migrate import run_pending as run_data_migrations
+from app.models.plaid_item import PlaidItem
+from app.models.account import Account
+from app.plaid_client import PLAID_CLIENT_ID, PLAID_SECRET, PlaidError, plaid, async_plaid, metrics as plaid_metrics
+from app import ml
+from app.startup_report import TIMINGS, timed
+from app.cache import ResponseCache, ResponseCacheMiddleware
+from app.metrics import RequestMetrics, MetricsMiddleware, render_counter, sections
+from app.users import load_user, aload_user, user_ids
+from app.profiling import ProfilingMiddleware, TraceStore, authorized, traced, instrument_engine as profile_engine, PROFILE_TOKEN
+from app.transaction_pages import TRANSACTIONS_PAGE_SIZE, TRANSACTIONS_MAX_PAGE_SIZE, EXPORT_FORMATS, InvalidCursor, encode_cursor, decode_cursor, filtered_transactions, after_cursor, row_dict, iter_rows
+from contextlib import asynccontextmanager
+import threading
+
+
+logger = logging.getLogger(__name__)
 
 # Load environment variables
 load_dotenv()
 
-app = FastAPI(title="Plaid Link With Database")
+# Endpoints the single-user frontend calls without a username act on this user
+DEFAULT_USERNAME = os.getenv("DEFAULT_USERNAME", "user_good")
+
+# How long shutdown waits for queued background recomputes
+SHUTDOWN_DRAIN_SECONDS = float(os.getenv("SHUTDOWN_DRAIN_SECONDS", "30"))
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # ML_WARMUP=1 loads the model in the background so the first /alert does not pay for it
+    if os.getenv("ML_WARMUP") == "1":
+        threading.Thread(target=ml.warm_up, name="ml-warmup", daemon=True).start()
+    yield
+    # Let queued recomputes write before the connections go away; drain blocks, so off the event loop
+    await run_in_threadpool(recompute_queue.drain, SHUTDOWN_DRAIN_SECONDS)
+    await run_in_threadpool(recompute_queue.stop, SHUTDOWN_DRAIN_SECONDS)
+    await async_plaid.aclose()
+    plaid.close()
+    await async_engine.dispose()
+
+app = FastAPI(title="Plaid Link With Database", lifespan=lifespan)
+
+# Dashboard reads are served from a per-user versioned cache; every write below bumps the user's version.
+# Added before CORS so that CORS stays the outer layer and cached responses still carry its headers.
+CACHED_PATHS = [
+    "/transactions", "/graph_data", "/graph_data_food", "/graph_data_travel", "/graph_data_entertainment",
+    "/food_graph", "/entertainment_graph", "/travel_graph", "/get_goal", "/get_all_predicted", "/dashboard",
+]
+response_cache = ResponseCache()
+app.add_middleware(ResponseCacheMiddleware, cache=response_cache, paths=CACHED_PATHS, default_user=DEFAULT_USERNAME)
 
 # Allow frontend requests
 app.add_middleware(
@@ -35,25 +88,64 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Requests carrying PROFILE_TOKEN (X-Profile-Token header or ?profile=) get a span tree and a
+# sampling profile, kept in PROFILE_DIR and browsable under /traces
+trace_store = TraceStore()
+profile_engine(engine)
+profile_engine(async_engine.sync_engine)
+app.add_middleware(ProfilingMiddleware, store=trace_store, skip_prefix="/traces")
+
+# Per-route latency, status codes and SQL work per request, served at /metrics. Outermost, so
+# cache hits are timed too; they never reach routing, hence the cached paths as known labels.
+request_metrics = RequestMetrics()
+request_metrics.instrument_engine(engine)
+request_metrics.instrument_engine(async_engine.sync_engine)
+app.add_middleware(MetricsMiddleware, metrics=request_metrics, known_paths=CACHED_PATHS)
+
 # Create database tables if they don't exist
 # from app.models.user import Base  
 # Base.metadata.create_all(bind=engine)
 
-from app.models import user, transaction
+from app.models import create_tables
+from app.database import SessionLocal
+
+with timed("create tables"):
+    create_tables()
+
+# Populate the category, ownership and rollup data for rows written before they existed. Each
+# migration runs once per database; after that this is a single query.
+with timed("data migrations"), SessionLocal() as _db:
+    run_data_migrations(_db)
 
-user.Base.metadata.create_all(bind=engine)
-transaction.Base.metadata.create_all(bind=engine)
+# Derived spending fields are recomputed off the request path, one run per burst of writes
+recompute_queue = CoalescingQueue(recompute_user_by_id, name="recompute")
 
 # Plaid Credentials
-PLAID_CLIENT_ID = os.getenv("PLAID_CLIENT_ID")
-PLAID_SECRET = os.getenv("PLAID_SECRET")
 PLAID_ENV = "sandbox" 
-PLAID_SANDBOX_URL = "https://sandbox.plaid.com"
+
+# The user named by the `username` query parameter, resolved once per request (FastAPI caches a
+# dependency for the request, and it shares the endpoint's session); helpers get the loaded User
+def _found(user):
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+    return user
+
+def current_user(username: str, db: Session = Depends(get_db)) -> User:
+    return _found(load_user(db, username))
+
+def default_user(username: str = DEFAULT_USERNAME, db: Session = Depends(get_db)) -> User:
+    return _found(load_user(db, username))
+
+async def current_user_async(username: str, db: AsyncSession = Depends(get_async_db)) -> User:
+    return _found(await aload_user(db, username))
+
+async def default_user_async(username: str = DEFAULT_USERNAME, db: AsyncSession = Depends(get_async_db)) -> User:
+    return _found(await aload_user(db, username))
 
 # Step 1: Validate user login or register user
 @app.post("/login")
 def login(data: LoginRequest, db: Session = Depends(get_db)):  # ✅ No more attribute errors
-    user = db.query(User).filter(User.username == data.username).first()
+    user = load_user(db, data.username)
 
     if user:
         if user.password != data.password:
@@ -72,54 +164,116 @@ def create_link_token():
     if not PLAID_CLIENT_ID or not PLAID_SECRET:
         raise HTTPException(status_code=500, detail="Plaid API credentials not set")
 
-    url = f"{PLAID_SANDBOX_URL}/link/token/create"
     payload = {
-        "client_id": PLAID_CLIENT_ID,
-        "secret": PLAID_SECRET,
         "user": {"client_user_id": "12345"},
         "client_name": "My Plaid App",
         "products": ["auth", "transactions"],
         "country_codes": ["US"],
         "language": "en",
     }
-    response = requests.post(url, json=payload)
-    result = response.json()
-
-    if "link_token" not in result:
-        raise HTTPException(status_code=400, detail=f"Error creating link token: {result}")
+    try:
+        result = plaid.post("/link/token/create", payload)
+    except (PlaidError, requests.RequestException) as e:
+        raise HTTPException(status_code=400, detail=f"Error creating link token: {e}")
 
     return {"link_token": result["link_token"]}
 
 # Step 3: Exchange Public Token for Access Token & Store in DB
 @app.post("/exchange_public_token")
-def exchange_public_token(data: ExchangePublicTokenRequest, db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.username == data.username).first()
+async def exchange_public_token(data: ExchangePublicTokenRequest, db: AsyncSession = Depends(get_async_db)):
+    user = await aload_user(db, data.username)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
 
-    url = f"{PLAID_SANDBOX_URL}/item/public_token/exchange"
-    payload = {
-        "client_id": PLAID_CLIENT_ID,
-        "secret": PLAID_SECRET,
-        "public_token": data.public_token,
-    }
-    response = requests.post(url, json=payload)
-    result = response.json()
-
-    if "access_token" not in result:
-        raise HTTPException(status_code=400, detail=f"Error exchanging token: {result}")
-
-    # Store the access token in the database
+    try:
+        result = await async_plaid.post("/item/public_token/exchange", {"public_token": data.public_token})
+    except (PlaidError, httpx.TransportError) as e:
+        raise HTTPException(status_code=400, detail=f"Error exchanging token: {e}")
+
+    # Items are looked up by item_id, and a missing one would match a legacy row with no item_id
+    if not result.get("item_id") or not result.get("access_token"):
+        raise HTTPException(status_code=502, detail="Error exchanging token: Plaid response has no item_id or access_token")
+
+    # Store the access token in the database, as a Plaid item owned by this user
+    item = await db.scalar(select(PlaidItem).where(PlaidItem.item_id == result["item_id"]))
+    if item is None:
+        item = PlaidItem(item_id=result["item_id"])
+        db.add(item)
+    item.user_id = user.id
+    item.access_token = result["access_token"]
     user.access_token = result["access_token"]
-    db.commit()
+    await db.commit()
 
     return {"message": "Bank linked successfully", "access_token": result["access_token"]}
 
+@app.post("/sync_transactions")
+def sync_transactions(user: User = Depends(current_user), db: Session = Depends(get_db)):
+    if not user.access_token:
+        raise HTTPException(status_code=400, detail="No bank account linked")
+
+    # Transport errors and deadline timeouts are RequestExceptions; a malformed page raises KeyError or
+    # ValueError (bad JSON, dates). Either way nothing from the failed sync is kept.
+    try:
+        totals = sync_user(db, user)
+    except (PlaidError, requests.RequestException, KeyError, ValueError) as e:
+        db.rollback()
+        raise HTTPException(status_code=502, detail=f"Plaid sync failed: {e}")
+
+    recompute_queue.mark_dirty(user.id)
+    response_cache.bump(user.username)
+    return {"message": "Transactions synced", **totals}
+
+@app.get("/cache_stats")
+def get_cache_stats():
+    return response_cache.stats()
+
+@app.get("/plaid_metrics")
+def get_plaid_metrics():
+    return {"pool": plaid.pool_stats(), "endpoints": plaid_metrics.snapshot()}
+
+@app.get("/metrics")
+def get_metrics():
+    lines = request_metrics.render()
+    lines += plaid_metrics.render()
+    cache = response_cache.stats()
+    lines += render_counter("response_cache_lookups_total", "Response cache lookups by outcome.",
+                            [({"outcome": "hit"}, cache["hits"]), ({"outcome": "miss"}, cache["misses"])])
+    users = user_ids.stats()
+    lines += render_counter("user_id_cache_lookups_total", "Username to user id cache lookups by outcome.",
+                            [({"outcome": "hit"}, users["hits"]), ({"outcome": "miss"}, users["misses"])])
+    lines += render_counter("recompute_queue_depth", "Users waiting for a spending recompute.",
+                            [({}, recompute_queue.depth())], kind="gauge")
+    return PlainTextResponse("\n".join(lines) + "\n", media_type="text/plain; version=0.0.4")
+
+def require_profile_token(x_profile_token: Optional[str] = Header(None)):
+    if not PROFILE_TOKEN:
+        raise HTTPException(status_code=404, detail="Profiling is disabled; set PROFILE_TOKEN")
+    if not authorized(x_profile_token):
+        raise HTTPException(status_code=403, detail="Invalid profile token")
+
+@app.get("/traces", dependencies=[Depends(require_profile_token)])
+def list_traces(limit: int = Query(20, ge=1)):
+    return {"traces": trace_store.slowest(limit)}
+
+@app.get("/traces/{trace_id}", dependencies=[Depends(require_profile_token)])
+def get_trace(trace_id: str):
+    trace = trace_store.get(trace_id)
+    if not trace:
+        raise HTTPException(status_code=404, detail="Trace not found")
+    return trace.to_dict()
+
+@app.get("/traces/{trace_id}/flamegraph", dependencies=[Depends(require_profile_token)])
+def get_trace_flamegraph(trace_id: str):
+    trace = trace_store.get(trace_id)
+    if not trace:
+        raise HTTPException(status_code=404, detail="Trace not found")
+    return PlainTextResponse(trace.folded())
+
 from app.schemas.user import SetGoalRequest
 
 @app.post("/set_goal")
 def set_goal(data: SetGoalRequest, db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.username == data.username).first()
+    user = load_user(db, data.username)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
 
@@ -129,16 +283,14 @@ def set_goal(data: SetGoalRequest, db: Session = Depends(get_db)):
     saving_per_month = data.amount / data.time_months
     user.saving_goal = saving_per_month
     db.commit()
+    recompute_queue.mark_dirty(user.id)  # Adaptive goals depend on the saving goal
+    response_cache.bump(user.username)
 
 
     return {"message": "Goal set successfully", "saving_goal": user.saving_goal}
 
 @app.get("/get_goal")
-def get_goal(username: str, db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.username == username).first()
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
-
+def get_goal(user: User = Depends(current_user)):
     if user.saving_goal is None:
         return {"message": "No goal set"}
 
@@ -151,78 +303,52 @@ def get_goal(username: str, db: Session = Depends(get_db)):
 
 
 @app.post("/top_spenders")
-def get_top_spender(username: str, db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.username == username).first()
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
-
-    # Get all transactions with categories
-    transactions = db.query(Transaction).filter(
-        Transaction.category.isnot(None)
-    ).all()
-
-    if not transactions:
+def get_top_spender(
+    n: int = Query(2, ge=2, le=50),
+    by: str = "count",
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    user: User = Depends(current_user),
+    db: Session = Depends(get_db),
+):
+    if by not in ("count", "spend"):
+        raise HTTPException(status_code=400, detail=f"Unknown ranking: {by}")
+
+    # Read from the per-user category counters kept with the rollups
+    top = top_categories(db, user.id, n=n, by=by, start=start, end=end)
+
+    if not top:
         return {"message": "No transactions found"}
 
-    # Flatten categories and count them
-    all_categories = []
-    for transaction in transactions:
-        # Handle string representation of list
-        if isinstance(transaction.category, str):
-            # Remove brackets and quotes, split by comma
-            categories = transaction.category.strip('[]').replace('"', '').split(',')
-            # Clean up whitespace
-            categories = [cat.strip() for cat in categories]
-            all_categories.extend(categories)
-        elif isinstance(transaction.category, list):
-            all_categories.extend(transaction.category)
-
-    # Count categories
-    category_counts = Counter(all_categories)
-    
-    # Get top 2 most common categories
-    top_categories = category_counts.most_common(2)
-    
-    if len(top_categories) < 2:
+    if len(top) < 2:
         return {"message": "Not enough categories found"}
 
-    # Update user's top spender fields
-    user.top_spender = top_categories[0][0]  # First most common category
-    user.top2_spender = top_categories[1][0]  # Second most common category
-    db.commit()
+    # The user's stored top spenders are the all-time most frequent categories
+    if by == "count" and start is None and end is None and (user.top_spender, user.top2_spender) != (top[0][0], top[1][0]):
+        user.top_spender = top[0][0]
+        user.top2_spender = top[1][0]
+        db.commit()
 
     return {
         "message": "Top spenders updated",
-        "top_spender": user.top_spender,
-        "top2_spender": user.top2_spender,
-        "top_spender_count": top_categories[0][1],
-        "top2_spender_count": top_categories[1][1]
+        "top_spender": top[0][0],
+        "top2_spender": top[1][0],
+        "top_spender_count": top[0][1],
+        "top2_spender_count": top[1][1],
+        "top": [{"category": category, "count": count, "total": total} for category, count, total in top],
     }
 
 @app.post("/day_paid")
-def get_day_paid(username: str, db: Session = Depends(get_db)):
-
-    user = db.query(User).filter(User.username == username).first()
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
-
-    #get current time
-    now = datetime.now()
-    prev_month = now - relativedelta(months=1)
-    current_year = prev_month.year
-    current_month = prev_month.month
-
-    #debug
-    all_transactions = db.query(Transaction).filter(
-        Transaction.amount<0
-    ).all()
-    print(f"Found {len(all_transactions)} total negative transactions")
+def get_day_paid(user: User = Depends(current_user), db: Session = Depends(get_db)):
+    # Previous calendar month as a date range, so the (date, amount) index applies
+    first_day, next_month = month_range(today() - relativedelta(months=1))
 
     #query
     incoming_transaction = db.query(Transaction).filter(
-        Transaction.amount<0,
-        extract('year', Transaction.date) == current_year,
-        extract('month', Transaction.date) == current_month
+        Transaction.user_id == user.id,
+        Transaction.date >= first_day,
+        Transaction.date < next_month,
+        Transaction.amount < 0
     ).order_by(Transaction.date).first()
 
     if not incoming_transaction:
@@ -236,67 +362,49 @@ def get_day_paid(username: str, db: Session = Depends(get_db)):
 
     return {"message": "Day Paid", "day_paid": user.day_paid}
 
-import pandas as pd
-import numpy as np
-import xgboost as xgb
-import pickle
-from sklearn.preprocessing import LabelEncoder
+from app.scoring import batcher_from_env
 
 
-model = xgb.XGBClassifier()
-model.load_model('xgbmodel.json')
-with open("encoder.pkl", "rb") as file:
-    encoder = pickle.load(file)
-@app.post("/alert")
-def get_alert(db: Session = Depends(get_db)):
+def predict_alerts(entries):
+    # Encoding is a dict lookup per categorical (unseen merchants fall into the unknown bucket)
+    matrix = ml.feature_matrix(entries)
+    scores = ml.predict_scores(ml.get_booster(), matrix)
+    return [int(score > ml.FRAUD_THRESHOLD) for score in scores]
 
-    # Get most recent transaction
-    latest_transaction = db.query(Transaction).order_by(Transaction.id.desc()).first()
+# Concurrent /alert calls share a predict call (ALERT_BATCH_WINDOW_MS, ALERT_BATCH_MAX, ALERT_TIMEOUT_SECONDS)
+alert_scorer = batcher_from_env(predict_alerts, "ALERT", name="alert-scorer")
+
+@app.post("/alert")
+def get_alert(user: User = Depends(default_user), db: Session = Depends(get_db)):
+    # Get the user's most recent transaction
+    latest_transaction = db.query(Transaction).filter(
+        Transaction.user_id == user.id
+    ).order_by(Transaction.id.desc()).first()
     
     if not latest_transaction:
         return {"message": "No transactions found"}
 
-    #replace with ML model
-
-    #replace with ML model
-
-    # Get first category
-    if isinstance(latest_transaction.category, str):
-        try:
-            # Parse the string as JSON to get the actual array
-            categories = json.loads(latest_transaction.category)
-            first_category = categories[0] if categories else None
-        except json.JSONDecodeError:
-            # Fallback to the old method if JSON parsing fails
-            categories = latest_transaction.category.strip('[]').replace('"', '').split(',')
-            first_category = categories[0].strip() if categories else None
-    elif isinstance(latest_transaction.category, list):
-        first_category = latest_transaction.category[0] if latest_transaction.category else None
-
-    print(f"First category: {first_category}")
-
-    new_entry = pd.DataFrame({
-        'merchant': [latest_transaction.merchant_name],  # Example merchant
-        'category': [first_category],  # Example category
-        'amt': [latest_transaction.amount],  # Transaction amount
-        'trans_num': ['ce303c21bbecc75334b69a642c9716c3'],  # Example transaction number
-        'hour': [3],  # Transaction hour
-        'day_of_week': [0],  # Wednesday (0 = Monday, 6 = Sunday)
-        'day_of_month': [23],  # 15th day of the month
-        'month': [9],  # June
-    })
-
-    # Encode the new entry
-    for col in ['merchant', 'category', 'trans_num']:
-        new_entry[col] = encoder[col].transform(new_entry[col])  # Encode categorical values
-
-    # Predict using the model
-    prediction = model.predict(new_entry)
-    pred = prediction[0]
-    print(f"Prediction: {pred}")
+    categories = parse_categories(latest_transaction.category)
+    first_category = categories[0] if categories else None
+
+    new_entry = {
+        'merchant': latest_transaction.merchant_name,  # Example merchant
+        'category': first_category,  # Example category
+        'amt': latest_transaction.amount,  # Transaction amount
+        'trans_num': 'ce303c21bbecc75334b69a642c9716c3',  # Example transaction number
+        'hour': 3,  # Transaction hour
+        'day_of_week': 0,  # Wednesday (0 = Monday, 6 = Sunday)
+        'day_of_month': 23,  # 15th day of the month
+        'month': 9,  # June
+    }
+
+    # Predict using the model, batched with any concurrent /alert calls
+    with sections.track("ml"):
+        pred = alert_scorer.submit(new_entry)
+    logger.debug("Alert prediction %s for transaction %s (%s)", pred, latest_transaction.transaction_id, first_category)
 
     if pred==1:
-        user.isalert = 1
+        user.is_alert = 1
         db.commit()
         
         return {
@@ -308,9 +416,45 @@ def get_alert(db: Session = Depends(get_db)):
     
     return {"message": "No alert"}
 
+@app.post("/warmup")
+def warmup():
+    ml.warm_up()
+    return {"message": "ML artifacts loaded", "loaded": ml.is_loaded()}
+
+@app.get("/startup_report")
+def startup_report():
+    return {"timings_seconds": TIMINGS, "ml_loaded": ml.is_loaded()}
+
+@app.get("/alert_scorer_stats")
+def get_alert_scorer_stats():
+    return alert_scorer.stats()
+
+# Largest chunk a backfill may encode and hold in memory at once
+FRAUD_BACKFILL_MAX_CHUNK_SIZE = 200000
+
+@app.post("/fraud_backfill", dependencies=[Depends(current_user)])
+def start_fraud_backfill(
+    chunk_size: int = Query(50000, ge=1, le=FRAUD_BACKFILL_MAX_CHUNK_SIZE),
+    workers: Optional[int] = Query(None, ge=1, le=os.cpu_count() or 1),
+    restart: bool = False,
+    db: Session = Depends(get_db),
+):
+    from app.fraud import start_backfill, backfill_status  # Pulls in numpy and xgboost
+
+    started = start_backfill(chunk_size=chunk_size, workers=workers, restart=restart)
+    status = backfill_status(db)
+    status["message"] = "Backfill started" if started else "Backfill already running"
+    return status
+
+@app.get("/fraud_backfill")
+def get_fraud_backfill(db: Session = Depends(get_db)):
+    from app.fraud import backfill_status
+
+    return backfill_status(db)
+
 @app.get("/alert_status")
-def alert_status(db: Session = Depends(get_db)):
-    user = db.query(User).first()  # Get the first user for now
+def alert_status(username: str = DEFAULT_USERNAME, db: Session = Depends(get_db)):
+    user = load_user(db, username)
     if not user:
         return {"message": "User not found", "isalert": 0}
     
@@ -319,12 +463,8 @@ def alert_status(db: Session = Depends(get_db)):
 
     
 @app.post("/alert_resolve")
-def resolve_alert(action: dict, db: Session = Depends(get_db)):
+def resolve_alert(action: dict, user: User = Depends(default_user), db: Session = Depends(get_db)):
     try:
-        user = db.query(User).first()
-        if not user:
-            raise HTTPException(status_code=404, detail="User not found")
-        
         # Reset the alert status
         user.is_alert = 0
         db.commit()
@@ -338,35 +478,67 @@ def resolve_alert(action: dict, db: Session = Depends(get_db)):
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/transactions")
-def get_transactions(db: Session = Depends(get_db)):
-    # Calculate date 30 days ago
-    thirty_days_ago = datetime.now() - timedelta(days=30)
-    
-    # Query transactions
-    transactions = db.query(Transaction).filter(
-        Transaction.date >= thirty_days_ago
-    ).order_by(Transaction.date.desc()).all()
-    
-    if not transactions:
-        return {"message": "No transactions found"}
-    
-    # Format transactions for response
-    transactions_list = []
-    for tx in transactions:
-        transactions_list.append({
-            "date": tx.date.strftime("%Y-%m-%d"),
-            "amount": tx.amount,
-            "category": tx.category,
-            "merchant_name": tx.merchant_name,
-        })
-    
+async def get_transactions(
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    category: Optional[str] = None,
+    merchant: Optional[str] = None,
+    min_amount: Optional[float] = None,
+    max_amount: Optional[float] = None,
+    limit: int = Query(TRANSACTIONS_PAGE_SIZE, ge=1, le=TRANSACTIONS_MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    user: User = Depends(default_user_async),
+    db: AsyncSession = Depends(get_async_db),
+):
+    # Without a range, the last 30 days (a date, since the column stores dates)
+    if start is None and end is None:
+        start = today() - timedelta(days=30)
+
+    try:
+        after = decode_cursor(cursor) if cursor else None
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    query = filtered_transactions(user.id, start, end, category, merchant, min_amount, max_amount)
+    # One extra row tells whether another page follows
+    rows = (await db.execute(after_cursor(query, after).limit(limit + 1))).all()
+    page = rows[:limit]
+
+    if not page:
+        return {"message": "No transactions found", "next_cursor": None}
+
+    transactions_list = [row_dict(row) for row in page]
     return {
         "message": "Transactions retrieved successfully",
         "transactions": transactions_list,
-        "total_count": len(transactions_list)
+        "total_count": len(transactions_list),
+        "next_cursor": encode_cursor(page[-1].date, page[-1].id) if len(rows) > limit else None,
     }
 
 
+@app.get("/transactions/export")
+async def export_transactions(
+    format: str = "ndjson",
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    category: Optional[str] = None,
+    merchant: Optional[str] = None,
+    min_amount: Optional[float] = None,
+    max_amount: Optional[float] = None,
+    user: User = Depends(default_user_async),
+):
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unknown format: {format}")
+
+    # The request's session closes before the body is sent, so the stream pages through its own
+    query = filtered_transactions(user.id, start, end, category, merchant, min_amount, max_amount)
+    lines, media_type = EXPORT_FORMATS[format]
+    return StreamingResponse(
+        lines(iter_rows(AsyncSessionLocal, query)),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="transactions.{format}"'},
+    )
+
 import uuid
 from app.schemas.transaction import AddTransactionRequest
 
@@ -375,54 +547,47 @@ class PredictionRequest(BaseModel):
 
 @app.post("/add_transaction")
 def add_transaction(data: AddTransactionRequest, db: Session = Depends(get_db)):
+    user = load_user(db, data.username or DEFAULT_USERNAME)
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+    if data.account_id:
+        account = db.get(Account, data.account_id)
+        if not account or account.user_id != user.id:
+            raise HTTPException(status_code=404, detail="Account not found")
+    else:
+        account = default_account(db, user)
+
     try:
         # Add transaction
         transaction_id = str(uuid.uuid4())
-        category = json.dumps(data.category) if isinstance(data.category, list) else data.category
-        
+
         new_transaction = Transaction(
             transaction_id=transaction_id,
-            account_id="9Ba75DR7nRcq4dBxBkdEfx1J1vwmGyi4xbVKr",
+            user_id=user.id,
+            account_id=account.account_id,
             name=data.name,
             merchant_name=data.merchant_name,
             amount=data.amount or 0,
             date=data.date,
-            category=category,
             payment_channel=data.payment_channel,
             currency=data.currency
         )
+        set_categories(new_transaction, data.category)
         db.add(new_transaction)
+        add_to_rollups(db, [new_transaction])
+        # Read before the commit expires the user, which would cost another user query
+        user_id, username = user.id, user.username
         db.commit()
         db.refresh(new_transaction)
 
-        username = "user_good"  # Use string directly
-        
-        try:
-            # Call prediction endpoints with proper request body
-            get_food_model(username, db)  # This is your /food_predicted POST handler
-            get_entertainment_model(username, db)  # This is your /entertainment_predicted POST handler
-            get_travel_model(username, db)  # This is your /travel_predicted POST handler
-            
-            # Call actual spending handlers
-            post_actual_food(username, db)
-            post_actual_entertainment(username, db)
-            post_actual_travel(username, db)
-            
-            # Update adaptive spending
-            adaptive_spending(username, db)
-            
-            print("All predictions and actuals updated successfully")
-            
-        except Exception as inner_e:
-            print(f"Error in updates: {str(inner_e)}")
-            traceback.print_exc()  # Print full error trace
+        # Actuals, predictions and adaptive goals are refreshed by the recompute worker
+        recompute_queue.mark_dirty(user_id)
+        response_cache.bump(username)
 
         # Handle alert
         if data.amount and data.amount > 100:
-            user = db.query(User).first()
-            if user:
-                user.is_alert = 1
-                db.commit()
+            user.is_alert = 1
+            db.commit()
 
         return new_transaction
     except Exception as e:
@@ -430,738 +595,324 @@ def add_transaction(data: AddTransactionRequest, db: Session = Depends(get_db)):
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.delete("/delete_transaction")
-def delete_transaction(transaction_id: str, db: Session = Depends(get_db)):
-    transaction = db.query(Transaction).filter(Transaction.transaction_id == transaction_id).first()
+def delete_transaction(transaction_id: str, user: User = Depends(default_user), db: Session = Depends(get_db)):
+    transaction = db.query(Transaction).filter(
+        Transaction.transaction_id == transaction_id, Transaction.user_id == user.id
+    ).first()
     if not transaction:
         return {"message": "Transaction not found"}
+    remove_from_rollups(db, [transaction])
     db.delete(transaction)
     db.commit()
+
+    recompute_queue.mark_dirty(user.id)
+    response_cache.bump(user.username)
     return {"message": "Transaction deleted successfully"}
 
 
 
 @app.get("/graph_data")
-def get_graph_data(db: Session = Depends(get_db)):
-    today = datetime.now()
-    first_day = today.replace(day=1)
-    
-    transactions = db.query(Transaction).filter(
-        Transaction.date >= first_day
-    ).order_by(Transaction.date.asc()).all()
+async def get_graph_data(user: User = Depends(default_user_async), db: AsyncSession = Depends(get_async_db)):
+    first_day = today().replace(day=1)
+    cumulative_spending = await get_category_spending(user.id, ALL_CATEGORIES, first_day, None, db)
 
-    if not transactions:
+    if not cumulative_spending:
         return {"message": "No transactions found"}
 
-    cumulative_spending = {}
-    running_total = 0
-    
-    for tx in transactions:
-        date_str = tx.date.strftime("%Y-%m-%d")
-        running_total += tx.amount
-        cumulative_spending[date_str] = running_total
-
     return {
         "message": "Total spending data retrieved successfully",
         "cumulative_spending": cumulative_spending
     }
 
 
-import uuid
-from app.schemas.transaction import AddTransactionRequest
-@app.post("/add_transaction")
-def add_transaction(data: AddTransactionRequest, db: Session = Depends(get_db)):
-    try:
-        transaction_id = str(uuid.uuid4())
-        
-        # Convert category list to string if it's a list
-        category = json.dumps(data.category) if isinstance(data.category, list) else data.category
-        
-        new_transaction = Transaction(
-            transaction_id=transaction_id,
-            account_id="9Ba75DR7nRcq4dBxBkdEfx1J1vwmGyi4xbVKr",
-            name=data.name,
-            merchant_name=data.merchant_name,
-            amount=data.amount or 0,
-            date=data.date,
-            category=category,
-            payment_channel=data.payment_channel,
-            currency=data.currency
-        )
-        db.add(new_transaction)
-        db.commit()
-        db.refresh(new_transaction)
-
-        username = "user_good"
-        
-        try:
-            # Call the actual POST endpoint handlers
-            get_food_model(username, db)  # This is your /food_predicted POST handler
-            get_entertainment_model(username, db)  # This is your /entertainment_predicted POST handler
-            get_travel_model(username, db)  # This is your /travel_predicted POST handler
-            
-            # Call actual spending handlers
-            post_actual_food(username, db)
-            post_actual_entertainment(username, db)
-            post_actual_travel(username, db)
-            
-            # Update adaptive spending
-            adaptive_spending(username, db)
-        except Exception as inner_e:
-            print(f"Error in updates: {str(inner_e)}")
-
-        if data.amount and data.amount > 100:
-            user = db.query(User).first()
-            if user:
-                user.is_alert = 1
-                db.commit()
-
-        return new_transaction
-    except Exception as e:
-        db.rollback()
-        raise HTTPException(status_code=500, detail=str(e))
-
-@app.delete("/delete_transaction")
-def delete_transaction(transaction_id: str, db: Session = Depends(get_db)):
-    transaction = db.query(Transaction).filter(Transaction.transaction_id == transaction_id).first()
-    if not transaction:
-        return {"message": "Transaction not found"}
-    db.delete(transaction)
-    db.commit()
-    return {"message": "Transaction deleted successfully"}
-
-@app.get("/graph_data")
-def get_graph_data(db: Session = Depends(get_db)):
-    today = datetime.now()
-    first_day = today.replace(day=1)
-    
-    transactions = db.query(Transaction).filter(
-        Transaction.date >= first_day
-    ).order_by(Transaction.date.asc()).all()
-
-    if not transactions:
-        return {"message": "No transactions found"}
+@traced
+async def get_category_spending(user_id: int, category: str, start, end, db: AsyncSession):
+    """Cumulative spending per day for one of a user's categories in [start, end), read from the daily rollups."""
+    query = select(
+        DailyCategorySpending.day, func.sum(DailyCategorySpending.total)
+    ).where(
+        DailyCategorySpending.user_id == user_id,
+        DailyCategorySpending.category == category,
+        DailyCategorySpending.day >= start
+    )
+    if end is not None:
+        query = query.where(DailyCategorySpending.day < end)
+    rows = (await db.execute(query.group_by(DailyCategorySpending.day).order_by(DailyCategorySpending.day))).all()
 
     cumulative_spending = {}
     running_total = 0
-    
-    for tx in transactions:
-        date_str = tx.date.strftime("%Y-%m-%d")
-        running_total += tx.amount
-        cumulative_spending[date_str] = running_total
 
-    return {
-        "message": "Total spending data retrieved successfully",
-        "cumulative_spending": cumulative_spending
-    }
+    for day, total in rows:
+        running_total += total
+        cumulative_spending[day.strftime("%Y-%m-%d")] = running_total
+
+    return cumulative_spending
 
 @app.get("/graph_data_food")
-def get_graph_data_food(db: Session = Depends(get_db)):
-    today = datetime.now()
-    first_day = today.replace(day=1)
-    
-    transactions = db.query(Transaction).filter(
-        Transaction.date >= first_day
-    ).order_by(Transaction.date.asc()).all()
+async def get_graph_data_food(user: User = Depends(default_user_async), db: AsyncSession = Depends(get_async_db)):
+    first_day = today().replace(day=1)
+    cumulative_spending = await get_category_spending(user.id, FOOD, first_day, first_day + relativedelta(months=1), db)
 
-    if not transactions:
+    if not cumulative_spending:
         return {"message": "No transactions found"}
 
-    cumulative_spending = {}
-    running_total = 0
-    
-    for tx in transactions:
-        # Handle both string and list formats of category
-        categories = []
-        if isinstance(tx.category, str):
-            try:
-                categories = json.loads(tx.category)
-            except json.JSONDecodeError:
-                categories = [tx.category]
-        elif isinstance(tx.category, list):
-            categories = tx.category
-
-        # Check if "Food and Drink" is in the categories
-        if any(cat.strip() == "Food and Drink" for cat in categories):
-            date_str = tx.date.strftime("%Y-%m-%d")
-            running_total += tx.amount
-            cumulative_spending[date_str] = running_total
-
     return {
         "message": "Food and Drink spending data retrieved successfully",
         "cumulative_spending": cumulative_spending
     }
 
 @app.get("/graph_data_travel")
-def get_graph_data_travel(db: Session = Depends(get_db)):
-    today = datetime.now()
-    first_day = today.replace(day=1)
-    
-    transactions = db.query(Transaction).filter(
-        Transaction.date >= first_day
-    ).order_by(Transaction.date.asc()).all()
+async def get_graph_data_travel(user: User = Depends(default_user_async), db: AsyncSession = Depends(get_async_db)):
+    first_day = today().replace(day=1)
+    cumulative_spending = await get_category_spending(user.id, TRAVEL, first_day, first_day + relativedelta(months=1), db)
 
-    if not transactions:
+    if not cumulative_spending:
         return {"message": "No transactions found"}
 
-    cumulative_spending = {}
-    running_total = 0
-    
-    for tx in transactions:
-        # Handle both string and list formats of category
-        categories = []
-        if isinstance(tx.category, str):
-            try:
-                categories = json.loads(tx.category)
-            except json.JSONDecodeError:
-                categories = [tx.category]
-        elif isinstance(tx.category, list):
-            categories = tx.category
-
-        # Check if "Travel" is in the categories
-        if any(cat.strip() == "Travel" for cat in categories):
-            date_str = tx.date.strftime("%Y-%m-%d")
-            running_total += tx.amount
-            cumulative_spending[date_str] = running_total
-
     return {
         "message": "Travel spending data retrieved successfully",
         "cumulative_spending": cumulative_spending
     }
 
 @app.get("/graph_data_entertainment")
-def get_graph_data_entertainment(db: Session = Depends(get_db)):
-    today = datetime.now()
-    first_day = today.replace(day=1)
-    
-    transactions = db.query(Transaction).filter(
-        Transaction.date >= first_day
-    ).order_by(Transaction.date.asc()).all()
+async def get_graph_data_entertainment(user: User = Depends(default_user_async), db: AsyncSession = Depends(get_async_db)):
+    first_day = today().replace(day=1)
+    cumulative_spending = await get_category_spending(user.id, ENTERTAINMENT, first_day, first_day + relativedelta(months=1), db)
 
-    if not transactions:
+    if not cumulative_spending:
         return {"message": "No transactions found"}
 
-    cumulative_spending = {}
-    running_total = 0
-    
-    for tx in transactions:
-        # Handle both string and list formats of category
-        categories = []
-        if isinstance(tx.category, str):
-            try:
-                categories = json.loads(tx.category)
-            except json.JSONDecodeError:
-                categories = [tx.category]
-        elif isinstance(tx.category, list):
-            categories = tx.category
-
-        # Check if "Entertainment" is in the categories
-        if any(cat.strip() == "Entertainment" for cat in categories):
-            date_str = tx.date.strftime("%Y-%m-%d")
-            running_total += tx.amount
-            cumulative_spending[date_str] = running_total
-
     return {
         "message": "Entertainment spending data retrieved successfully",
         "cumulative_spending": cumulative_spending
     }
 
 @app.get("/bank_balance")
-def get_bank_balance(username: str, db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.username == username).first()
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
+async def get_bank_balance(user: User = Depends(current_user_async)):
     return {"bank_balance": user.checkings}
 
 @app.post("/set_bank_balance")
-def set_bank_balance(username: str, balance: float, db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.username == username).first()
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
+async def set_bank_balance(balance: float, user: User = Depends(current_user_async), db: AsyncSession = Depends(get_async_db)):
     user.checkings = balance
-    db.commit()
+    await db.commit()
+    response_cache.bump(user.username)
     return {"message": "Bank balance updated", "bank_balance": user.checkings}
 
 @app.get("/savings_balance")
-def get_savings_balance(username: str, db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.username == username).first()
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
+async def get_savings_balance(user: User = Depends(current_user_async)):
     return {"savings_balance": user.savings}
 
 @app.post("/set_savings_balance")
-def set_savings_balance(username: str, balance: float, db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.username == username).first()
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
+async def set_savings_balance(balance: float, user: User = Depends(current_user_async), db: AsyncSession = Depends(get_async_db)):
     user.savings = balance
-    db.commit()
+    await db.commit()
+    response_cache.bump(user.username)
     return {"message": "Savings balance updated", "savings_balance": user.savings}
 
 
 
-def get_food_data(username: str, db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.username == username).first()
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
-
+async def get_food_data(user: User, db: AsyncSession):
     # Calculate the current month range
-    today = datetime.now()
-    first_day = today.replace(day=1)
+    first_day = today().replace(day=1)
     next_month = first_day + relativedelta(months=1)
 
-    # Filter transactions only in the current month
-    transactions = db.query(Transaction).filter(
-        Transaction.date >= first_day,
-        Transaction.date < next_month
-    ).all()
-
-    cumulative_spending = {}
-    running_total = 0
-
-    for tx in transactions:
-        # Ensure we have a valid list of categories
-        if tx.category is None:
-            categories = []
-        elif isinstance(tx.category, str):
-            try:
-                # Attempt to parse the string as JSON.
-                categories = json.loads(tx.category)
-            except json.JSONDecodeError:
-                # Fallback: remove brackets and quotes, then split by comma
-                categories = tx.category.strip('[]').replace('"', '').split(',')
-                categories = [cat.strip() for cat in categories if cat.strip()]
-        elif isinstance(tx.category, list):
-            categories = tx.category
-        else:
-            categories = []
-        
-        # Now safely check if "Food and Drink" is in the category list
-        if any(isinstance(cat, str) and cat.strip() == "Food and Drink" for cat in categories):
-            date_str = tx.date.strftime("%Y-%m-%d")
-            running_total += tx.amount
-            cumulative_spending[date_str] = running_total
-
     return {
         "message": "Food spending data retrieved successfully",
-        "cumulative_spending": cumulative_spending
+        "cumulative_spending": await get_category_spending(user.id, FOOD, first_day, next_month, db)
     }
 
 @app.get("/food_graph")
-def get_food_graph(username: str, db: Session = Depends(get_db)):
-    food_data = get_food_data(username, db)
+async def get_food_graph(user: User = Depends(current_user_async), db: AsyncSession = Depends(get_async_db)):
+    food_data = await get_food_data(user, db)
     return food_data
 
 
-def get_food_predicted(username: str, db: Session = Depends(get_db)):
-    # Get the food spending data
-    food_data = get_food_data(username, db)
-    cumulative_spending = food_data["cumulative_spending"]
-    
-    if not cumulative_spending:
-        return {"message": "No food spending data found"}
-
-    # Convert data to arrays for regression
-    dates = [datetime.strptime(date, "%Y-%m-%d").day for date in cumulative_spending.keys()]
-    amounts = list(cumulative_spending.values())
-    
-    # Perform linear regression
-    x = np.array(dates).reshape(-1, 1)
-    y = np.array(amounts)
-    
-    if len(x) < 2:
-        return {"message": "Not enough data points for prediction"}
-        
-    coefficients = np.polyfit(x.flatten(), y, 1)
-    slope = coefficients[0]
-    intercept = coefficients[1]
-    
-    # Predict spending for day 28
-    predicted_spending = slope * 28 + intercept
-    
-    return {
-        "message": "Food spending prediction calculated",
-        "predicted_spending": predicted_spending
-    }
-
 @app.post("/food_predicted")
-def get_food_model(username: str, db: Session = Depends(get_db)):
-    food_predicted = get_food_predicted(username, db)
-    food_ps = food_predicted.get("predicted_spending", 0)
-    user = db.query(User).filter(User.username == username).first()
-    if user:
-        user.food_spending_predicted = food_ps
-        db.commit()
-    return {"predicted_spending": food_ps}
-
-from dateutil.relativedelta import relativedelta
+def get_food_model(user: User = Depends(current_user), db: Session = Depends(get_db)):
+    results = recompute_spending(user, db)
+    return {"predicted_spending": results["food"]["predicted_spending"]}
 
 # ------------------------------------------------------------------
 # Entertainment Category Endpoints
 # ------------------------------------------------------------------
-def get_entertainment_data(username: str, db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.username == username).first()
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
-
+async def get_entertainment_data(user: User, db: AsyncSession):
     # Calculate the current month range
-    today = datetime.now()
-    first_day = today.replace(day=1)
+    first_day = today().replace(day=1)
     next_month = first_day + relativedelta(months=1)
 
-    # Filter transactions only in the current month
-    transactions = db.query(Transaction).filter(
-        Transaction.date >= first_day,
-        Transaction.date < next_month
-    ).all()
-
-    cumulative_spending = {}
-    running_total = 0
-
-    for tx in transactions:
-        # Ensure we have a valid list of categories
-        if tx.category is None:
-            categories = []
-        elif isinstance(tx.category, str):
-            try:
-                categories = json.loads(tx.category)
-            except json.JSONDecodeError:
-                categories = tx.category.strip('[]').replace('"', '').split(',')
-                categories = [cat.strip() for cat in categories if cat.strip()]
-        elif isinstance(tx.category, list):
-            categories = tx.category
-        else:
-            categories = []
-        
-        # Check if "Entertainment" is in the category list
-        if any(isinstance(cat, str) and cat.strip() == "Entertainment" for cat in categories):
-            date_str = tx.date.strftime("%Y-%m-%d")
-            running_total += tx.amount
-            cumulative_spending[date_str] = running_total
-
     return {
         "message": "Entertainment spending data retrieved successfully",
-        "cumulative_spending": cumulative_spending
+        "cumulative_spending": await get_category_spending(user.id, ENTERTAINMENT, first_day, next_month, db)
     }
 
 @app.get("/entertainment_graph")
-def get_entertainment_graph(username: str, db: Session = Depends(get_db)):
-    entertainment_data = get_entertainment_data(username, db)
+async def get_entertainment_graph(user: User = Depends(current_user_async), db: AsyncSession = Depends(get_async_db)):
+    entertainment_data = await get_entertainment_data(user, db)
     return entertainment_data
 
-def get_entertainment_predicted(username: str, db: Session = Depends(get_db)):
-    # Get the entertainment spending data
-    entertainment_data = get_entertainment_data(username, db)
-    cumulative_spending = entertainment_data["cumulative_spending"]
-    
-    if not cumulative_spending:
-        return {"message": "No entertainment spending data found"}
-    
-    # Convert data to arrays for regression
-    dates = [datetime.strptime(date, "%Y-%m-%d").day for date in cumulative_spending.keys()]
-    amounts = list(cumulative_spending.values())
-    
-    # Perform linear regression
-    x = np.array(dates).reshape(-1, 1)
-    y = np.array(amounts)
-    
-    if len(x) < 2:
-        return {"message": "Not enough data points for prediction"}
-        
-    coefficients = np.polyfit(x.flatten(), y, 1)
-    slope = coefficients[0]
-    intercept = coefficients[1]
-    
-    # Predict spending for day 28
-    predicted_spending = slope * 28 + intercept
-    
-    return {
-        "message": "Entertainment spending prediction calculated",
-        "predicted_spending": predicted_spending
-    }
-
 @app.post("/entertainment_predicted")
-def get_entertainment_model(username: str, db: Session = Depends(get_db)):
-    entertainment_predicted = get_entertainment_predicted(username, db)
-    entertainment_ps = entertainment_predicted.get("predicted_spending", 0)
-    user = db.query(User).filter(User.username == username).first()
-    if user:
-        user.entertainment_spending_predicted = entertainment_ps
-        db.commit()
-    return {"predicted_spending": entertainment_ps}
+def get_entertainment_model(user: User = Depends(current_user), db: Session = Depends(get_db)):
+    results = recompute_spending(user, db)
+    return {"predicted_spending": results["entertainment"]["predicted_spending"]}
 
 # ------------------------------------------------------------------
 # Travel Category Endpoints
 # ------------------------------------------------------------------
-def get_travel_data(username: str, db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.username == username).first()
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
-    
+async def get_travel_data(user: User, db: AsyncSession):
     # Calculate the current month range
-    today = datetime.now()
-    first_day = today.replace(day=1)
+    first_day = today().replace(day=1)
     next_month = first_day + relativedelta(months=1)
 
-    # Filter transactions only in the current month
-    transactions = db.query(Transaction).filter(
-        Transaction.date >= first_day,
-        Transaction.date < next_month
-    ).all()
-
-    cumulative_spending = {}
-    running_total = 0
-
-    for tx in transactions:
-        # Ensure we have a valid list of categories
-        if tx.category is None:
-            categories = []
-        elif isinstance(tx.category, str):
-            try:
-                categories = json.loads(tx.category)
-            except json.JSONDecodeError:
-                categories = tx.category.strip('[]').replace('"', '').split(',')
-                categories = [cat.strip() for cat in categories if cat.strip()]
-        elif isinstance(tx.category, list):
-            categories = tx.category
-        else:
-            categories = []
-        
-        # Check if "Travel" is in the category list
-        if any(isinstance(cat, str) and cat.strip() == "Travel" for cat in categories):
-            date_str = tx.date.strftime("%Y-%m-%d")
-            running_total += tx.amount
-            cumulative_spending[date_str] = running_total
-
     return {
         "message": "Travel spending data retrieved successfully",
-        "cumulative_spending": cumulative_spending
+        "cumulative_spending": await get_category_spending(user.id, TRAVEL, first_day, next_month, db)
     }
 
 @app.get("/travel_graph")
-def get_travel_graph(username: str, db: Session = Depends(get_db)):
-    travel_data = get_travel_data(username, db)
+async def get_travel_graph(user: User = Depends(current_user_async), db: AsyncSession = Depends(get_async_db)):
+    travel_data = await get_travel_data(user, db)
     return travel_data
 
-def get_travel_predicted(username: str, db: Session = Depends(get_db)):
-    # Get the travel spending data
-    travel_data = get_travel_data(username, db)
-    cumulative_spending = travel_data["cumulative_spending"]
-    
-    if not cumulative_spending:
-        return {"message": "No travel spending data found"}
-    
-    # Convert data to arrays for regression
-    dates = [datetime.strptime(date, "%Y-%m-%d").day for date in cumulative_spending.keys()]
-    amounts = list(cumulative_spending.values())
-    
-    # Perform linear regression
-    x = np.array(dates).reshape(-1, 1)
-    y = np.array(amounts)
-    
-    if len(x) < 2:
-        return {"message": "Not enough data points for prediction"}
-        
-    coefficients = np.polyfit(x.flatten(), y, 1)
-    slope = coefficients[0]
-    intercept = coefficients[1]
-    
-    # Predict spending for day 28
-    predicted_spending = slope * 28 + intercept
-    
-    return {
-        "message": "Travel spending prediction calculated",
-        "predicted_spending": predicted_spending
-    }
-
 @app.post("/travel_predicted")
-def get_travel_model(username: str, db: Session = Depends(get_db)):
-    travel_predicted = get_travel_predicted(username, db)
-    travel_ps = travel_predicted.get("predicted_spending", 0)
-    user = db.query(User).filter(User.username == username).first()
-    if user:
-        user.travel_spending_predicted = travel_ps
-        db.commit()
-    return {"predicted_spending": travel_ps}
+def get_travel_model(user: User = Depends(current_user), db: Session = Depends(get_db)):
+    results = recompute_spending(user, db)
+    return {"predicted_spending": results["travel"]["predicted_spending"]}
 
 @app.get("/get_food_predicted")
-def set_food_predicted(username: str, db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.username == username).first()
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
+def set_food_predicted(user: User = Depends(current_user)):
     return user.food_spending_predicted
 
 @app.get("/get_entertainment_predicted")
-def set_entertainment_predicted(username: str, db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.username == username).first()
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
+def set_entertainment_predicted(user: User = Depends(current_user)):
     return user.entertainment_spending_predicted
 
 @app.get("/get_travel_predicted")
-def set_travel_predicted(username: str, db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.username == username).first()
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
+def set_travel_predicted(user: User = Depends(current_user)):
     return user.travel_spending_predicted   
 
 @app.post("/post_actual_food")
-def post_actual_food(username: str, db: Session = Depends(get_db)):
-    food_data = get_food_data(username, db)
-    cumulative_spending = food_data["cumulative_spending"]
-    if cumulative_spending:
-        last_value = list(cumulative_spending.values())[-1]
-        user = db.query(User).filter(User.username == username).first()
-        user.food_spending = last_value
-        db.commit()
-        return {"message": "Food spending updated", "food_spending": last_value}
+def post_actual_food(user: User = Depends(current_user), db: Session = Depends(get_db)):
+    food_spending = recompute_spending(user, db)["food"]["spending"]
+    if food_spending is not None:
+        return {"message": "Food spending updated", "food_spending": food_spending}
     return {"message": "No food spending data found"}
 
 @app.post("/post_actual_entertainment")
-def post_actual_entertainment(username: str, db: Session = Depends(get_db)):
-    entertainment_data = get_entertainment_data(username, db)
-    cumulative_spending = entertainment_data["cumulative_spending"]
-    if cumulative_spending:
-        last_value = list(cumulative_spending.values())[-1]
-        user = db.query(User).filter(User.username == username).first()
-        user.entertainment_spending = last_value
-        db.commit()
-        return {"message": "Entertainment spending updated", "entertainment_spending": last_value}
+def post_actual_entertainment(user: User = Depends(current_user), db: Session = Depends(get_db)):
+    entertainment_spending = recompute_spending(user, db)["entertainment"]["spending"]
+    if entertainment_spending is not None:
+        return {"message": "Entertainment spending updated", "entertainment_spending": entertainment_spending}
     return {"message": "No entertainment spending data found"}
 
 @app.post("/post_actual_travel")
-def post_actual_travel(username: str, db: Session = Depends(get_db)):
-    travel_data = get_travel_data(username, db)
-    cumulative_spending = travel_data["cumulative_spending"]
-    if cumulative_spending:
-        last_value = list(cumulative_spending.values())[-1]
-        user = db.query(User).filter(User.username == username).first()
-        user.travel_spending = last_value
-        db.commit()
-        return {"message": "Travel spending updated", "travel_spending": last_value}
+def post_actual_travel(user: User = Depends(current_user), db: Session = Depends(get_db)):
+    travel_spending = recompute_spending(user, db)["travel"]["spending"]
+    if travel_spending is not None:
+        return {"message": "Travel spending updated", "travel_spending": travel_spending}
     return {"message": "No travel spending data found"}
 
 @app.get("/get_food_spending")
-def get_food_spending(username: str, db: Session = Depends(get_db)):
-    user_instance = db.query(User).filter(User.username == username).first()
-    if not user_instance:
-       raise HTTPException(status_code=404, detail="User not found")
-    return {"food_spending": user_instance.food_spending}
+def get_food_spending(user_instance: User = Depends(current_user)):
+    return {"food_spending": user_instance.food_spending, "stale": recompute_queue.is_stale(user_instance.id)}
 
 @app.get("/get_entertainment_spending")
-def get_entertainment_spending(username: str, db: Session = Depends(get_db)):
-    user_instance = db.query(User).filter(User.username == username).first()
-    if not user_instance:
-       raise HTTPException(status_code=404, detail="User not found")
-    return {"entertainment_spending": user_instance.entertainment_spending}
+def get_entertainment_spending(user_instance: User = Depends(current_user)):
+    return {"entertainment_spending": user_instance.entertainment_spending, "stale": recompute_queue.is_stale(user_instance.id)}
 
 @app.get("/get_travel_spending")
-def get_travel_spending(username: str, db: Session = Depends(get_db)):
-    user_instance = db.query(User).filter(User.username == username).first()
-    if not user_instance:
-       raise HTTPException(status_code=404, detail="User not found")
-    return {"travel_spending": user_instance.travel_spending}
+def get_travel_spending(user_instance: User = Depends(current_user)):
+    return {"travel_spending": user_instance.travel_spending, "stale": recompute_queue.is_stale(user_instance.id)}
 
 @app.post("/adaptive_spending")
-def adaptive_spending(username: str, db: Session = Depends(get_db)):
-    user_instance = db.query(User).filter(User.username == username).first()
-    if not user_instance:
-       raise HTTPException(status_code=404, detail="User not found")
-    
-    # Set default saving_goal to 0 if None
-    saving_goal = user_instance.saving_goal or 0
-    spend_limit = 1000 - saving_goal
-    
-    food_predicted = get_food_model(username, db)
-    entertainment_predicted = get_entertainment_model(username, db)
-    travel_predicted = get_travel_model(username, db)
-    
-    # Safely extract predicted_spending values using .get (defaulting to 0 if missing)
-    food_ps = food_predicted.get("predicted_spending", 0)
-    entertainment_ps = entertainment_predicted.get("predicted_spending", 0)
-    travel_ps = travel_predicted.get("predicted_spending", 0)
-    
-    predicted_spending = food_ps + entertainment_ps + travel_ps
-
-    # Calculate ratio only if predicted_spending is non-zero
-    ratio = spend_limit / predicted_spending if predicted_spending else 0
+def adaptive_spending(user_instance: User = Depends(current_user), db: Session = Depends(get_db)):
+    # Goals split (1000 - saving_goal) in proportion to each category's forecast
+    results = recompute_spending(user_instance, db)
 
-    user_instance.food_spending_goal = food_ps * ratio
-    user_instance.entertainment_spending_goal = entertainment_ps * ratio
-    user_instance.travel_spending_goal = travel_ps * ratio
-    db.commit()
-
-    return {"message": "Adaptive spending updated", "predicted_spending": predicted_spending}
+    return {"message": "Adaptive spending updated", "predicted_spending": results["predicted_spending"]}
     
 @app.get("/get_all_predicted")
-def total_spending_predicted(username: str, db: Session = Depends(get_db)):
-    user_instance = db.query(User).filter(User.username == username).first()
-    if not user_instance:
-        raise HTTPException(status_code=404, detail="User not found")
-        
-    food_predicted = get_food_model(username, db)
-    entertainment_predicted = get_entertainment_model(username, db)
-    travel_predicted = get_travel_model(username, db)
-
-    # Use .get with default of 0 if key is missing
-    food_ps = food_predicted.get("predicted_spending", 0)
-    entertainment_ps = entertainment_predicted.get("predicted_spending", 0)
-    travel_ps = travel_predicted.get("predicted_spending", 0)
-
-    predicted_spending = food_ps + entertainment_ps + travel_ps
-    spend_limit = 1000 - user_instance.saving_goal  # Assuming saving_goal exists
-
-    return predicted_spending
+def total_spending_predicted(user_instance: User = Depends(current_user), db: Session = Depends(get_db)):
+    return recompute_spending(user_instance, db)["predicted_spending"]
 
 
 
 @app.get("/total_spending_predicted")
-def total_spending_predicted(username: str, db: Session = Depends(get_db)):
-    user_instance = db.query(User).filter(User.username == username).first()
-    if not user_instance:
-        raise HTTPException(status_code=404, detail="User not found")
-        
-    food_predicted = get_food_model(username, db)
-    entertainment_predicted = get_entertainment_model(username, db)
-    travel_predicted = get_travel_model(username, db)
+def total_spending_predicted(user_instance: User = Depends(current_user), db: Session = Depends(get_db)):
+    predicted_spending = recompute_spending(user_instance, db)["predicted_spending"]
 
-    # Use .get with default of 0 if key is missing
-    food_ps = food_predicted.get("predicted_spending", 0)
-    entertainment_ps = entertainment_predicted.get("predicted_spending", 0)
-    travel_ps = travel_predicted.get("predicted_spending", 0)
+    return {"message": 0, "predicted_spending": predicted_spending}
 
-    predicted_spending = food_ps + entertainment_ps + travel_ps
-    spend_limit = 1000 - user_instance.saving_goal  # Assuming saving_goal exists
 
-    return {"message": 0, "predicted_spending": predicted_spending}
+# Everything the home screen renders; /dashboard?fields=food,bank_balance returns a subset
+DASHBOARD_FIELDS = [
+    "food", "entertainment", "travel", "predicted_spending", "bank_balance", "savings_balance", "goal", "graph_data",
+]
+SPENDING_FIELDS = {"food", "entertainment", "travel", "predicted_spending", "graph_data"}
+
+@app.get("/dashboard")
+async def get_dashboard(fields: str = None, user: User = Depends(default_user_async), db: AsyncSession = Depends(get_async_db)):
+    selected = DASHBOARD_FIELDS if not fields else [field.strip() for field in fields.split(",") if field.strip()]
+    unknown = [field for field in selected if field not in DASHBOARD_FIELDS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown dashboard fields: {', '.join(unknown)}")
+
+    values = {
+        "bank_balance": user.checkings,
+        "savings_balance": user.savings,
+        "goal": {
+            "amount": user.amount,
+            "time_months": user.time_months,
+            "saving_goal": user.saving_goal,
+        } if user.saving_goal is not None else None,
+    }
 
+    if SPENDING_FIELDS.intersection(selected):
+        # One rollup query covers the graph (open-ended, like /graph_data) and every tracked category
+        first_day, next_month = month_range()
+        spending = await db.run_sync(
+            month_category_spending, user.id, [ALL_CATEGORIES, *TRACKED_CATEGORIES], first_day, None
+        )
+        values["graph_data"] = {day.strftime("%Y-%m-%d"): total for day, total in spending[ALL_CATEGORIES].items()}
+        for category in TRACKED_CATEGORIES:
+            spending[category] = {day: total for day, total in spending[category].items() if day < next_month}
+
+        # Computed fresh from the rollups rather than read back from the recompute worker's fields
+        derived = derive_spending(user, spending)
+        values["predicted_spending"] = derived["predicted_spending"]
+        for prefix in TRACKED_CATEGORIES.values():
+            result = derived[prefix]
+            values[prefix] = {
+                "spending": result["spending"] if result["spending"] is not None else getattr(user, f"{prefix}_spending"),
+                "spending_goal": result["spending_goal"],
+                "predicted_spending": result["predicted_spending"],
+            }
+
+    return {"message": "Dashboard retrieved successfully", **{field: values[field] for field in selected}}
+
+@app.get("/recompute_status")
+def recompute_status(username: str = None, db: Session = Depends(get_db)):
+    status = recompute_queue.stats()
+    if username is not None:
+        user_instance = load_user(db, username)
+        if not user_instance:
+            raise HTTPException(status_code=404, detail="User not found")
+        status["stale"] = recompute_queue.is_stale(user_instance.id)
+    return status
 
 @app.get("/get_food_spending_goal")
-def get_food_spending_goal(username: str, db: Session = Depends(get_db)):
-    user_instance = db.query(User).filter(User.username == username).first()
-    if not user_instance:
-       raise HTTPException(status_code=404, detail="User not found")
-    return {"food_spending_goal": user_instance.food_spending_goal}
+def get_food_spending_goal(user_instance: User = Depends(current_user)):
+    return {"food_spending_goal": user_instance.food_spending_goal, "stale": recompute_queue.is_stale(user_instance.id)}
 
 @app.get("/get_entertainment_spending_goal")
-def get_entertainment_spending_goal(username: str, db: Session = Depends(get_db)):
-    user_instance = db.query(User).filter(User.username == username).first()
-    if not user_instance:
-       raise HTTPException(status_code=404, detail="User not found")
-    return {"entertainment_spending_goal": user_instance.entertainment_spending_goal}
+def get_entertainment_spending_goal(user_instance: User = Depends(current_user)):
+    return {"entertainment_spending_goal": user_instance.entertainment_spending_goal, "stale": recompute_queue.is_stale(user_instance.id)}
 
 @app.get("/get_travel_spending_goal")
-def get_travel_spending_goal(username: str, db: Session = Depends(get_db)):
-    user_instance = db.query(User).filter(User.username == username).first()
-    if not user_instance:
-       raise HTTPException(status_code=404, detail="User not found")
-    return {"travel_spending_goal": user_instance.travel_spending_goal}
+def get_travel_spending_goal(user_instance: User = Depends(current_user)):
+    return {"travel_spending_goal": user_instance.travel_spending_goal, "stale": recompute_queue.is_stale(user_instance.id)}
 
 @app.post("/simulate_income")
-def simulate_income(username: str, amt: float, db: Session = Depends(get_db)):
-    user_instance = db.query(User).filter(User.username == username).first()
-    if not user_instance:
-        raise HTTPException(status_code=404, detail="User not found")
-    
+async def simulate_income(amt: float, user_instance: User = Depends(current_user_async), db: AsyncSession = Depends(get_async_db)):
     if amt < 0:
         raise HTTPException(status_code=400, detail="Amount cannot be negative")
         
@@ -1171,15 +922,12 @@ def simulate_income(username: str, amt: float, db: Session = Depends(get_db)):
     else:
         user_instance.checkings += amt
     
-    db.commit()
+    await db.commit()
+    response_cache.bump(user_instance.username)
     return {"message": "Income added to checkings", "amount": amt}
 
 @app.post("/transfer_to_savings") 
-def transfer_to_savings(username: str, transfer_amt: float, db: Session = Depends(get_db)):
-    user_instance = db.query(User).filter(User.username == username).first()
-    if not user_instance:
-        raise HTTPException(status_code=404, detail="User not found")
-        
+async def transfer_to_savings(transfer_amt: float, user_instance: User = Depends(current_user_async), db: AsyncSession = Depends(get_async_db)):
     if transfer_amt < 0:
         raise HTTPException(status_code=400, detail="Transfer amount cannot be negative")
         
@@ -1193,7 +941,8 @@ def transfer_to_savings(username: str, transfer_amt: float, db: Session = Depend
     else:
         user_instance.savings += transfer_amt
         
-    db.commit()
+    await db.commit()
+    response_cache.bump(user_instance.username)
     return {
         "message": "Transfer successful",
         "amount": transfer_amt,
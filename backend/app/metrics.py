@@ -0,0 +1,278 @@
+import contextvars
+import json
+import logging
+import os
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from contextlib import contextmanager
+from app.profiling import span
+
+logger = logging.getLogger(__name__)
+
+# Requests slower than this log a structured line listing their queries
+SLOW_REQUEST_MS = float(os.getenv("SLOW_REQUEST_MS", "500"))
+# Statements kept per request for that line
+MAX_LOGGED_QUERIES = 50
+
+LATENCY_BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10]
+QUERY_BUCKETS = [0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1]
+COUNT_BUCKETS = [0, 1, 2, 5, 10, 20, 50, 100, 200, 500]
+ROW_BUCKETS = [0, 1, 10, 100, 1000, 10000, 100000]
+
+
+class Histogram:
+    """Cumulative-bucket histogram (Prometheus style) that any thread can observe into."""
+
+    def __init__(self, buckets):
+        self.buckets = sorted(buckets)
+        self._counts = [0] * (len(self.buckets) + 1)  # Last slot is +Inf
+        self._sum = 0.0
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        with self._lock:
+            self._counts[bisect_left(self.buckets, value)] += 1
+            self._sum += value
+            self._count += 1
+
+    def snapshot(self):
+        with self._lock:
+            cumulative = 0
+            buckets = {}
+            for bound, count in zip(self.buckets + [float("inf")], self._counts):
+                cumulative += count
+                buckets["+Inf" if bound == float("inf") else str(bound)] = cumulative
+            return {"buckets": buckets, "count": self._count, "sum": self._sum}
+
+    def render(self, name: str, labels: dict = None):
+        """Prometheus text lines for this histogram's series."""
+        snapshot = self.snapshot()
+        lines = [f"{name}_bucket{_labels(labels, le=bound)} {count}" for bound, count in snapshot["buckets"].items()]
+        lines.append(f"{name}_sum{_labels(labels)} {snapshot['sum']}")
+        lines.append(f"{name}_count{_labels(labels)} {snapshot['count']}")
+        return lines
+
+
+def _labels(labels: dict = None, **extra):
+    items = dict(labels or {}, **extra)
+    if not items:
+        return ""
+    escaped = (f'{key}="{str(value).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34))}"' for key, value in items.items())
+    return "{" + ",".join(escaped) + "}"
+
+
+def render_histograms(name: str, help_text: str, series):
+    """HELP/TYPE header plus every (labels, Histogram) in `series`."""
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+    for labels, histogram in series:
+        lines += histogram.render(name, labels)
+    return lines
+
+
+def render_counter(name: str, help_text: str, series, kind: str = "counter"):
+    """HELP/TYPE header plus one line per (labels, value) in `series`."""
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+    lines += [f"{name}{_labels(labels)} {value}" for labels, value in series]
+    return lines
+
+
+class RequestStats:
+    """What one request spent: its queries, database time, rows fetched, and time in tracked sections."""
+
+    __slots__ = ("queries", "db_seconds", "rows", "sections", "statements")
+
+    def __init__(self):
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.rows = 0
+        self.sections = defaultdict(float)
+        self.statements = []
+
+
+_current = contextvars.ContextVar("request_stats", default=None)
+
+
+def current_stats():
+    return _current.get()
+
+
+class SectionMetrics:
+    """Time spent in named sections (ML inference, Plaid calls), whichever thread they run on."""
+
+    def __init__(self):
+        self.histograms = defaultdict(lambda: Histogram(LATENCY_BUCKETS))
+
+    def record(self, section: str, seconds: float):
+        self.histograms[section].observe(seconds)
+        stats = _current.get()
+        if stats is not None:
+            stats.sections[section] += seconds
+
+    @contextmanager
+    def track(self, section: str):
+        started = time.perf_counter()
+        try:
+            with span(section):
+                yield
+        finally:
+            self.record(section, time.perf_counter() - started)
+
+
+sections = SectionMetrics()
+
+
+class _CountingCursor:
+    """DBAPI cursor proxy that counts the rows fetched through it into the request's stats."""
+
+    def __init__(self, cursor, stats):
+        self._cursor = cursor
+        self._stats = stats
+
+    def fetchone(self):
+        row = self._cursor.fetchone()
+        if row is not None:
+            self._stats.rows += 1
+        return row
+
+    def fetchmany(self, *args):
+        rows = self._cursor.fetchmany(*args)
+        self._stats.rows += len(rows)
+        return rows
+
+    def fetchall(self):
+        rows = self._cursor.fetchall()
+        self._stats.rows += len(rows)
+        return rows
+
+    def __iter__(self):
+        for row in self._cursor:
+            self._stats.rows += 1
+            yield row
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+class RequestMetrics:
+    """Per-route latency, status codes and database work, plus every query's duration."""
+
+    def __init__(self, slow_request_ms: float = SLOW_REQUEST_MS):
+        self.slow_request_ms = slow_request_ms
+        self.latency = defaultdict(lambda: Histogram(LATENCY_BUCKETS))
+        self.db_queries = defaultdict(lambda: Histogram(COUNT_BUCKETS))
+        self.db_seconds = defaultdict(lambda: Histogram(LATENCY_BUCKETS))
+        self.db_rows = defaultdict(lambda: Histogram(ROW_BUCKETS))
+        self.section_seconds = defaultdict(lambda: Histogram(LATENCY_BUCKETS))
+        self.statuses = defaultdict(int)
+        self.query_duration = Histogram(QUERY_BUCKETS)
+        self._lock = threading.Lock()
+
+    def instrument_engine(self, sync_engine):
+        """Time every statement on `sync_engine` (for an AsyncEngine, pass its .sync_engine)."""
+        from sqlalchemy import event
+
+        @event.listens_for(sync_engine, "before_cursor_execute")
+        def before(conn, cursor, statement, parameters, context, executemany):
+            conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+        @event.listens_for(sync_engine, "after_cursor_execute")
+        def after(conn, cursor, statement, parameters, context, executemany):
+            elapsed = time.perf_counter() - conn.info["query_started"].pop()
+            self.query_duration.observe(elapsed)
+            stats = _current.get()
+            if stats is None:
+                return
+            stats.queries += 1
+            stats.db_seconds += elapsed
+            if len(stats.statements) < MAX_LOGGED_QUERIES:
+                stats.statements.append((statement, elapsed))
+            if context is not None and cursor.description is not None:
+                context.cursor = _CountingCursor(cursor, stats)
+
+    def begin(self):
+        stats = RequestStats()
+        return stats, _current.set(stats)
+
+    def end(self, token, stats: RequestStats, route: str, method: str, status, seconds: float):
+        _current.reset(token)
+        labels = (route, method)
+        self.latency[labels].observe(seconds)
+        self.db_queries[labels].observe(stats.queries)
+        self.db_seconds[labels].observe(stats.db_seconds)
+        self.db_rows[labels].observe(stats.rows)
+        for section, spent in stats.sections.items():
+            self.section_seconds[labels + (section,)].observe(spent)
+        with self._lock:
+            self.statuses[labels + (str(status),)] += 1
+
+        if seconds * 1000 >= self.slow_request_ms:
+            logger.warning(json.dumps({
+                "event": "slow_request",
+                "route": route,
+                "method": method,
+                "status": status,
+                "duration_ms": round(seconds * 1000, 1),
+                "db_queries": stats.queries,
+                "db_ms": round(stats.db_seconds * 1000, 1),
+                "db_rows": stats.rows,
+                **{f"{section}_ms": round(spent * 1000, 1) for section, spent in stats.sections.items()},
+                "queries": [{"ms": round(elapsed * 1000, 2), "sql": " ".join(statement.split())[:300]}
+                            for statement, elapsed in stats.statements],
+                "queries_not_listed": max(0, stats.queries - len(stats.statements)),
+            }))
+
+    def render(self):
+        def series(histograms, names=("route", "method")):
+            return [(dict(zip(names, key)), histogram) for key, histogram in sorted(histograms.items())]
+
+        with self._lock:
+            statuses = sorted(self.statuses.items())
+        lines = render_histograms("http_request_duration_seconds", "Request latency by route.", series(self.latency))
+        lines += render_counter("http_requests_total", "Requests by route and status code.",
+                                [(dict(route=route, method=method, status=status), count)
+                                 for (route, method, status), count in statuses])
+        lines += render_histograms("http_request_db_queries", "SQL statements issued per request.", series(self.db_queries))
+        lines += render_histograms("http_request_db_seconds", "Time in SQL per request.", series(self.db_seconds))
+        lines += render_histograms("http_request_db_rows", "Rows fetched per request.", series(self.db_rows))
+        lines += render_histograms("http_request_section_seconds", "Time per request in ML inference and Plaid calls.",
+                                   series(self.section_seconds, ("route", "method", "section")))
+        lines += render_histograms("db_query_duration_seconds", "Duration of every SQL statement, including background work.",
+                                   [({}, self.query_duration)])
+        lines += render_histograms("section_duration_seconds", "Duration of ML inference and Plaid calls, wherever they run.",
+                                   [({"section": name}, histogram) for name, histogram in sorted(sections.histograms.items())])
+        return lines
+
+
+class MetricsMiddleware:
+    """ASGI middleware feeding RequestMetrics. The route label is the matched route's path, so
+    path parameters and unknown URLs do not create new series."""
+
+    def __init__(self, app, metrics: RequestMetrics, known_paths=()):
+        self.app = app
+        self.metrics = metrics
+        self.known_paths = set(known_paths)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        status = {"code": 500}
+
+        async def send_with_status(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        stats, token = self.metrics.begin()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            route = scope.get("route")
+            path = route.path if route is not None else scope["path"]
+            if path not in self.known_paths and route is None:
+                path = "unmatched"
+            self.metrics.end(token, stats, path, scope["method"], status["code"], time.perf_counter() - started)
@@ -0,0 +1,77 @@
+import argparse
+import logging
+from datetime import datetime
+from sqlalchemy import select, update
+from sqlalchemy.orm import Session
+from app.database import SessionLocal, upsert
+from app.models import create_tables
+from app.models.data_migration import DataMigration
+from app.categories import backfill_categories
+from app.ownership import backfill_ownership
+from app.rollups import ensure_rollups
+from app.forecast import rebuild_forecast_stats
+
+logger = logging.getLogger(__name__)
+
+# One-off data migrations for rows written before a feature existed, in the order they must run.
+# Each is a full scan, so it runs once per database rather than on every start.
+MIGRATIONS = [
+    ("backfill_categories", backfill_categories),
+    ("backfill_ownership", backfill_ownership),
+    ("ensure_rollups", ensure_rollups),
+    ("forecast_stats", rebuild_forecast_stats),
+]
+
+
+def _claim(db: Session, name: str):
+    """Insert the marker row for `name`; True if this process inserted it and so runs the migration."""
+    statement = upsert(db, DataMigration).values(name=name, started_at=datetime.now())
+    claimed = db.execute(statement.on_conflict_do_nothing(index_elements=["name"]).returning(DataMigration.name)).first()
+    db.commit()
+    return claimed is not None
+
+
+def _finish(db: Session, name: str):
+    db.execute(update(DataMigration).where(DataMigration.name == name).values(finished_at=datetime.now()))
+    db.commit()
+
+
+def run_pending(db: Session, resume: bool = False, log=logger.info):
+    """Run the migrations that have not finished yet; returns the names it ran.
+
+    Several processes may start at once: only the one that claims a migration runs it, the others
+    skip it. A migration claimed but never finished (still running elsewhere, or its process died)
+    is left alone unless `resume` is set, as the CLI does; the ones after it wait for it.
+    """
+    finished = set(db.scalars(select(DataMigration.name).where(DataMigration.finished_at.isnot(None))))
+    db.rollback()
+    ran = []
+    for name, migrate in MIGRATIONS:
+        if name in finished:
+            continue
+        if not _claim(db, name) and not resume:
+            logger.warning("Data migration %s is running in another process or was interrupted; "
+                           "if it was interrupted, run python -m app.migrate", name)
+            break
+        log(f"Running data migration {name}")
+        migrate(db)
+        _finish(db, name)
+        ran.append(name)
+    return ran
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the one-off data migrations this database has not finished.")
+    parser.add_argument("--rerun", action="store_true", help="Run every migration again, e.g. after restoring old rows")
+    args = parser.parse_args()
+
+    create_tables()
+    db = SessionLocal()
+    try:
+        if args.rerun:
+            db.query(DataMigration).delete()
+            db.commit()
+        ran = run_pending(db, resume=True, log=print)
+        print(f"Ran {', '.join(ran)}." if ran else "No data migrations pending.")
+    finally:
+        db.close()
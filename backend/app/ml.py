@@ -0,0 +1,123 @@
+import hashlib
+import os
+import pickle
+import threading
+from app.startup_report import timed
+
+MODEL_PATH = os.getenv("FRAUD_MODEL_PATH", "xgbmodel.json")
+ENCODER_PATH = os.getenv("FRAUD_ENCODER_PATH", "encoder.pkl")
+
+# Column order and types the booster was trained with
+FEATURES = ["merchant", "category", "amt", "trans_num", "hour", "day_of_week", "day_of_month", "month"]
+FEATURE_TYPES = ["int", "int", "float", "int", "int", "int", "int", "int"]
+CATEGORICAL = ["merchant", "category", "trans_num"]
+
+# Code given to labels the encoders never saw during training
+UNKNOWN_CODE = -1
+
+# Probability above which the classifier calls a transaction fraud (XGBClassifier.predict semantics)
+FRAUD_THRESHOLD = 0.5
+
+# xgboost and sklearn cost seconds and hundreds of MB to import, so nothing
+# here is loaded until the first request that needs it (or warm_up()).
+_lock = threading.Lock()
+_booster = None
+_tables = None
+_versions = {}  # model path -> version tag
+
+
+class CategoryTable:
+    """A fitted LabelEncoder compiled to a dict; unseen labels map to UNKNOWN_CODE instead of raising."""
+
+    def __init__(self, classes):
+        self.codes = {label: code for code, label in enumerate(classes)}
+
+    def encode(self, label):
+        return self.codes.get(label, UNKNOWN_CODE)
+
+    def encode_many(self, labels):
+        import numpy as np
+
+        codes = self.codes
+        return np.fromiter((codes.get(label, UNKNOWN_CODE) for label in labels), dtype=np.float32, count=len(labels))
+
+
+def model_version(path: str = MODEL_PATH):
+    """Tag stored next to every score: FRAUD_MODEL_VERSION, or a hash of the model file.
+
+    The hash is taken once per path, when the booster loads or on first use, and reused after that.
+    """
+    override = os.getenv("FRAUD_MODEL_VERSION")
+    if override:
+        return override
+    version = _versions.get(path)
+    if version is None:
+        with open(path, "rb") as file:
+            version = _versions[path] = "xgb-" + hashlib.sha256(file.read()).hexdigest()[:12]
+    return version
+
+
+def load_booster(path: str = MODEL_PATH):
+    import xgboost as xgb
+
+    booster = xgb.Booster()
+    booster.load_model(path)
+    model_version(path)
+    return booster
+
+
+def load_encoding_tables(path: str = ENCODER_PATH):
+    # Unpickling the LabelEncoders is what imports sklearn; only their classes_ are kept
+    with open(path, "rb") as file:
+        encoders = pickle.load(file)
+    return {col: CategoryTable(encoders[col].classes_) for col in CATEGORICAL}
+
+
+def get_booster():
+    global _booster
+    if _booster is None:
+        with _lock:
+            if _booster is None:
+                with timed("import xgboost"):
+                    import xgboost  # noqa: F401
+                with timed("load " + MODEL_PATH):
+                    _booster = load_booster(MODEL_PATH)
+    return _booster
+
+
+def get_encoding_tables():
+    global _tables
+    if _tables is None:
+        with _lock:
+            if _tables is None:
+                with timed("load " + ENCODER_PATH):
+                    _tables = load_encoding_tables(ENCODER_PATH)
+    return _tables
+
+
+def feature_matrix(entries, tables=None):
+    """float32 matrix in FEATURES order from dicts keyed by feature name (raw labels for categoricals)."""
+    import numpy as np
+
+    tables = tables or get_encoding_tables()
+    matrix = np.empty((len(entries), len(FEATURES)), dtype=np.float32)
+    for i, entry in enumerate(entries):
+        matrix[i] = [tables[name].encode(entry[name]) if name in tables else (entry[name] or 0) for name in FEATURES]
+    return matrix
+
+
+def predict_scores(booster, matrix):
+    """Fraud probability for each row of a feature matrix."""
+    import xgboost as xgb
+
+    return booster.predict(xgb.DMatrix(matrix, feature_names=FEATURES, feature_types=FEATURE_TYPES))
+
+
+def warm_up():
+    """Load every ML dependency and artifact now instead of on first use."""
+    get_booster()
+    get_encoding_tables()
+
+
+def is_loaded():
+    return {"model": _booster is not None, "encoder": _tables is not None}
@@ -0,0 +1,28 @@
+# Every model is imported whenever any one is, so foreign keys between tables resolve (and
+# Base.metadata.create_all sees every table) no matter which model a script imports first
+from app.models import (  # noqa: F401
+    user, plaid_item, account, transaction, transaction_category, daily_category_spending, category_total, score_backfill,
+    data_migration, forecast_stats,
+)
+
+
+def create_tables():
+    """Bring a database from any earlier version up to the current schema: missing tables, then the
+    columns and indexes that models gained after their table was first created."""
+    from app.database import Base, SessionLocal, schema_lock, add_missing_columns, ensure_indexes, has_index
+
+    removed = 0
+    with schema_lock() as conn:
+        Base.metadata.create_all(bind=conn)
+        for model in (user.User, transaction.Transaction, transaction_category.TransactionCategory):
+            add_missing_columns(conn, model)
+        # Concurrent backfills from before the unique index may have written duplicate category rows,
+        # which also went into the rollups; drop them so the index can be built
+        if not has_index(conn, transaction_category.TransactionCategory, "uq_transaction_categories_transaction_id_category"):
+            removed = transaction_category.delete_duplicates(conn)
+        for model in (transaction.Transaction, transaction_category.TransactionCategory):
+            ensure_indexes(conn, model)
+    if removed:
+        from app.rollups import rebuild_rollups
+        with SessionLocal() as db:
+            rebuild_rollups(db)
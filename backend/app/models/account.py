@@ -0,0 +1,14 @@
+from sqlalchemy import Column, Integer, String, ForeignKey
+from app.database import Base
+
+class Account(Base):
+    __tablename__ = "accounts"
+
+    # Keyed by the Plaid account_id that transactions carry
+    account_id = Column(String, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True)
+    item_id = Column(Integer, ForeignKey("plaid_items.id", ondelete="CASCADE"), nullable=True, index=True)  # None for manual accounts
+    name = Column(String, nullable=True)
+    mask = Column(String, nullable=True)
+    type = Column(String, nullable=True)
+    subtype = Column(String, nullable=True)
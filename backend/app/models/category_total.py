@@ -0,0 +1,11 @@
+from sqlalchemy import Column, Integer, String, Float
+from app.database import Base
+
+class CategoryTotal(Base):
+    __tablename__ = "category_totals"
+
+    # All-time count and spend per (user, category); maintained with the daily rollups in app/rollups.py
+    user_id = Column(Integer, primary_key=True)
+    category = Column(String, primary_key=True)
+    total = Column(Float, nullable=False, default=0)
+    count = Column(Integer, nullable=False, default=0)
@@ -0,0 +1,16 @@
+from sqlalchemy import Column, Integer, String, Float, Date, Index
+from app.database import Base
+
+class DailyCategorySpending(Base):
+    __tablename__ = "daily_category_spending"
+
+    # One row per (user, category, day); maintained by app/rollups.py
+    user_id = Column(Integer, primary_key=True)
+    category = Column(String, primary_key=True)
+    day = Column(Date, primary_key=True)
+    total = Column(Float, nullable=False, default=0)
+    count = Column(Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        Index("ix_daily_category_spending_category_day", "category", "day"),
+    )
@@ -0,0 +1,10 @@
+from sqlalchemy import Column, String, DateTime
+from app.database import Base
+
+class DataMigration(Base):
+    __tablename__ = "data_migrations"
+
+    # One row per one-off data migration, inserted by the process that claims it
+    name = Column(String, primary_key=True)
+    started_at = Column(DateTime, nullable=False)
+    finished_at = Column(DateTime, nullable=True)  # Null while running, or if the run died part way
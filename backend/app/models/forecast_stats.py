@@ -0,0 +1,17 @@
+from sqlalchemy import Column, Integer, String, Float, Date
+from app.database import Base
+
+class ForecastStats(Base):
+    __tablename__ = "forecast_stats"
+
+    # Regression sums of one (user, category, month) forecast; maintained with the daily rollups by
+    # app/forecast.py. The points are (day of month, cumulative spend through that day) per day with transactions.
+    user_id = Column(Integer, primary_key=True)
+    category = Column(String, primary_key=True)
+    month = Column(Date, primary_key=True)  # First day of the month
+    n = Column(Integer, nullable=False, default=0)
+    sum_x = Column(Integer, nullable=False, default=0)
+    sum_xx = Column(Integer, nullable=False, default=0)
+    sum_y = Column(Float, nullable=False, default=0)
+    sum_xy = Column(Float, nullable=False, default=0)
+    spent = Column(Float, nullable=False, default=0)  # Cumulative spend at the month's last day with transactions
@@ -0,0 +1,12 @@
+from sqlalchemy import Column, Integer, String, ForeignKey
+from app.database import Base
+
+class PlaidItem(Base):
+    __tablename__ = "plaid_items"
+
+    # One linked institution login; a user can link several
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True)
+    item_id = Column(String, unique=True, nullable=True)  # Plaid item_id (unknown for items linked before this table)
+    access_token = Column(String, nullable=False)
+    cursor = Column(String, nullable=True)  # /transactions/sync position, see app/ingest.py
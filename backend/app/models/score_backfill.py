@@ -0,0 +1,11 @@
+from sqlalchemy import Column, Integer, String, DateTime
+from app.database import Base
+
+class ScoreBackfill(Base):
+    __tablename__ = "score_backfills"
+
+    # Progress of a fraud-score backfill, one row per model version
+    model_version = Column(String, primary_key=True)
+    last_transaction_id = Column(Integer, nullable=False, default=0)  # Watermark: every id <= this is scored
+    scored = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, nullable=True)
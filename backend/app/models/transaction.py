@@ -1,17 +1,35 @@
-from sqlalchemy import Column, Integer, String, Float, ForeignKey, Date
+from sqlalchemy import Column, Integer, String, Float, ForeignKey, Date, Index
+from sqlalchemy.orm import relationship
 from app.database import Base
 
 class Transaction(Base):
     __tablename__ = "transactions"
 
     id = Column(Integer, primary_key=True, index=True, autoincrement=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=True)  # Owner; request-path queries filter on it (see indexes below)
     transaction_id = Column(String, unique=True, index=True)
     account_id = Column(String, index=True)
     name = Column(String)
     merchant_name = Column(String, nullable=True)
     amount = Column(Float)
-    date = Column(Date)
+    date = Column(Date, index=True)
     category = Column(String)  # JSON Stringified Array
     payment_channel = Column(String)
     currency = Column(String, nullable=True)
+    fraud_score = Column(Float, nullable=True)  # P(fraud) from the XGBoost model
+    fraud_model_version = Column(String, nullable=True)  # Model that produced fraud_score
+
+    # Normalized copy of `category`, one row per category (see app/categories.py)
+    categories = relationship(
+        "TransactionCategory",
+        back_populates="transaction",
+        cascade="all, delete-orphan",
+    )
+
+    # Date filters are always ranges (date >= first_day AND date < next_month) so these stay usable
+    __table_args__ = (
+        Index("ix_transactions_account_id_date", "account_id", "date"),
+        Index("ix_transactions_date_amount", "date", "amount"),
+        Index("ix_transactions_user_id_date", "user_id", "date"),
+    )
 
@@ -0,0 +1,27 @@
+from sqlalchemy import Column, Integer, String, ForeignKey, Date, Index, delete, func, select
+from sqlalchemy.orm import relationship
+from app.database import Base
+
+class TransactionCategory(Base):
+    __tablename__ = "transaction_categories"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    transaction_id = Column(Integer, ForeignKey("transactions.id", ondelete="CASCADE"), nullable=False, index=True)
+    user_id = Column(Integer, nullable=True)  # Copied from the transaction, like date, for per-user category queries
+    category = Column(String, nullable=False)
+    date = Column(Date)  # Copied from the transaction so category filters stay on this index
+
+    transaction = relationship("Transaction", back_populates="categories")
+
+    __table_args__ = (
+        Index("ix_transaction_categories_category_date", "category", "date"),
+        Index("ix_transaction_categories_user_id_category_date", "user_id", "category", "date"),
+        # One row per category of a transaction, so concurrent backfills cannot write copies
+        Index("uq_transaction_categories_transaction_id_category", "transaction_id", "category", unique=True),
+    )
+
+
+def delete_duplicates(conn):
+    """Keep the first row of each (transaction_id, category); returns how many copies were deleted."""
+    first = select(func.min(TransactionCategory.id)).group_by(TransactionCategory.transaction_id, TransactionCategory.category)
+    return conn.execute(delete(TransactionCategory).where(TransactionCategory.id.not_in(first))).rowcount
@@ -0,0 +1,84 @@
+from sqlalchemy import select, update
+from sqlalchemy.orm import Session
+from app.database import SessionLocal
+from app.models import create_tables
+from app.models.user import User
+from app.models.account import Account
+from app.models.transaction import Transaction
+from app.models.transaction_category import TransactionCategory
+from app.rollups import rebuild_rollups
+from app.profiling import traced
+
+
+@traced
+def default_account(db: Session, user: User):
+    """Account that manually entered transactions are filed under: the user's first account, or a manual one."""
+    account = db.query(Account).filter(Account.user_id == user.id).order_by(Account.account_id).first()
+    if account is None:
+        account = Account(account_id=f"manual-{user.id}", user_id=user.id, name="Manual entries")
+        db.add(account)
+        db.flush()
+    return account
+
+
+def _claim_by_account(db: Session):
+    owner = select(Account.user_id).where(Account.account_id == Transaction.account_id).scalar_subquery()
+    return db.execute(
+        update(Transaction)
+        .where(Transaction.user_id.is_(None), Transaction.account_id.in_(select(Account.account_id)))
+        .values(user_id=owner)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+
+
+def backfill_ownership(db: Session):
+    """Give an owner to transactions stored before they carried a user_id; returns how many were claimed.
+
+    Transactions follow the owner of their account. On a single-user database, accounts nobody
+    owns yet are assigned to that user first, which covers every row written before ownership.
+    """
+    claimed = _claim_by_account(db)
+
+    users = db.query(User.id).limit(2).all()
+    if len(users) == 1:
+        user_id = users[0][0]
+        known = select(Account.account_id)
+        orphan_accounts = db.query(Transaction.account_id).filter(
+            Transaction.user_id.is_(None), Transaction.account_id.isnot(None), Transaction.account_id.notin_(known)
+        ).distinct().all()
+        db.add_all(Account(account_id=account_id, user_id=user_id) for (account_id,) in orphan_accounts)
+        db.flush()
+        claimed += _claim_by_account(db)
+        claimed += db.execute(
+            update(Transaction)
+            .where(Transaction.user_id.is_(None), Transaction.account_id.is_(None))
+            .values(user_id=user_id)
+            .execution_options(synchronize_session=False)
+        ).rowcount
+
+    # Category rows copy their transaction's owner
+    owner = select(Transaction.user_id).where(Transaction.id == TransactionCategory.transaction_id).scalar_subquery()
+    db.execute(
+        update(TransactionCategory)
+        .where(
+            TransactionCategory.user_id.is_(None),
+            TransactionCategory.transaction_id.in_(select(Transaction.id).where(Transaction.user_id.isnot(None))),
+        )
+        .values(user_id=owner)
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()
+
+    # Rollups are keyed by owner, so rows that moved out of the unowned bucket need a rebuild
+    if claimed:
+        rebuild_rollups(db)
+    return claimed
+
+
+if __name__ == "__main__":
+    create_tables()  # A database from before ownership lacks the accounts table and the user_id columns
+    db = SessionLocal()
+    try:
+        print(f"Assigned owners to {backfill_ownership(db)} transactions.")
+    finally:
+        db.close()
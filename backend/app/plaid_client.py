@@ -0,0 +1,257 @@
+import asyncio
+import os
+import random
+import threading
+import time
+from collections import defaultdict
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import NewConnectionError
+from dotenv import load_dotenv
+from app.metrics import Histogram, render_counter, render_histograms, sections
+from app.profiling import record_span
+
+load_dotenv()
+
+PLAID_CLIENT_ID = os.getenv("PLAID_CLIENT_ID")
+PLAID_SECRET = os.getenv("PLAID_SECRET")
+# Point this at a local stand-in to run everything offline
+PLAID_BASE_URL = os.getenv("PLAID_BASE_URL", "https://sandbox.plaid.com")
+
+PLAID_CONNECT_TIMEOUT = float(os.getenv("PLAID_CONNECT_TIMEOUT", "3"))
+PLAID_READ_TIMEOUT = float(os.getenv("PLAID_READ_TIMEOUT", "15"))
+PLAID_MAX_RETRIES = int(os.getenv("PLAID_MAX_RETRIES", "4"))
+PLAID_BACKOFF_BASE = float(os.getenv("PLAID_BACKOFF_BASE", "0.5"))
+PLAID_BACKOFF_MAX = float(os.getenv("PLAID_BACKOFF_MAX", "8"))
+# Total time a call may take, every attempt and backoff included
+PLAID_DEADLINE = float(os.getenv("PLAID_DEADLINE_SECONDS", "20"))
+PLAID_POOL_SIZE = int(os.getenv("PLAID_POOL_SIZE", "20"))
+
+LATENCY_BUCKETS = [0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30]
+
+# Plaid errors worth retrying: rate limits, data not ready yet, and Plaid-side failures
+RETRYABLE_ERROR_TYPES = {"RATE_LIMIT_EXCEEDED", "API_ERROR"}
+RETRYABLE_ERROR_CODES = {"PRODUCT_NOT_READY", "INTERNAL_SERVER_ERROR", "PLANNED_MAINTENANCE"}
+
+# Calls that change state on Plaid's side, so a request that may have reached Plaid is not sent again
+NON_IDEMPOTENT_PATHS = {"/item/public_token/exchange"}
+
+
+class PlaidError(Exception):
+    def __init__(self, error_code, message, status_code=None, error_type=None):
+        super().__init__(f"{error_code}: {message}")
+        self.error_code = error_code
+        self.error_type = error_type
+        self.status_code = status_code
+
+    @property
+    def retryable(self):
+        return (
+            self.status_code == 429
+            or (self.status_code or 0) >= 500
+            or self.error_type in RETRYABLE_ERROR_TYPES
+            or self.error_code in RETRYABLE_ERROR_CODES
+        )
+
+
+def replay_safe(path: str, payload: dict):
+    """Whether a call may be repeated after a timeout or an ambiguous failure. A public token exchanges
+    only once, and a /transactions/sync page with a cursor is the one Plaid expects next."""
+    return path not in NON_IDEMPOTENT_PATHS and not (path == "/transactions/sync" and payload.get("cursor"))
+
+
+def should_retry(error, safe: bool, connect_failed: bool):
+    """Retry policy for one failed attempt. Calls that are not replay-safe are only retried when the
+    request never reached Plaid (connect errors) or Plaid refused it outright (429, 5xx)."""
+    if isinstance(error, PlaidError):
+        if safe:
+            return error.retryable
+        return error.status_code == 429 or (error.status_code or 0) >= 500
+    return safe or connect_failed
+
+
+def _connect_failed(error):
+    # requests reports a refused or unresolvable connection as a ConnectionError wrapping urllib3's error
+    reason = getattr(error.args[0], "reason", None) if error.args else None
+    return isinstance(error, requests.ConnectTimeout) or isinstance(reason, NewConnectionError)
+
+
+def _capped(timeout, remaining: float):
+    """(connect, read) timeouts that end the attempt by the call's deadline."""
+    connect, read = timeout if isinstance(timeout, tuple) else (timeout, timeout)
+    remaining = max(remaining, 0.001)
+    return min(connect, remaining), min(read, remaining)
+
+
+def backoff_delay(attempt: int):
+    """Full-jitter exponential backoff: uniform in [0, min(max, base * 2**attempt)]."""
+    return random.uniform(0, min(PLAID_BACKOFF_MAX, PLAID_BACKOFF_BASE * 2 ** attempt))
+
+
+def _json(response):
+    try:
+        return response.json()
+    except ValueError:
+        return {"error_code": "INVALID_RESPONSE", "error_message": f"HTTP {response.status_code} with a non-JSON body"}
+
+
+def _check(status_code, result):
+    if status_code != 200 or "error_code" in result:
+        raise PlaidError(result.get("error_code"), result.get("error_message"), status_code, result.get("error_type"))
+    return result
+
+
+class PlaidMetrics:
+    """Per-endpoint latency histograms and request/retry/error counters, shared by both clients."""
+
+    def __init__(self):
+        self.latency = defaultdict(lambda: Histogram(LATENCY_BUCKETS))
+        self.counters = defaultdict(lambda: {"requests": 0, "retries": 0, "errors": 0})
+        self._lock = threading.Lock()
+
+    def record(self, path, seconds, retries, failed):
+        self.latency[path].observe(seconds)
+        sections.record("plaid", seconds)
+        record_span("plaid", seconds, endpoint=path, retries=retries, failed=failed)
+        with self._lock:
+            counters = self.counters[path]
+            counters["requests"] += 1
+            counters["retries"] += retries
+            counters["errors"] += int(failed)
+
+    def snapshot(self):
+        with self._lock:
+            paths = list(self.counters)
+            return {path: dict(self.counters[path], latency_seconds=self.latency[path].snapshot()) for path in paths}
+
+    def render(self):
+        """Prometheus text lines for /metrics."""
+        with self._lock:
+            counters = sorted((path, dict(values)) for path, values in self.counters.items())
+        lines = render_histograms("plaid_request_duration_seconds", "Plaid call latency by endpoint, retries included.",
+                                  [({"endpoint": path}, self.latency[path]) for path, _ in counters])
+        for name in ("requests", "retries", "errors"):
+            lines += render_counter(f"plaid_{name}_total", f"Plaid {name} by endpoint.",
+                                    [({"endpoint": path}, values[name]) for path, values in counters])
+        return lines
+
+
+metrics = PlaidMetrics()
+
+
+class PlaidClient:
+    """Plaid client over one keep-alive connection pool, with timeouts and jittered retries."""
+
+    def __init__(self, base_url: str = None, pool_size: int = PLAID_POOL_SIZE, max_retries: int = PLAID_MAX_RETRIES,
+                 timeout=(PLAID_CONNECT_TIMEOUT, PLAID_READ_TIMEOUT), deadline: float = PLAID_DEADLINE):
+        self.base_url = base_url or PLAID_BASE_URL
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self.deadline = deadline
+        self.session = requests.Session()
+        self.adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("https://", self.adapter)
+        self.session.mount("http://", self.adapter)
+
+    def post(self, path: str, payload: dict, timeout=None):
+        body = dict(payload, client_id=PLAID_CLIENT_ID, secret=PLAID_SECRET)
+        safe = replay_safe(path, payload)
+        started = time.perf_counter()
+        deadline = started + self.deadline
+        attempt = 0
+        while True:
+            try:
+                response = self.session.post(f"{self.base_url}{path}", json=body,
+                                             timeout=_capped(timeout or self.timeout, deadline - time.perf_counter()))
+                result = _check(response.status_code, _json(response))
+                metrics.record(path, time.perf_counter() - started, attempt, False)
+                return result
+            except (PlaidError, requests.ConnectionError, requests.Timeout) as e:
+                delay = backoff_delay(attempt)
+                if attempt >= self.max_retries or time.perf_counter() + delay >= deadline \
+                        or not should_retry(e, safe, not isinstance(e, PlaidError) and _connect_failed(e)):
+                    metrics.record(path, time.perf_counter() - started, attempt, True)
+                    raise
+            time.sleep(delay)
+            attempt += 1
+
+    def pool_stats(self):
+        container = self.adapter.poolmanager.pools
+        with container.lock:  # urllib3's LRU container refuses plain iteration
+            pools = list(container._container.values())
+        return {
+            "max_size": self.adapter._pool_maxsize,
+            "pools": [
+                {
+                    "host": pool.host,
+                    # urllib3 pads its queue with None for slots it has not opened yet
+                    "idle_connections": sum(conn is not None for conn in list(pool.pool.queue)) if pool.pool else 0,
+                    "connections_opened": pool.num_connections,
+                    "requests": pool.num_requests,
+                }
+                for pool in pools
+            ],
+        }
+
+    def close(self):
+        self.session.close()
+
+
+class AsyncPlaidClient:
+    """Async twin of PlaidClient for `async def` endpoints, on an httpx connection pool."""
+
+    def __init__(self, base_url: str = None, pool_size: int = PLAID_POOL_SIZE, max_retries: int = PLAID_MAX_RETRIES,
+                 timeout=(PLAID_CONNECT_TIMEOUT, PLAID_READ_TIMEOUT), deadline: float = PLAID_DEADLINE):
+        self.base_url = base_url or PLAID_BASE_URL
+        self.pool_size = pool_size
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self.deadline = deadline
+        self._client = None
+
+    def _get_client(self):
+        if self._client is None:
+            import httpx
+
+            connect, read = self.timeout
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                timeout=httpx.Timeout(read, connect=connect),
+                limits=httpx.Limits(max_connections=self.pool_size, max_keepalive_connections=self.pool_size),
+            )
+        return self._client
+
+    async def post(self, path: str, payload: dict):
+        import httpx
+
+        client = self._get_client()
+        body = dict(payload, client_id=PLAID_CLIENT_ID, secret=PLAID_SECRET)
+        safe = replay_safe(path, payload)
+        started = time.perf_counter()
+        deadline = started + self.deadline
+        attempt = 0
+        while True:
+            connect, read = _capped(self.timeout, deadline - time.perf_counter())
+            try:
+                response = await client.post(path, json=body, timeout=httpx.Timeout(read, connect=connect))
+                result = _check(response.status_code, _json(response))
+                metrics.record(path, time.perf_counter() - started, attempt, False)
+                return result
+            except (PlaidError, httpx.TransportError) as e:
+                delay = backoff_delay(attempt)
+                if attempt >= self.max_retries or time.perf_counter() + delay >= deadline \
+                        or not should_retry(e, safe, isinstance(e, (httpx.ConnectError, httpx.ConnectTimeout))):
+                    metrics.record(path, time.perf_counter() - started, attempt, True)
+                    raise
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+# Shared clients: every Plaid call in the app goes through one of these pools
+plaid = PlaidClient()
+async_plaid = AsyncPlaidClient()
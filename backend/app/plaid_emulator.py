@@ -0,0 +1,201 @@
+import argparse
+import asyncio
+import hashlib
+import os
+import random
+import socket
+import threading
+import time
+import uuid
+from collections import Counter
+from datetime import date, timedelta
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+# Used when the emulator runs on its own: python -m app.plaid_emulator
+EMULATOR_LATENCY_MS = float(os.getenv("PLAID_EMULATOR_LATENCY_MS", "0"))
+EMULATOR_JITTER_MS = float(os.getenv("PLAID_EMULATOR_JITTER_MS", "0"))
+EMULATOR_ERROR_RATE = float(os.getenv("PLAID_EMULATOR_ERROR_RATE", "0"))
+EMULATOR_RATE_LIMIT_RATE = float(os.getenv("PLAID_EMULATOR_RATE_LIMIT_RATE", "0"))
+EMULATOR_TRANSACTIONS = int(os.getenv("PLAID_EMULATOR_TRANSACTIONS", "200"))
+
+CATEGORIES = [
+    ["Food and Drink", "Restaurants"], ["Food and Drink", "Coffee Shop"], ["Entertainment"], ["Travel", "Airlines"],
+    ["Shops"], ["Transfer", "Payroll"],
+]
+MERCHANTS = ["Starbucks", "Uber", "AMC", "Delta", "Whole Foods", "Shell", "Amazon"]
+
+
+def _item_seed(seed: int, access_token: str):
+    return int(hashlib.sha1(f"{seed}:{access_token}".encode()).hexdigest()[:12], 16)
+
+
+def item_accounts(access_token: str):
+    suffix = access_token.rsplit("-", 1)[-1]
+    return [
+        {"account_id": f"acc-{suffix}-checking", "name": "Plaid Checking", "mask": "0000", "type": "depository", "subtype": "checking"},
+        {"account_id": f"acc-{suffix}-credit", "name": "Plaid Credit Card", "mask": "3333", "type": "credit", "subtype": "credit card"},
+    ]
+
+
+def item_transactions(access_token: str, count: int, seed: int = 0, days: int = 90):
+    """The item's full history, oldest first; the same token always yields the same transactions."""
+    rng = random.Random(_item_seed(seed, access_token))
+    accounts = item_accounts(access_token)
+    suffix = access_token.rsplit("-", 1)[-1]
+    today = date.today()
+    transactions = []
+    for i in range(count):
+        category = rng.choice(CATEGORIES)
+        amount = -round(rng.uniform(1000, 3000), 2) if category[0] == "Transfer" else round(rng.uniform(1, 200), 2)
+        transactions.append({
+            "transaction_id": f"tx-{suffix}-{i}",
+            "account_id": rng.choice(accounts)["account_id"],
+            "name": "Emulated transaction",
+            "merchant_name": rng.choice(MERCHANTS),
+            "amount": amount,
+            "iso_currency_code": "USD",
+            "date": (today - timedelta(days=rng.randrange(days))).isoformat(),
+            "category": category,
+            "payment_channel": rng.choice(["online", "in store"]),
+        })
+    transactions.sort(key=lambda tx: tx["date"])
+    return transactions
+
+
+def _error(status_code: int, error_type: str, error_code: str, message: str):
+    return JSONResponse(status_code=status_code, content={
+        "error_type": error_type, "error_code": error_code, "error_message": message,
+        "display_message": None, "request_id": uuid.uuid4().hex[:16],
+    })
+
+
+def create_emulator(latency_ms: float = EMULATOR_LATENCY_MS, jitter_ms: float = EMULATOR_JITTER_MS,
+                    error_rate: float = EMULATOR_ERROR_RATE, rate_limit_rate: float = EMULATOR_RATE_LIMIT_RATE,
+                    transactions_per_item: int = EMULATOR_TRANSACTIONS, seed: int = 0):
+    """A stand-in for sandbox.plaid.com covering Link, token exchange and /transactions/sync.
+
+    Every call sleeps `latency_ms` plus up to `jitter_ms`, then fails with a 500 API_ERROR at
+    `error_rate` or a 429 RATE_LIMIT_EXCEEDED at `rate_limit_rate`. Latency and failures are drawn
+    from a generator seeded with `seed`, and item data is derived from the access token, so runs
+    are reproducible. Nothing is stored: any public token it issued can be exchanged, and the
+    sync cursor is an offset into the item's history.
+    """
+    app = FastAPI(title="Plaid emulator")
+    rng = random.Random(seed)
+    lock = threading.Lock()
+    app.state.calls = Counter()
+    app.state.failures = Counter()
+
+    @app.middleware("http")
+    async def emulate_network(request: Request, call_next):
+        path = request.url.path
+        with lock:
+            app.state.calls[path] += 1
+            delay = (latency_ms + rng.uniform(0, jitter_ms)) / 1000
+            roll = rng.random()
+        if delay:
+            await asyncio.sleep(delay)
+        if path.startswith("/emulator/"):
+            return await call_next(request)
+        if roll < error_rate:
+            with lock:
+                app.state.failures[path] += 1
+            return _error(500, "API_ERROR", "INTERNAL_SERVER_ERROR", "an unexpected error occurred")
+        if roll < error_rate + rate_limit_rate:
+            with lock:
+                app.state.failures[path] += 1
+            return _error(429, "RATE_LIMIT_EXCEEDED", "RATE_LIMIT", "rate limit exceeded")
+        return await call_next(request)
+
+    @app.post("/link/token/create")
+    async def link_token_create(body: dict):
+        return {
+            "link_token": f"link-sandbox-{uuid.uuid4()}",
+            "expiration": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(time.time() + 4 * 3600)),
+            "request_id": uuid.uuid4().hex[:16],
+        }
+
+    # What Link hands the frontend after the user picks a bank; the real sandbox offers the same shortcut
+    @app.post("/sandbox/public_token/create")
+    async def sandbox_public_token_create(body: dict):
+        return {"public_token": f"public-sandbox-{uuid.uuid4().hex}", "request_id": uuid.uuid4().hex[:16]}
+
+    @app.post("/item/public_token/exchange")
+    async def item_public_token_exchange(body: dict):
+        public_token = body.get("public_token") or ""
+        if not public_token.startswith("public-sandbox-"):
+            return _error(400, "INVALID_INPUT", "INVALID_PUBLIC_TOKEN", "provided public token is in an invalid format")
+        suffix = public_token.rsplit("-", 1)[-1]
+        return {"access_token": f"access-sandbox-{suffix}", "item_id": f"item-{suffix}", "request_id": uuid.uuid4().hex[:16]}
+
+    @app.post("/transactions/sync")
+    async def transactions_sync(body: dict):
+        access_token = body.get("access_token") or ""
+        if not access_token.startswith("access-sandbox-"):
+            return _error(400, "INVALID_INPUT", "INVALID_ACCESS_TOKEN", "provided access token is in an invalid format")
+        try:
+            offset = int(body.get("cursor") or 0)
+        except ValueError:
+            return _error(400, "INVALID_FIELD", "INVALID_CURSOR", "cursor is not valid")
+        count = max(1, min(int(body.get("count") or 100), 500))
+
+        history = item_transactions(access_token, transactions_per_item, seed)
+        page = history[offset:offset + count]
+        next_offset = offset + len(page)
+        return {
+            "accounts": item_accounts(access_token),
+            "added": page,
+            "modified": [],
+            "removed": [],
+            "next_cursor": str(next_offset),
+            "has_more": next_offset < len(history),
+            "request_id": uuid.uuid4().hex[:16],
+        }
+
+    @app.get("/emulator/stats")
+    async def emulator_stats():
+        with lock:
+            return {"calls": dict(app.state.calls), "failures": dict(app.state.failures)}
+
+    return app
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def serve_in_thread(app, port: int = None):
+    """Run `app` on a local uvicorn in a daemon thread; returns (server, base_url). Stop with server.should_exit = True."""
+    import uvicorn
+
+    port = port or free_port()
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, name="plaid-emulator", daemon=True).start()
+    deadline = time.monotonic() + 10
+    while not server.started:
+        if time.monotonic() > deadline:
+            raise RuntimeError("Plaid emulator did not start")
+        time.sleep(0.01)
+    return server, f"http://127.0.0.1:{port}"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve a local Plaid stand-in; point PLAID_BASE_URL at it.")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--latency-ms", type=float, default=EMULATOR_LATENCY_MS)
+    parser.add_argument("--jitter-ms", type=float, default=EMULATOR_JITTER_MS)
+    parser.add_argument("--error-rate", type=float, default=EMULATOR_ERROR_RATE)
+    parser.add_argument("--rate-limit-rate", type=float, default=EMULATOR_RATE_LIMIT_RATE)
+    parser.add_argument("--transactions", type=int, default=EMULATOR_TRANSACTIONS, help="history length per item")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    import uvicorn
+
+    uvicorn.run(
+        create_emulator(args.latency_ms, args.jitter_ms, args.error_rate, args.rate_limit_rate, args.transactions, args.seed),
+        host="127.0.0.1", port=args.port, log_level="warning",
+    )
@@ -0,0 +1,313 @@
+import contextvars
+import functools
+import heapq
+import hmac
+import inspect
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from contextlib import contextmanager
+from urllib.parse import parse_qs
+from starlette.concurrency import run_in_threadpool
+
+# Profiling is off unless this is set; a request opts in by sending it as X-Profile-Token or ?profile=
+PROFILE_TOKEN = os.getenv("PROFILE_TOKEN", "")
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+# Profiled requests kept (and their files on disk); the fastest is dropped first
+PROFILE_MAX_TRACES = int(os.getenv("PROFILE_MAX_TRACES", "50"))
+PROFILE_SAMPLE_MS = float(os.getenv("PROFILE_SAMPLE_MS", "2"))
+# Bounds a trace's memory when a request issues thousands of statements
+PROFILE_MAX_SPANS = int(os.getenv("PROFILE_MAX_SPANS", "5000"))
+
+TOKEN_HEADER = b"x-profile-token"
+
+
+class Span:
+    __slots__ = ("name", "started", "ended", "attrs", "children")
+
+    def __init__(self, name: str, started: float, attrs=None):
+        self.name = name
+        self.started = started
+        self.ended = None
+        self.attrs = attrs or {}
+        self.children = []
+
+    def to_dict(self, origin: float):
+        ended = self.ended if self.ended is not None else time.perf_counter()
+        node = {
+            "name": self.name,
+            "start_ms": round((self.started - origin) * 1000, 3),
+            "duration_ms": round((ended - self.started) * 1000, 3),
+        }
+        node.update(self.attrs)
+        if self.children:
+            # Children can be appended from several threads; order them by start
+            node["children"] = [child.to_dict(origin) for child in sorted(self.children, key=lambda span: span.started)]
+        return node
+
+
+class Trace:
+    """One profiled request: a span tree plus stack samples of the thread running its endpoint."""
+
+    def __init__(self, method: str, path: str):
+        self.id = uuid.uuid4().hex[:16]
+        self.created = time.time()
+        self.root = Span(f"{method} {path}", time.perf_counter())
+        self.method = method
+        self.path = path
+        self.route = path
+        self.status = None
+        self.span_count = 0
+        self.dropped_spans = 0
+        self.samples = Counter()  # folded stack -> count
+        self._done = threading.Event()
+
+    @property
+    def duration_ms(self):
+        return round(((self.root.ended or time.perf_counter()) - self.root.started) * 1000, 3)
+
+    def add_span(self, parent: Span, span: Span):
+        if self.span_count >= PROFILE_MAX_SPANS:
+            self.dropped_spans += 1
+            return False
+        self.span_count += 1
+        parent.children.append(span)
+        return True
+
+    def summary(self):
+        return {
+            "id": self.id,
+            "created": self.created,
+            "method": self.method,
+            "path": self.path,
+            "route": self.route,
+            "status": self.status,
+            "duration_ms": self.duration_ms,
+            "spans": self.span_count,
+            "samples": sum(self.samples.values()),
+        }
+
+    def to_dict(self):
+        return dict(self.summary(), dropped_spans=self.dropped_spans, sample_interval_ms=PROFILE_SAMPLE_MS,
+                    tree=self.root.to_dict(self.root.started))
+
+    def folded(self):
+        """Samples in the folded-stack format flamegraph.pl, speedscope and inferno read."""
+        return "".join(f"{stack} {count}\n" for stack, count in self.samples.most_common())
+
+
+_trace = contextvars.ContextVar("profile_trace", default=None)
+_span = contextvars.ContextVar("profile_span", default=None)
+
+
+@contextmanager
+def span(name: str, **attrs):
+    """Time the block as a child of the current span; a no-op outside profiled requests."""
+    trace, parent = _trace.get(), _span.get()
+    if trace is None or parent is None:
+        yield
+        return
+    child = Span(name, time.perf_counter(), attrs)
+    if not trace.add_span(parent, child):
+        yield
+        return
+    token = _span.set(child)
+    try:
+        yield
+    finally:
+        child.ended = time.perf_counter()
+        _span.reset(token)
+
+
+def record_span(name: str, seconds: float, **attrs):
+    """Add a span that just finished after `seconds`, for callers that time themselves."""
+    trace, parent = _trace.get(), _span.get()
+    if trace is None or parent is None:
+        return
+    ended = time.perf_counter()
+    child = Span(name, ended - seconds, attrs)
+    child.ended = ended
+    trace.add_span(parent, child)
+
+
+def traced(fn):
+    """Decorator form of span(), named after the function; works on sync and async functions."""
+    name = fn.__qualname__
+    if inspect.iscoroutinefunction(fn):
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            if _trace.get() is None:
+                return await fn(*args, **kwargs)
+            with span(name):
+                return await fn(*args, **kwargs)
+    else:
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if _trace.get() is None:
+                return fn(*args, **kwargs)
+            with span(name):
+                return fn(*args, **kwargs)
+    return wrapper
+
+
+def instrument_engine(sync_engine):
+    """Add every statement a profiled request runs on `sync_engine` to its span tree."""
+    from sqlalchemy import event
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("profile_started", []).append(time.perf_counter())
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def after(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info["profile_started"].pop()
+        if _trace.get() is not None:
+            record_span("sql", time.perf_counter() - started, statement=" ".join(statement.split())[:500])
+
+
+def _frame_label(code):
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def _sample(trace: Trace, scope, interval: float):
+    """Until the request ends, record the stack of any thread currently inside its endpoint.
+
+    Routing sets scope["endpoint"] further in, so sampling starts once it appears. A coroutine's
+    frame is only on the event loop's stack while it runs, so async endpoints are sampled without
+    picking up other requests the loop interleaves with them.
+    """
+    me = threading.get_ident()
+    endpoint = None
+    while not trace._done.wait(interval):
+        if endpoint is None:
+            if scope.get("endpoint") is None:
+                continue
+            endpoint = inspect.unwrap(scope["endpoint"]).__code__
+        for ident, frame in sys._current_frames().items():
+            if ident == me:
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(frame.f_code)
+                if frame.f_code is endpoint:
+                    trace.samples[";".join(_frame_label(code) for code in reversed(stack))] += 1
+                    break
+                frame = frame.f_back
+
+
+class TraceStore:
+    """The PROFILE_MAX_TRACES slowest profiled requests, each also written to `directory`.
+
+    A min-heap on duration holds them, so a new trace only displaces the fastest one kept, and a
+    trace faster than all of them (once the store is full) is neither kept nor written.
+    """
+
+    def __init__(self, directory: str = PROFILE_DIR, max_traces: int = PROFILE_MAX_TRACES):
+        self.directory = directory
+        self.max_traces = max_traces
+        self._heap = []  # (duration_ms, trace id, trace)
+        self._by_id = {}
+        self._lock = threading.Lock()
+
+    def add(self, trace: Trace):
+        """Keep `trace` if it is among the slowest; returns whether it was kept. Writes files, so call it
+        off the event loop."""
+        entry = (trace.duration_ms, trace.id, trace)
+        # Files are written under the lock so an eviction never races the write of the trace it evicts
+        with self._lock:
+            if self.max_traces <= 0:
+                return False
+            if len(self._heap) < self.max_traces:
+                heapq.heappush(self._heap, entry)
+                evicted = None
+            elif entry[:2] > self._heap[0][:2]:
+                evicted = heapq.heapreplace(self._heap, entry)[2]
+                del self._by_id[evicted.id]
+            else:
+                return False
+            self._by_id[trace.id] = trace
+
+            os.makedirs(self.directory, exist_ok=True)
+            base = os.path.join(self.directory, trace.id)
+            with open(f"{base}.json", "w") as file:
+                json.dump(trace.to_dict(), file, indent=2)
+            with open(f"{base}.folded", "w") as file:
+                file.write(trace.folded())
+            if evicted is not None:
+                for suffix in (".json", ".folded"):
+                    try:
+                        os.remove(os.path.join(self.directory, evicted.id + suffix))
+                    except FileNotFoundError:
+                        pass
+        return True
+
+    def get(self, trace_id: str):
+        with self._lock:
+            return self._by_id.get(trace_id)
+
+    def slowest(self, limit: int = None):
+        with self._lock:
+            traces = [trace for _, _, trace in sorted(self._heap, reverse=True)[:limit]]
+        return [trace.summary() for trace in traces]
+
+
+def authorized(token) -> bool:
+    return bool(PROFILE_TOKEN) and token is not None and hmac.compare_digest(token.encode(), PROFILE_TOKEN.encode())
+
+
+def _requested_token(scope):
+    for name, value in scope["headers"]:
+        if name == TOKEN_HEADER:
+            return value.decode("latin-1")
+    values = parse_qs(scope.get("query_string", b"").decode("latin-1")).get("profile")
+    return values[0] if values else None
+
+
+class ProfilingMiddleware:
+    """Profiles requests that carry the profile token: a span tree (endpoint helpers wrapped with
+    @traced, SQL statements, ML and Plaid sections) and a sampling profile of the endpoint.
+    The response gets an X-Trace-Id header naming the trace, which is stored if it is among the slowest."""
+
+    def __init__(self, app, store: TraceStore, skip_prefix: str = None):
+        self.app = app
+        self.store = store
+        self.skip_prefix = skip_prefix
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not PROFILE_TOKEN or not authorized(_requested_token(scope)) \
+                or (self.skip_prefix and scope["path"].startswith(self.skip_prefix)):
+            return await self.app(scope, receive, send)
+
+        trace = Trace(scope["method"], scope["path"])
+
+        async def send_with_trace_id(message):
+            if message["type"] == "http.response.start":
+                trace.status = message["status"]
+                message = dict(message, headers=list(message.get("headers", [])) + [(b"x-trace-id", trace.id.encode())])
+            await send(message)
+
+        sampler = threading.Thread(target=_sample, args=(trace, scope, PROFILE_SAMPLE_MS / 1000),
+                                   name=f"profile-{trace.id}", daemon=True)
+        trace_token, span_token = _trace.set(trace), _span.set(trace.root)
+        sampler.start()
+        try:
+            await self.app(scope, receive, send_with_trace_id)
+        finally:
+            trace.root.ended = time.perf_counter()
+            trace._done.set()
+            _span.reset(span_token)
+            _trace.reset(trace_token)
+            route = scope.get("route")
+            if route is not None:
+                trace.route = route.path
+            # Joining the sampler and writing the files block, so neither runs on the event loop
+            await run_in_threadpool(self._finish, trace, sampler)
+
+    def _finish(self, trace: Trace, sampler: threading.Thread):
+        sampler.join()
+        self.store.add(trace)
+
@@ -0,0 +1,165 @@
+import argparse
+import os
+import re
+import shutil
+import sys
+import tempfile
+from datetime import date
+
+# Tables that grow with transaction volume; a full scan of any of them on the request path is a bug
+HOT_TABLES = {"transactions", "transaction_categories", "daily_category_spending"}
+
+USERS_QUERY = re.compile(r"^\s*SELECT\b.*\bFROM users\b", re.IGNORECASE | re.DOTALL)
+
+SCAN = re.compile(r"^SCAN (\w+)(?: AS \w+)?(?: USING (?:COVERING )?INDEX (\w+))?")
+
+# (method, path, needs ?username=) for the endpoints the dashboard polls
+ENDPOINTS = [
+    ("get", "/transactions", False),
+    ("get", "/transactions/export", False),
+    ("get", "/graph_data", False),
+    ("get", "/graph_data_food", False),
+    ("get", "/graph_data_travel", False),
+    ("get", "/graph_data_entertainment", False),
+    ("get", "/food_graph", True),
+    ("get", "/entertainment_graph", True),
+    ("get", "/travel_graph", True),
+    ("post", "/food_predicted", True),
+    ("get", "/get_all_predicted", True),
+    ("post", "/adaptive_spending", True),
+    ("post", "/top_spenders", True),
+    ("post", "/day_paid", True),
+    ("get", "/bank_balance", True),
+    ("get", "/get_food_spending", True),
+]
+
+# Endpoints that must resolve their user with exactly one users query, whether or not its id is cached
+USER_LOOKUP_ENDPOINTS = ["/dashboard", "/add_transaction"]
+
+
+def classify(detail: str):
+    """'full' for a table scan of a hot table, 'index' for a full pass over one of its indexes, else None."""
+    match = SCAN.match(detail)
+    if not match or match.group(1) not in HOT_TABLES:
+        return None
+    return "index" if match.group(2) else "full"
+
+
+def explain(conn, statement, parameters):
+    rows = conn.exec_driver_sql("EXPLAIN QUERY PLAN " + statement, tuple(parameters or ())).all()
+    return [row[-1] for row in rows]
+
+
+def check_endpoints(username: str, log=print):
+    """Call each endpoint in ENDPOINTS, EXPLAIN every query it ran, and return the full scans found.
+
+    Imports app.main, so DATABASE_URL must already point at the database to check.
+    """
+    from sqlalchemy import event
+    from fastapi.testclient import TestClient
+    from app.database import engine, async_engine
+    from app import main
+
+    captured = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if not executemany and statement.lstrip().upper().startswith(("SELECT", "UPDATE", "DELETE")):
+            captured.append((statement, parameters))
+
+    for sync_engine in (engine, async_engine.sync_engine):
+        event.listen(sync_engine, "before_cursor_execute", capture)
+
+    failures = []
+    with TestClient(main.app) as client:
+        for method, path, needs_user in ENDPOINTS:
+            captured.clear()
+            response = getattr(client, method)(path, params={"username": username} if needs_user else None)
+            main.recompute_queue.drain(timeout=30)  # work the endpoint queued counts against it
+            queries = list(captured)
+
+            with engine.connect() as conn:
+                plans = [(statement, explain(conn, statement, parameters)) for statement, parameters in queries]
+            log(f"{method.upper():4} {path:28} {response.status_code}  {len(queries)} queries")
+            for statement, plan in plans:
+                for detail in plan:
+                    kind = classify(detail)
+                    if kind is None:
+                        continue
+                    log(f"      {'FULL SCAN' if kind == 'full' else 'index scan'}: {detail}")
+                    if kind == "full":
+                        log(f"        {' '.join(statement.split())[:200]}")
+                        failures.append((path, detail, statement))
+
+    for sync_engine in (engine, async_engine.sync_engine):
+        event.remove(sync_engine, "before_cursor_execute", capture)
+    return failures
+
+
+def check_user_lookups(username: str, log=print):
+    """Call each of USER_LOOKUP_ENDPOINTS with the user-id cache cold, then warm, and count the users
+    queries each request ran. Returns [(path, cache state, count)] for calls that did not run exactly one.
+
+    Only statements run inside the request count; the recompute it queues loads the user on its own.
+    """
+    from sqlalchemy import event
+    from fastapi.testclient import TestClient
+    from app.database import engine, async_engine
+    from app.metrics import current_stats
+    from app.users import user_ids
+    from app import main
+
+    captured = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if current_stats() is not None and USERS_QUERY.match(statement):
+            captured.append(statement)
+
+    def call(client, path):
+        if path == "/add_transaction":
+            return client.post(path, json={
+                "username": username, "name": "query-plans", "merchant_name": "Starbucks", "amount": 4.5,
+                "date": str(date.today()), "category": ["Food and Drink"], "payment_channel": "online",
+            })
+        main.response_cache.bump(username)  # A cached response would never reach the endpoint
+        return client.get(path, params={"username": username})
+
+    for sync_engine in (engine, async_engine.sync_engine):
+        event.listen(sync_engine, "before_cursor_execute", capture)
+
+    failures = []
+    with TestClient(main.app) as client:
+        for path in USER_LOOKUP_ENDPOINTS:
+            user_ids.discard(username)
+            for state in ("cold", "warm"):
+                captured.clear()
+                response = call(client, path)
+                main.recompute_queue.drain(timeout=30)
+                log(f"{path:28} {state:4} {response.status_code}  {len(captured)} users queries")
+                if response.status_code != 200 or len(captured) != 1:
+                    failures.append((path, state, len(captured)))
+
+    for sync_engine in (engine, async_engine.sync_engine):
+        event.remove(sync_engine, "before_cursor_execute", capture)
+    return failures
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="EXPLAIN QUERY PLAN every query the hot endpoints run and count their user lookups; "
+                    "exits 1 if any fully scans a hot table or queries users more than once."
+    )
+    parser.add_argument("--database", default="plaid_app.db", help="SQLite file to check; a scratch copy is used")
+    parser.add_argument("--username", default="user_good")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # Some endpoints write (e.g. /day_paid), so they run against a copy
+        copy = os.path.join(tmp, "plans.db")
+        shutil.copyfile(args.database, copy)
+        os.environ["DATABASE_URL"] = f"sqlite:///{copy}"
+        failures = check_endpoints(args.username)
+        lookups = check_user_lookups(args.username)
+
+    print(f"{len(failures)} full scans of {', '.join(sorted(HOT_TABLES))}")
+    print(f"{len(lookups)} requests that did not resolve the user with one query")
+    sys.exit(1 if failures or lookups else 0)
@@ -0,0 +1,170 @@
+import argparse
+import os
+from datetime import date, datetime
+from dateutil.relativedelta import relativedelta
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from app.categories import FOOD, ENTERTAINMENT, TRAVEL
+from app.database import SessionLocal
+from app.forecast import forecast_points, forecast_users
+from app.models.user import User
+from app.models.daily_category_spending import DailyCategorySpending
+from app.profiling import traced
+
+# Category -> prefix of the User columns it drives (food_spending, food_spending_goal, ...)
+TRACKED_CATEGORIES = {
+    FOOD: "food",
+    ENTERTAINMENT: "entertainment",
+    TRAVEL: "travel",
+}
+
+# Monthly budget that the adaptive goals split between categories
+MONTHLY_SPEND_BUDGET = 1000
+
+
+def today():
+    """The date month-to-date figures are for: APP_TODAY (YYYY-MM-DD) if set, e.g. by benchmarks over a
+    database seeded up to a fixed date, else the current date."""
+    pinned = os.getenv("APP_TODAY")
+    return date.fromisoformat(pinned) if pinned else datetime.now().date()
+
+
+def month_range(day=None):
+    first_day = (day or today()).replace(day=1)
+    return first_day, first_day + relativedelta(months=1)
+
+
+@traced
+def month_category_spending(db: Session, user_id: int, categories, first_day, next_month):
+    """Cumulative spending per day for several of one user's categories, from a single rollup query.
+
+    `next_month=None` leaves the range open-ended.
+    """
+    query = db.query(
+        DailyCategorySpending.category, DailyCategorySpending.day, func.sum(DailyCategorySpending.total)
+    ).filter(
+        DailyCategorySpending.user_id == user_id,
+        DailyCategorySpending.category.in_(list(categories)),
+        DailyCategorySpending.day >= first_day
+    )
+    if next_month is not None:
+        query = query.filter(DailyCategorySpending.day < next_month)
+    rows = query.group_by(
+        DailyCategorySpending.category, DailyCategorySpending.day
+    ).order_by(DailyCategorySpending.category, DailyCategorySpending.day).all()
+
+    spending = {category: {} for category in categories}
+    running_totals = {category: 0 for category in categories}
+    for category, day, total in rows:
+        running_totals[category] += total
+        spending[category][day] = running_totals[category]
+    return spending
+
+
+def predict_spending(cumulative_spending):
+    """Linear fit of cumulative spending against day of month, projected to day 28.
+
+    Closed-form least squares (see app/forecast.py); returns None when there are fewer than two days of data.
+    """
+    return forecast_points((day.day, total) for day, total in cumulative_spending.items())
+
+
+def _goals(user: User, spending):
+    """Per-category results plus the adaptive goals, from {category: (spent, forecast)}."""
+    results = {}
+    for category, prefix in TRACKED_CATEGORIES.items():
+        spent, predicted = spending[category]
+        results[prefix] = {
+            "spending": spent,
+            "predicted_spending": predicted if predicted is not None else 0,
+        }
+
+    predicted_spending = sum(result["predicted_spending"] for result in results.values())
+    spend_limit = MONTHLY_SPEND_BUDGET - (user.saving_goal or 0)
+    ratio = spend_limit / predicted_spending if predicted_spending else 0
+
+    for result in results.values():
+        result["spending_goal"] = result["predicted_spending"] * ratio
+    results["predicted_spending"] = predicted_spending
+    return results
+
+
+@traced
+def derive_spending(user: User, spending):
+    """Actual spend, forecast and adaptive goal per tracked category from month_category_spending output.
+
+    Pure: reads the user's saving goal but writes nothing.
+    """
+    return _goals(user, {
+        category: (list(spending[category].values())[-1] if spending[category] else None, predict_spending(spending[category]))
+        for category in TRACKED_CATEGORIES
+    })
+
+
+@traced
+def recompute_users(db: Session, users, commit: bool = True):
+    """Recompute actual spend, forecast and adaptive goal of every tracked category for many users.
+
+    Reads this month's stored forecast sums for all of them in one query and forecasts them in one
+    NumPy call, then writes the derived User fields. Returns {user_id: results}.
+    """
+    first_day, _ = month_range()
+    spending = forecast_users(db, [user.id for user in users], TRACKED_CATEGORIES, first_day)
+    all_results = {}
+    for user in users:
+        results = _goals(user, {category: spending[(user.id, category)] for category in TRACKED_CATEGORIES})
+        for prefix in TRACKED_CATEGORIES.values():
+            result = results[prefix]
+            setattr(user, f"{prefix}_spending_predicted", result["predicted_spending"])
+            setattr(user, f"{prefix}_spending_goal", result["spending_goal"])
+            # Actual spend keeps its last value when the month has no data yet
+            if result["spending"] is not None:
+                setattr(user, f"{prefix}_spending", result["spending"])
+        all_results[user.id] = results
+
+    if commit:
+        db.commit()
+    return all_results
+
+
+@traced
+def recompute_spending(user: User, db: Session, commit: bool = True):
+    """recompute_users for one user; returns its results."""
+    return recompute_users(db, [user], commit=commit)[user.id]
+
+
+def recompute_user_by_id(user_id: int):
+    """Background-job entry point: recompute one user in a session of its own."""
+    with SessionLocal() as db:
+        user = db.get(User, user_id)
+        if user is not None:
+            recompute_spending(user, db)
+
+
+def recompute_all(db: Session, batch_size: int = 500, log=print):
+    """Batch entry point: recompute every user, `batch_size` users per query and commit."""
+    last_id = 0
+    recomputed = 0
+    while True:
+        users = db.query(User).filter(User.id > last_id).order_by(User.id).limit(batch_size).all()
+        if not users:
+            return recomputed
+        recompute_users(db, users)
+        recomputed += len(users)
+        last_id = users[-1].id
+        log(f"Recomputed {recomputed} users")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Recompute derived spending, forecasts and goals for every user.")
+    parser.add_argument("--batch-size", type=int, default=500)
+    args = parser.parse_args()
+
+    from app.models import create_tables
+
+    create_tables()
+    db = SessionLocal()
+    try:
+        recompute_all(db, args.batch_size)
+    finally:
+        db.close()
@@ -0,0 +1,225 @@
+import sys
+from collections import defaultdict
+from sqlalchemy import delete, func, insert, literal, select
+from sqlalchemy.orm import Session
+from app.database import SessionLocal, upsert
+from app.models import create_tables
+from app.models.transaction import Transaction
+from app.models.transaction_category import TransactionCategory
+from app.models.daily_category_spending import DailyCategorySpending
+from app.models.category_total import CategoryTotal
+from app.forecast import apply_forecast_deltas, check_forecast_stats, rebuild_forecast_stats
+from app.profiling import traced
+
+# Pseudo-category holding every transaction of the day, used by /graph_data
+ALL_CATEGORIES = "*"
+
+# Rollup user id for transactions without an owner (e.g. synced from a bare access token)
+UNOWNED = 0
+
+
+def owner_of(tx):
+    return tx.user_id if tx.user_id is not None else UNOWNED
+
+
+def rollup_deltas(transactions, sign: int = 1):
+    """Collect {(user_id, category, day): [total, count]} changes for a batch of transactions."""
+    deltas = defaultdict(lambda: [0.0, 0])
+    for tx in transactions:
+        if tx.date is None:
+            continue
+        amount = tx.amount or 0
+        for category in [ALL_CATEGORIES] + [c.category for c in tx.categories]:
+            delta = deltas[(owner_of(tx), category, tx.date)]
+            delta[0] += sign * amount
+            delta[1] += sign
+    return deltas
+
+
+def _upsert_increments(db: Session, model, keys, rows):
+    """Add each row's total and count onto the stored row, inserting it if missing.
+
+    One INSERT ... ON CONFLICT DO UPDATE per batch, so the increment happens inside the database:
+    concurrent writers neither lose updates nor collide on the primary key. Rows that drop to
+    zero transactions are deleted afterwards.
+    """
+    if not rows:
+        return
+    statement = upsert(db, model)
+    statement = statement.on_conflict_do_update(
+        index_elements=keys,
+        set_={"total": model.total + statement.excluded.total, "count": model.count + statement.excluded.count},
+    )
+    # A fixed key order keeps concurrent writers from deadlocking on databases with row locks
+    rows = sorted(rows, key=lambda row: tuple(str(row[key]) for key in keys))
+    db.execute(statement, rows)
+    if any(row["count"] < 0 for row in rows):
+        users = {row["user_id"] for row in rows}
+        db.execute(delete(model).where(model.user_id.in_(users), model.count <= 0))
+
+
+@traced
+def apply_rollup_deltas(db: Session, deltas):
+    """Apply deltas inside the caller's transaction; the caller commits."""
+    category_deltas = defaultdict(lambda: [0.0, 0])
+    for (user_id, category, day), (total, count) in deltas.items():
+        if category != ALL_CATEGORIES:
+            category_delta = category_deltas[(user_id, category)]
+            category_delta[0] += total
+            category_delta[1] += count
+
+    # Reads the months' daily rows as they were before this batch
+    apply_forecast_deltas(db, deltas)
+    _upsert_increments(db, DailyCategorySpending, ["user_id", "category", "day"], [
+        {"user_id": user_id, "category": category, "day": day, "total": total, "count": count}
+        for (user_id, category, day), (total, count) in deltas.items()
+    ])
+    _upsert_increments(db, CategoryTotal, ["user_id", "category"], [
+        {"user_id": user_id, "category": category, "total": total, "count": count}
+        for (user_id, category), (total, count) in category_deltas.items()
+    ])
+
+
+def add_to_rollups(db: Session, transactions):
+    apply_rollup_deltas(db, rollup_deltas(transactions, 1))
+
+
+def remove_from_rollups(db: Session, transactions):
+    apply_rollup_deltas(db, rollup_deltas(transactions, -1))
+
+
+ROLLUP_COLUMNS = ["user_id", "category", "day", "total", "count"]
+
+
+def _rollup_selects():
+    """SELECTs producing every rollup row from the raw tables, in ROLLUP_COLUMNS order."""
+    owner = func.coalesce(Transaction.user_id, UNOWNED)
+    total = func.coalesce(func.sum(Transaction.amount), 0)
+    totals = select(
+        owner, literal(ALL_CATEGORIES), Transaction.date, total, func.count(Transaction.id)
+    ).where(Transaction.date.isnot(None)).group_by(owner, Transaction.date)
+
+    per_category = select(
+        owner, TransactionCategory.category, Transaction.date, total, func.count(Transaction.id)
+    ).join_from(
+        TransactionCategory, Transaction, Transaction.id == TransactionCategory.transaction_id
+    ).where(Transaction.date.isnot(None)).group_by(owner, TransactionCategory.category, Transaction.date)
+    return [totals, per_category]
+
+
+def _expected_rollups(db: Session):
+    """Recompute every rollup row from the raw tables with grouped SQL."""
+    expected = {}
+    for query in _rollup_selects():
+        for user_id, category, day, total, count in db.execute(query):
+            expected[(user_id, category, day)] = (total, count)
+    return expected
+
+
+def _category_totals(rollups):
+    """Sum daily rollups into {(user_id, category): (total, count)}, skipping the all-categories row."""
+    totals = defaultdict(lambda: [0.0, 0])
+    for (user_id, category, day), (total, count) in rollups.items():
+        if category != ALL_CATEGORIES:
+            entry = totals[(user_id, category)]
+            entry[0] += total
+            entry[1] += count
+    return {key: tuple(value) for key, value in totals.items()}
+
+
+def rebuild_rollups(db: Session):
+    """Drop and recompute all rollup rows and the forecast sums built on them. Use to repair drift.
+
+    Runs as INSERT ... SELECT, so rows never pass through Python and large databases rebuild quickly.
+    """
+    db.query(DailyCategorySpending).delete()
+    db.query(CategoryTotal).delete()
+    rows = 0
+    for query in _rollup_selects():
+        rows += db.execute(insert(DailyCategorySpending).from_select(ROLLUP_COLUMNS, query)).rowcount
+
+    daily = DailyCategorySpending
+    db.execute(insert(CategoryTotal).from_select(
+        ["user_id", "category", "total", "count"],
+        select(daily.user_id, daily.category, func.sum(daily.total), func.sum(daily.count))
+        .where(daily.category != ALL_CATEGORIES)
+        .group_by(daily.user_id, daily.category),
+    ))
+    rebuild_forecast_stats(db)
+    db.commit()
+    return rows
+
+
+def check_rollups(db: Session, tolerance: float = 1e-6):
+    """Compare stored rollups with the raw tables, and the forecast sums with the rollups; returns a list of mismatch descriptions."""
+    expected = _expected_rollups(db)
+    stored = {
+        (row.user_id, row.category, row.day): (row.total, row.count)
+        for row in db.query(DailyCategorySpending)
+    }
+    expected_totals = _category_totals(expected)
+    stored_totals = {(row.user_id, row.category): (row.total, row.count) for row in db.query(CategoryTotal)}
+
+    problems = []
+    for want_rows, have_rows in [(expected, stored), (expected_totals, stored_totals)]:
+        for key in sorted(set(want_rows) | set(have_rows), key=str):
+            want = want_rows.get(key, (0, 0))
+            have = have_rows.get(key, (0, 0))
+            if want[1] != have[1] or abs(want[0] - have[0]) > tolerance:
+                problems.append(f"{key}: expected total={want[0]} count={want[1]}, found total={have[0]} count={have[1]}")
+    return problems + check_forecast_stats(db)
+
+
+@traced
+def top_categories(db: Session, user_id: int, n: int = 2, by: str = "count", start=None, end=None):
+    """A user's top `n` categories as [(category, count, total)], ranked by "count" or "spend".
+
+    All-time rankings read the user's category totals; a window (`end` exclusive) sums daily
+    rollups, so the cost follows the number of days and categories, not of transactions.
+    """
+    if start is None and end is None:
+        category, count, total = CategoryTotal.category, CategoryTotal.count, CategoryTotal.total
+        query = db.query(category, count, total).filter(CategoryTotal.user_id == user_id, count > 0)
+    else:
+        category = DailyCategorySpending.category
+        count, total = func.sum(DailyCategorySpending.count), func.sum(DailyCategorySpending.total)
+        query = db.query(category, count, total).filter(
+            DailyCategorySpending.user_id == user_id, category != ALL_CATEGORIES
+        )
+        if start is not None:
+            query = query.filter(DailyCategorySpending.day >= start)
+        if end is not None:
+            query = query.filter(DailyCategorySpending.day < end)
+        query = query.group_by(category).having(count > 0)
+    rank = count if by == "count" else total
+    return [tuple(row) for row in query.order_by(rank.desc(), category).limit(n)]
+
+
+def ensure_rollups(db: Session):
+    """Build the rollup table on first start against an existing database."""
+    if db.query(Transaction.id).first() is None:
+        return
+    # Also covers databases whose daily rollups predate the category totals
+    missing_totals = db.query(CategoryTotal).first() is None and db.query(TransactionCategory.id).first() is not None
+    if db.query(DailyCategorySpending).first() is None or missing_totals:
+        rebuild_rollups(db)
+
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else "check"
+    create_tables()
+    db = SessionLocal()
+    try:
+        if command == "rebuild":
+            print(f"Rebuilt {rebuild_rollups(db)} rollup rows.")
+        elif command == "check":
+            problems = check_rollups(db)
+            for problem in problems:
+                print(problem)
+            print("Rollups consistent." if not problems else f"{len(problems)} rollup rows out of sync.")
+            sys.exit(1 if problems else 0)
+        else:
+            print("usage: python -m app.rollups [check|rebuild]")
+            sys.exit(2)
+    finally:
+        db.close()
@@ -15,7 +15,8 @@ class TransactionBase(BaseModel):
 
 class AddTransactionRequest(BaseModel):
     # transaction_id: str
-    # account_id: str
+    username: Optional[str] = None  # Defaults to the server's DEFAULT_USERNAME
+    account_id: Optional[str] = None  # Must belong to the user; defaults to their first account
     name: str
     merchant_name: Optional[str] = None
     amount: float
@@ -0,0 +1,103 @@
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from app.metrics import Histogram
+
+BATCH_SIZE_BUCKETS = [1, 2, 4, 8, 16, 32, 64, 128, 256]
+QUEUE_WAIT_BUCKETS = [0.0005, 0.001, 0.002, 0.003, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25]
+# Longest a caller waits for its result; covers the first batch loading the model
+DEFAULT_SUBMIT_TIMEOUT = 30.0
+
+
+class MicroBatcher:
+    """Coalesces concurrent single-item calls into one `batch_fn(items) -> results` call.
+
+    A batch closes `window` seconds after its first item arrives or once it holds
+    `max_batch` items, whichever comes first. If the batch call raises, items are
+    retried one at a time so a single bad input only fails its own caller; if it returns
+    the wrong number of results, every caller in the batch gets an error.
+    """
+
+    def __init__(self, batch_fn, window: float = 0.003, max_batch: int = 64, name: str = "batcher",
+                 timeout: float = DEFAULT_SUBMIT_TIMEOUT):
+        self.batch_fn = batch_fn
+        self.window = window
+        self.max_batch = max_batch
+        self.name = name
+        self.timeout = timeout
+        self.batch_sizes = Histogram(BATCH_SIZE_BUCKETS)
+        self.queue_wait = Histogram(QUEUE_WAIT_BUCKETS)
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def submit(self, item, timeout: float = None):
+        """Result for `item`; raises concurrent.futures.TimeoutError after `timeout` (default self.timeout) seconds."""
+        future = Future()
+        self._queue.put((item, future, time.monotonic()))
+        self._ensure_worker()
+        return future.result(self.timeout if timeout is None else timeout)
+
+    def stats(self):
+        return {
+            "window_ms": self.window * 1000,
+            "max_batch": self.max_batch,
+            "queue_depth": self._queue.qsize(),
+            "batch_size": self.batch_sizes.snapshot(),
+            "queue_wait_seconds": self.queue_wait.snapshot(),
+        }
+
+    def _ensure_worker(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name=f"{self.name}-worker", daemon=True)
+                self._thread.start()
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        deadline = batch[0][2] + self.window
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            started = time.monotonic()
+            self.batch_sizes.observe(len(batch))
+            for _, _, enqueued in batch:
+                self.queue_wait.observe(started - enqueued)
+            try:
+                results = list(self.batch_fn([item for item, _, _ in batch]))
+            except Exception as e:
+                if len(batch) == 1:
+                    batch[0][1].set_exception(e)
+                    continue
+                for item, future, _ in batch:
+                    try:
+                        future.set_result(self.batch_fn([item])[0])
+                    except Exception as item_error:
+                        future.set_exception(item_error)
+                continue
+
+            if len(results) != len(batch):
+                error = RuntimeError(f"{self.name}: batch function returned {len(results)} results for {len(batch)} items")
+                for _, future, _ in batch:
+                    future.set_exception(error)
+                continue
+            for (_, future, _), result in zip(batch, results):
+                future.set_result(result)
+
+
+def batcher_from_env(batch_fn, prefix: str, name: str):
+    """MicroBatcher configured by <prefix>_BATCH_WINDOW_MS, <prefix>_BATCH_MAX and <prefix>_TIMEOUT_SECONDS."""
+    window_ms = float(os.getenv(f"{prefix}_BATCH_WINDOW_MS", "3"))
+    max_batch = int(os.getenv(f"{prefix}_BATCH_MAX", "64"))
+    timeout = float(os.getenv(f"{prefix}_TIMEOUT_SECONDS", str(DEFAULT_SUBMIT_TIMEOUT)))
+    return MicroBatcher(batch_fn, window=window_ms / 1000, max_batch=max_batch, name=name, timeout=timeout)
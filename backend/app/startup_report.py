@@ -0,0 +1,60 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+# Phase name -> seconds, filled in as the app initializes and as ML artifacts load
+TIMINGS = {}
+
+
+@contextmanager
+def timed(name: str):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        TIMINGS[name] = TIMINGS.get(name, 0.0) + time.perf_counter() - started
+
+
+def import_breakdown(module: str = "app.main", depth: int = 1):
+    """Import `module` in a fresh interpreter with -X importtime and total the self time per package."""
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [os.getcwd(), os.getenv("PYTHONPATH")])))
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import json, {module}; from app.startup_report import TIMINGS; print(json.dumps(TIMINGS))"],
+        capture_output=True, text=True, env=env,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1] if result.stderr.strip() else "import failed")
+
+    totals = defaultdict(int)
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, _, name = line[len("import time:"):].split("|")
+        package = ".".join(name.strip().split(".")[:depth])
+        totals[package] += int(self_us)
+
+    init_timings = json.loads(result.stdout.strip().splitlines()[-1]) if result.stdout.strip() else {}
+    return sorted(((name, us / 1e6) for name, us in totals.items()), key=lambda item: -item[1]), init_timings
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Break down app import and initialization time by module.")
+    parser.add_argument("--module", default="app.main")
+    parser.add_argument("--depth", type=int, default=1, help="Dotted-name depth to group imports by")
+    parser.add_argument("--top", type=int, default=20)
+    args = parser.parse_args()
+
+    imports, init_timings = import_breakdown(args.module, args.depth)
+    print(f"{'module':40} {'import s':>10}")
+    for name, seconds in imports[:args.top]:
+        print(f"{name:40} {seconds:10.3f}")
+    print(f"{'total':40} {sum(seconds for _, seconds in imports):10.3f}")
+    print()
+    print(f"{'init phase':40} {'seconds':>10}")
+    for name, seconds in init_timings.items():
+        print(f"{name:40} {seconds:10.3f}")
@@ -0,0 +1,262 @@
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from datetime import date, timedelta
+from itertools import groupby
+from sqlalchemy.orm import Session
+from app.database import Base, SQLITE_PRAGMAS, make_engine
+from app.models.user import User
+from app.models.plaid_item import PlaidItem
+from app.models.account import Account
+from app.models.transaction import Transaction
+from app.models.transaction_category import TransactionCategory
+from app.rollups import rebuild_rollups
+
+BATCH_SIZE = 50000
+
+# Last day of generated history. Fixed, so a seed gives the same database on any day
+DEFAULT_END_DATE = date(2026, 9, 30)
+
+# Bulk loading only: a crash mid-load loses the file anyway, so skip the journal and fsyncs
+LOAD_PRAGMAS = dict(SQLITE_PRAGMAS, journal_mode="OFF", synchronous="OFF")
+
+# (weight, Plaid category array, merchants, median amount, spread, payment channel)
+SPENDING_PROFILES = [
+    (16, ["Food and Drink", "Restaurants"], ["Chipotle", "Olive Garden", "Shake Shack", "Panera Bread", "Sweetgreen", "McDonald's"], 24, 0.5, "in store"),
+    (12, ["Food and Drink", "Restaurants", "Coffee Shop"], ["Starbucks", "Dunkin'", "Blue Bottle Coffee", "Peet's Coffee"], 6, 0.4, "in store"),
+    (12, ["Shops", "Supermarkets and Groceries"], ["Whole Foods", "Trader Joe's", "Safeway", "Kroger", "Costco"], 65, 0.6, "in store"),
+    (9, ["Shops"], ["Amazon", "Target", "Walmart", "Best Buy", "Etsy"], 40, 0.9, "online"),
+    (6, ["Travel", "Taxi"], ["Uber", "Lyft"], 18, 0.5, "online"),
+    (4, ["Travel", "Gas Stations"], ["Shell", "Chevron", "Exxon", "BP"], 42, 0.3, "in store"),
+    (2, ["Travel", "Airlines and Aviation Services"], ["United Airlines", "Delta", "Southwest Airlines", "JetBlue"], 320, 0.5, "online"),
+    (2, ["Travel", "Lodging"], ["Marriott", "Hilton", "Airbnb", "Hyatt"], 210, 0.6, "online"),
+    (5, ["Entertainment", "Movie Theatres"], ["AMC", "Regal Cinemas", "Cinemark"], 28, 0.4, "in store"),
+    (3, ["Entertainment", "Music and Concerts"], ["Ticketmaster", "StubHub", "Live Nation"], 95, 0.6, "online"),
+    (4, ["Service", "Subscription"], ["Netflix", "Spotify", "Hulu", "Apple"], 13, 0.3, "online"),
+    (3, ["Service", "Utilities"], ["PG&E", "Comcast", "AT&T", "Verizon"], 95, 0.4, "online"),
+    (2, ["Recreation", "Gyms and Fitness Centers"], ["Planet Fitness", "Equinox", "ClassPass"], 40, 0.4, "in store"),
+    (2, ["Transfer", "Debit"], ["Venmo", "Zelle"], 60, 0.9, "other"),
+]
+PAYROLL_CATEGORY = ["Transfer", "Payroll"]
+
+# Relative spending by month (holidays, summer) and by weekday (Monday=0)
+MONTH_WEIGHTS = {1: 0.85, 2: 0.9, 3: 1.0, 4: 1.0, 5: 1.05, 6: 1.1, 7: 1.15, 8: 1.1, 9: 0.95, 10: 1.0, 11: 1.15, 12: 1.35}
+WEEKDAY_WEIGHTS = [0.9, 0.9, 0.95, 1.0, 1.25, 1.35, 1.1]
+# Travel and entertainment swing harder with the season than the baseline
+SEASONAL_CATEGORIES = {"Travel": {6: 1.5, 7: 1.7, 8: 1.5, 12: 1.6}, "Entertainment": {11: 1.2, 12: 1.4}}
+
+
+def _user_rng(seed: int, index: int):
+    # Each user draws from its own generator, so any one user's data depends only on (seed, index)
+    return random.Random(seed * 1_000_003 + index)
+
+
+def _days(start: date, end: date):
+    days = [start + timedelta(days=offset) for offset in range((end - start).days + 1)]
+    weights = [MONTH_WEIGHTS[day.month] * WEEKDAY_WEIGHTS[day.weekday()] for day in days]
+    return days, _cumulative(weights)
+
+
+def _cumulative(weights):
+    total, cumulative = 0.0, []
+    for weight in weights:
+        total += weight
+        cumulative.append(total)
+    return cumulative
+
+
+def _profile_weights(month: int):
+    weights = []
+    for weight, categories, *_ in SPENDING_PROFILES:
+        weights.append(weight * SEASONAL_CATEGORIES.get(categories[0], {}).get(month, 1.0))
+    return _cumulative(weights)
+
+
+def split_transactions(total: int, users: int, seed: int):
+    """Transactions per user: a skewed (lognormal) split, as real activity is, summing to `total`."""
+    rng = random.Random(seed)
+    weights = [rng.lognormvariate(0, 0.75) for _ in range(users)]
+    scale = total / sum(weights)
+    counts = [int(weight * scale) for weight in weights]
+    for i in range(total - sum(counts)):
+        counts[i % users] += 1
+    return counts
+
+
+def paydays(rng: random.Random, start: date, end: date):
+    """A semi-monthly (1st and 15th) or biweekly (every other Friday) pay schedule."""
+    if rng.random() < 0.5:
+        days, month = [], date(start.year, start.month, 1)
+        while month <= end:
+            days += [day for day in (month, month.replace(day=15)) if start <= day <= end]
+            month = (month + timedelta(days=32)).replace(day=1)
+        return days
+    first_friday = start + timedelta(days=(4 - start.weekday()) % 7 + 7 * rng.randrange(2))
+    return [first_friday + timedelta(days=14 * k) for k in range((end - first_friday).days // 14 + 1)]
+
+
+def user_rows(index: int, count: int, seed: int, days, day_weights, profile_weights):
+    """(accounts, transactions) for one user.
+
+    Transactions are date-ordered (date, profile, merchant, amount, account_id) tuples, where
+    profile indexes SPENDING_PROFILES and None marks a payroll deposit.
+    """
+    rng = _user_rng(seed, index)
+    prefix = f"syn{seed}-{index}"
+    checking = (f"{prefix}-checking", "Checking", f"{rng.randrange(10000):04d}", "depository", "checking")
+    credit = (f"{prefix}-credit", "Credit Card", f"{rng.randrange(10000):04d}", "credit", "credit card")
+
+    rows = []
+    paycheck = round(rng.uniform(1200, 4800), -1)
+    for day in paydays(rng, days[0], days[-1])[:count]:
+        rows.append((day, None, None, -round(paycheck * rng.uniform(0.98, 1.02), 2), checking[0]))
+
+    # A user's habits: how much they spend relative to the median, and which card they prefer
+    level = rng.lognormvariate(0, 0.3)
+    credit_share = rng.uniform(0.2, 0.9)
+    spending_days = sorted(rng.choices(days, cum_weights=day_weights, k=count - len(rows)))
+    profile_ids = range(len(SPENDING_PROFILES))
+    lognormal, choice, uniform = rng.lognormvariate, rng.choice, rng.random
+    # Draw each month's categories in one call, weighted for that month
+    for month, month_days in groupby(spending_days, key=lambda day: day.month):
+        month_days = list(month_days)
+        for day, profile in zip(month_days, rng.choices(profile_ids, cum_weights=profile_weights[month], k=len(month_days))):
+            _, _, merchants, median, spread, _ = SPENDING_PROFILES[profile]
+            account_id = credit[0] if uniform() < credit_share else checking[0]
+            rows.append((day, profile, choice(merchants), round(median * level * lognormal(0, spread), 2), account_id))
+
+    rows.sort(key=lambda row: row[0])
+    return [checking, credit], rows
+
+
+def _insert_sql(model, columns):
+    return f"INSERT INTO {model.__tablename__} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})"
+
+
+TRANSACTION_COLUMNS = ["id", "user_id", "transaction_id", "account_id", "name", "merchant_name", "amount", "date",
+                       "category", "payment_channel", "currency"]
+CATEGORY_COLUMNS = ["transaction_id", "user_id", "category", "date"]
+
+
+def generate(path: str, users: int, transactions: int, seed: int = 0, months: int = 24, end_date: date = DEFAULT_END_DATE,
+             log=print):
+    """Create users, items, accounts and `transactions` transactions in a new SQLite database at `path`.
+
+    Output depends only on the arguments; history runs for `months` up to `end_date`.
+    Rows go in through executemany with the journal and fsyncs off; secondary indexes are
+    dropped during the load and rebuilt afterwards, then rollups are built in SQL.
+    """
+    url = f"sqlite:///{path}"
+    engine = make_engine(url, LOAD_PRAGMAS)
+    Base.metadata.create_all(engine)
+    bulk_indexes = [index for model in (Transaction, TransactionCategory) for index in model.__table__.indexes]
+    with engine.begin() as conn:
+        for index in bulk_indexes:
+            index.drop(conn, checkfirst=True)
+
+    end = end_date
+    start = end - timedelta(days=int(months * 30.44))
+    days, day_weights = _days(start, end)
+    profile_weights = {month: _profile_weights(month) for month in range(1, 13)}
+    counts = split_transactions(transactions, users, seed)
+
+    # Per-profile values that are the same for every row
+    profile_json = [json.dumps(profile[1]) for profile in SPENDING_PROFILES]
+    payroll_json = json.dumps(PAYROLL_CATEGORY)
+
+    started = time.perf_counter()
+    tx_id = 0
+    tx_rows, category_rows = [], []
+    user_batch, item_batch, account_batch = [], [], []
+    connection = engine.raw_connection()
+    try:
+        cursor = connection.cursor()
+
+        def flush():
+            cursor.executemany(_insert_sql(User, ["id", "username", "password", "checkings", "savings", "amount", "time_months"]), user_batch)
+            cursor.executemany(_insert_sql(PlaidItem, ["id", "user_id", "item_id", "access_token"]), item_batch)
+            cursor.executemany(_insert_sql(Account, ["account_id", "name", "mask", "type", "subtype", "user_id", "item_id"]), account_batch)
+            cursor.executemany(_insert_sql(Transaction, TRANSACTION_COLUMNS), tx_rows)
+            cursor.executemany(_insert_sql(TransactionCategory, CATEGORY_COLUMNS), category_rows)
+            connection.commit()
+            for batch in (user_batch, item_batch, account_batch, tx_rows, category_rows):
+                batch.clear()
+
+        for index, count in enumerate(counts):
+            user_id = index + 1
+            rng = random.Random(f"profile:{seed}:{index}")
+            user_batch.append((user_id, f"synth-{index}", "synthetic", round(rng.uniform(500, 20000), 2),
+                               round(rng.uniform(0, 50000), 2), round(rng.uniform(1000, 20000), -2), rng.choice([6, 12, 24])))
+            item_batch.append((user_id, user_id, f"syn{seed}-item-{index}", f"access-synthetic-{seed}-{index}"))
+            accounts, rows = user_rows(index, count, seed, days, day_weights, profile_weights)
+            account_batch.extend(account + (user_id, user_id) for account in accounts)
+
+            for day, profile, merchant, amount, account_id in rows:
+                tx_id += 1
+                day = day.isoformat()
+                if profile is None:
+                    tx_rows.append((tx_id, user_id, f"syn{seed}-{tx_id}", account_id, "PAYROLL DEPOSIT", None, amount, day,
+                                    payroll_json, "other", "USD"))
+                    categories = PAYROLL_CATEGORY
+                else:
+                    _, categories, _, _, _, channel = SPENDING_PROFILES[profile]
+                    tx_rows.append((tx_id, user_id, f"syn{seed}-{tx_id}", account_id, merchant, merchant, amount, day,
+                                    profile_json[profile], channel, "USD"))
+                for category in categories:
+                    category_rows.append((tx_id, user_id, category, day))
+            if len(tx_rows) >= BATCH_SIZE:
+                flush()
+                log(f"  {tx_id:,} transactions ({tx_id / (time.perf_counter() - started):,.0f}/s)")
+        flush()
+    finally:
+        connection.close()
+    log(f"Inserted {tx_id:,} transactions for {users:,} users in {time.perf_counter() - started:.1f}s")
+
+    started = time.perf_counter()
+    with engine.begin() as conn:
+        for index in bulk_indexes:
+            index.create(conn)
+    log(f"Built indexes in {time.perf_counter() - started:.1f}s")
+
+    started = time.perf_counter()
+    with Session(engine) as db:
+        rollup_rows = rebuild_rollups(db)
+    with engine.begin() as conn:
+        conn.exec_driver_sql("ANALYZE")
+    log(f"Built {rollup_rows:,} rollup rows in {time.perf_counter() - started:.1f}s")
+    engine.dispose()
+
+    # Leave the file in the journal mode the app runs with
+    final = make_engine(url)
+    final.connect().close()
+    final.dispose()
+    return tx_id
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a synthetic SQLite database of users, accounts and transactions.")
+    parser.add_argument("--database", default="synthetic.db", help="SQLite file to create")
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--transactions", type=int, default=1_000_000)
+    parser.add_argument("--months", type=int, default=24, help="history length, ending at --end-date")
+    parser.add_argument("--end-date", type=date.fromisoformat, default=DEFAULT_END_DATE,
+                        help=f"last day of history, YYYY-MM-DD (default {DEFAULT_END_DATE}); pass today's date for live month-to-date data")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--force", action="store_true", help="replace an existing --database file")
+    args = parser.parse_args()
+
+    if args.transactions < args.users:
+        sys.exit("--transactions must be at least --users")
+    if os.path.exists(args.database):
+        if not args.force:
+            sys.exit(f"{args.database} exists; pass --force to replace it")
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(args.database + suffix):
+                os.remove(args.database + suffix)
+
+    started = time.perf_counter()
+    generate(args.database, args.users, args.transactions, args.seed, args.months, args.end_date)
+    print(f"Done in {time.perf_counter() - started:.1f}s")
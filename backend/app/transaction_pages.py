@@ -0,0 +1,127 @@
+import base64
+import csv
+import io
+import json
+import os
+from datetime import date
+from sqlalchemy import exists, or_, and_, select
+from app.models.transaction import Transaction
+from app.models.transaction_category import TransactionCategory
+
+TRANSACTIONS_PAGE_SIZE = int(os.getenv("TRANSACTIONS_PAGE_SIZE", "100"))
+TRANSACTIONS_MAX_PAGE_SIZE = int(os.getenv("TRANSACTIONS_MAX_PAGE_SIZE", "1000"))
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "1000"))
+EXPORT_COLUMNS = ["transaction_id", "date", "amount", "merchant_name", "name", "category", "account_id"]
+
+# Columns read for listings; selecting them (not ORM objects) keeps the identity map empty while streaming
+COLUMNS = [
+    Transaction.id, Transaction.transaction_id, Transaction.date, Transaction.amount,
+    Transaction.merchant_name, Transaction.name, Transaction.category, Transaction.account_id,
+]
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(tx_date: date, tx_id: int):
+    return base64.urlsafe_b64encode(f"{tx_date.isoformat()}|{tx_id}".encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        day, tx_id = raw.split("|")
+        return date.fromisoformat(day), int(tx_id)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise InvalidCursor(f"Invalid cursor: {cursor}") from e
+
+
+def filtered_transactions(user_id: int, start: date = None, end: date = None, category: str = None,
+                          merchant: str = None, min_amount: float = None, max_amount: float = None):
+    """One user's transactions matching the filters, newest first by (date, id). `end` is exclusive."""
+    query = select(*COLUMNS).where(Transaction.user_id == user_id, Transaction.date.isnot(None))
+    if start is not None:
+        query = query.where(Transaction.date >= start)
+    if end is not None:
+        query = query.where(Transaction.date < end)
+    if category:
+        query = query.where(exists().where(
+            TransactionCategory.transaction_id == Transaction.id,
+            TransactionCategory.user_id == user_id,
+            TransactionCategory.category == category,
+        ))
+    if merchant:
+        query = query.where(Transaction.merchant_name.icontains(merchant, autoescape=True))
+    if min_amount is not None:
+        query = query.where(Transaction.amount >= min_amount)
+    if max_amount is not None:
+        query = query.where(Transaction.amount <= max_amount)
+    return query.order_by(Transaction.date.desc(), Transaction.id.desc())
+
+
+def after_cursor(query, after):
+    """Keyset condition: rows strictly after (date, id) in newest-first order."""
+    if after is None:
+        return query
+    after_date, after_id = after
+    return query.where(or_(
+        Transaction.date < after_date,
+        and_(Transaction.date == after_date, Transaction.id < after_id),
+    ))
+
+
+def row_dict(row):
+    return {
+        "transaction_id": row.transaction_id,
+        "date": row.date.isoformat(),
+        "amount": row.amount,
+        "category": row.category,
+        "merchant_name": row.merchant_name,
+    }
+
+
+async def iter_rows(session_factory, query, batch_size: int = EXPORT_BATCH_SIZE):
+    """Yield every row of `query` in keyset batches, holding at most one batch in memory."""
+    after = None
+    async with session_factory() as db:
+        while True:
+            rows = (await db.execute(after_cursor(query, after).limit(batch_size))).all()
+            for row in rows:
+                yield row
+            if len(rows) < batch_size:
+                return
+            after = (rows[-1].date, rows[-1].id)
+
+
+async def ndjson_lines(rows):
+    async for row in rows:
+        yield json.dumps({column: _export_value(row, column) for column in EXPORT_COLUMNS}) + "\n"
+
+
+async def csv_lines(rows, flush_every: int = EXPORT_BATCH_SIZE):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_COLUMNS)
+    pending = 0
+    async for row in rows:
+        writer.writerow([_export_value(row, column) for column in EXPORT_COLUMNS])
+        pending += 1
+        if pending >= flush_every:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+            pending = 0
+    yield buffer.getvalue()
+
+
+def _export_value(row, column):
+    value = getattr(row, column)
+    return value.isoformat() if isinstance(value, date) else value
+
+
+# format -> (line generator, media type)
+EXPORT_FORMATS = {
+    "ndjson": (ndjson_lines, "application/x-ndjson"),
+    "csv": (csv_lines, "text/csv"),
+}
@@ -0,0 +1,84 @@
+import os
+import threading
+import time
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from app.models.user import User
+
+USER_CACHE_MAX_ENTRIES = int(os.getenv("USER_CACHE_MAX_ENTRIES", "10000"))
+USER_CACHE_TTL_SECONDS = float(os.getenv("USER_CACHE_TTL_SECONDS", "60"))
+
+
+class UserIdCache:
+    """username -> user id for recently seen users, shared across requests.
+
+    Neither changes once a user exists, so only the mapping is cached, never the mutable columns.
+    A hit turns the username lookup into a primary-key get, which the session's identity map
+    answers without a query when the user is already loaded. Missing users are not cached, so a
+    user registered by /login is found on the next request.
+    """
+
+    def __init__(self, max_entries: int = USER_CACHE_MAX_ENTRIES, ttl: float = USER_CACHE_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._ids = {}  # username -> (user_id, stored_at)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, username):
+        with self._lock:
+            entry = self._ids.get(username)
+            if entry is None or time.monotonic() - entry[1] > self.ttl:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return entry[0]
+
+    def put(self, username, user_id):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            if len(self._ids) >= self.max_entries:
+                self._ids.clear()
+            self._ids[username] = (user_id, time.monotonic())
+
+    def discard(self, username):
+        with self._lock:
+            self._ids.pop(username, None)
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._ids), "hits": self.hits, "misses": self.misses}
+
+
+user_ids = UserIdCache()
+
+
+def load_user(db: Session, username: str):
+    """The user named `username`, or None, in one indexed query (none if the session already holds it)."""
+    user_id = user_ids.get(username)
+    if user_id is not None:
+        user = db.get(User, user_id)
+        if user is not None and user.username == username:
+            return user
+        user_ids.discard(username)
+    user = db.scalar(select(User).where(User.username == username))
+    if user is not None:
+        user_ids.put(username, user.id)
+    return user
+
+
+async def aload_user(db: AsyncSession, username: str):
+    """Async twin of load_user."""
+    user_id = user_ids.get(username)
+    if user_id is not None:
+        user = await db.get(User, user_id)
+        if user is not None and user.username == username:
+            return user
+        user_ids.discard(username)
+    user = await db.scalar(select(User).where(User.username == username))
+    if user is not None:
+        user_ids.put(username, user.id)
+    return user